@@ -115,6 +115,12 @@ def create_app():
     app.register_blueprint(mobile_home_bp)
     app.register_blueprint(payments_bp)
 
+    # Khởi động sẵn pool LibreOffice (convert Word -> PDF) ở nền
+    from app.services.office_converter import office_converter, should_warm
+    if should_warm():
+        import threading
+        threading.Thread(target=office_converter.warm_up, daemon=True).start()
+
     # Error handlers
     @app.errorhandler(413)
     def payload_too_large(e):
@@ -1,6 +1,17 @@
 from flask import Blueprint, request, jsonify
 from app.services.mongo_service import mongo_collections
 from app.services.aws_service import aws_service
+from app.services.thumbnail_service import thumbnail_service
+from app.services.office_converter import office_converter
+from app.services.view_counter import view_counter
+from app.services.home_feed_snapshot import home_feed_snapshot
+from app.services.entity_loader import entity_cache
+from app.services.lookup_cache import lookup_cache
+from app.services.lookup_counts import lookup_counts
+from app.services.mongo_monitor import mongo_monitor
+from app.utils.document_text_cache import document_text_cache
+from app.utils.s3_object_cache import s3_object_cache
+from app.utils.ai_response_cache import ai_response_cache
 from bson import ObjectId
 import jwt
 import os
@@ -243,6 +254,7 @@ def delete_user(user_id):
         return jsonify({"error": "Bạn không thể xóa admin khác."}), 403
 
     mongo_collections.users.delete_one({"_id": target_obj_id})
+    entity_cache.invalidate("users", target_obj_id)
 
     return jsonify({
         "message": "Đã xóa người dùng thành công.",
@@ -406,12 +418,19 @@ def delete_document(doc_id):
         except Exception as e:
             print(f"[WARNING] Không thể xóa image S3 {image_url}: {e}")
 
+    # Xóa các biến thể thumbnail (key cố định theo document)
+    thumbnail_service.delete(doc_obj_id, doc.get('thumbnails'))
+
     # Xóa document trong MongoDB
     result = mongo_collections.documents.delete_one({"_id": doc_obj_id})
     if result.deleted_count == 0:
         return jsonify({"error": "Xóa tài liệu thất bại."}), 500
 
+    lookup_counts.document_removed(doc)
+
     # Xóa view history liên quan
+    view_counter.discard(doc_obj_id)
+    home_feed_snapshot.invalidate()
     try:
         mongo_collections.view_history.delete_many({"documentId": doc_obj_id})
     except Exception as e:
@@ -429,6 +448,9 @@ def delete_document(doc_id):
     except Exception as e:
         print(f"[WARNING] Không thể xóa comments: {e}")
 
+    # Xóa văn bản đã cache (GridFS)
+    document_text_cache.delete(doc_obj_id)
+
     return jsonify({
         "message": "Đã xóa tài liệu thành công.",
         "document": {
@@ -437,3 +459,40 @@ def delete_document(doc_id):
         }
     }), 200
 
+
+
+@admin_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Thống kê cache phía server (hit/miss, dung lượng), độ trễ S3 theo operation, pool convert Word, buffer lượt xem, snapshot feed trang chủ, cache schools/categories/users và độ trễ lệnh MongoDB theo collection. Chỉ admin mới có quyền gọi.
+    ---
+    tags:
+      - Admin
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Thống kê cache.
+      401:
+        description: Không xác thực.
+      403:
+        description: Không có quyền.
+    """
+    current_user, err = _get_current_user()
+    if err:
+        return err
+
+    if current_user.get('role') != 'admin':
+        return jsonify({"error": "Bạn không có quyền thực hiện thao tác này."}), 403
+
+    return jsonify({
+        "s3DiskCache": s3_object_cache.get_stats(),
+        "s3Operations": aws_service.get_metrics(),
+        "aiResponseCache": ai_response_cache.get_stats(),
+        "officeConverterPool": office_converter.get_stats(),
+        "viewCounter": view_counter.get_stats(),
+        "homeFeedSnapshot": home_feed_snapshot.get_stats(),
+        "entityCache": entity_cache.get_stats(),
+        "lookupCache": lookup_cache.get_stats(),
+        "mongo": {"pool": mongo_collections.get_pool_config(), "commands": mongo_monitor.get_stats()},
+    }), 200
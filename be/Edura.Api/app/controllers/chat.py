@@ -12,6 +12,7 @@ import uuid
 
 from app.services.mongo_service import mongo_collections
 from app.services.aws_service import aws_service
+from app.services.entity_loader import entity_loader
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/api/chat")
 
@@ -238,19 +239,15 @@ def list_conversations():
             "partnerId": str(partner_id) if partner_id else None,
         })
 
-    users_map = {}
-    if partner_ids:
-        cursor = mongo_collections.users.find(
-            {"_id": {"$in": list(partner_ids)}},
-            {"username": 1, "fullName": 1, "avatarUrl": 1}
-        )
-        for user_doc in cursor:
-            users_map[str(user_doc["_id"])] = {
-                "id": str(user_doc["_id"]),
-                "username": user_doc.get("username"),
-                "fullName": user_doc.get("fullName"),
-                "avatarUrl": user_doc.get("avatarUrl"),
-            }
+    users_map = {
+        uid: {
+            "id": uid,
+            "username": user_doc.get("username"),
+            "fullName": user_doc.get("fullName"),
+            "avatarUrl": user_doc.get("avatarUrl"),
+        }
+        for uid, user_doc in entity_loader().load_many("users", partner_ids).items()
+    }
 
     documents_map = {}
     if document_ids:
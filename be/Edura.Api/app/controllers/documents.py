@@ -1,38 +1,51 @@
 # app/controllers/documents.py
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, redirect
 from werkzeug.utils import secure_filename
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 from jwt import ExpiredSignatureError, InvalidTokenError
+from pymongo import ReturnDocument
 
 import os
 import re
 import uuid
 import tempfile
 import shutil
-import subprocess
-import platform
 from io import BytesIO
 from collections import Counter
 import concurrent.futures
 import textwrap
+import json
 import requests
 import jwt  # pyjwt
 import fitz  # PyMuPDF
 from PIL import Image, ImageDraw, ImageFont
-import boto3
 from urllib.parse import urlparse, quote
 from datetime import datetime, timedelta, date
 import unicodedata
 
 from app.services.aws_service import aws_service
 from app.services.ai_service import ai_service
+from app.services.thumbnail_service import thumbnail_service, thumbnail_fields, THUMB_SIZES
+from app.services.office_converter import office_converter
+from app.services.document_counters import document_counters, counter_fields
+from app.services.view_counter import view_counter
+from app.services.home_feed_snapshot import home_feed_snapshot
+from app.services.entity_loader import entity_loader
+from app.services.lookup_cache import lookup_cache
+from app.services.lookup_counts import lookup_counts
+from app.services.view_stats import view_stats, VIEW_WINDOW_DAYS
 from app.services.mongo_service import mongo_collections
 from app.models.document import Document
 from app.utils.search_utils import calculate_relevance_score, create_normalized_text, strip_vn
 from app.utils.search_cache import search_cache
+from app.utils.document_text_cache import document_text_cache
+from app.utils.s3_object_cache import s3_object_cache
+from app.utils.upload_spool import UploadSpool, UploadTooLarge
+from app.utils.s3_range_file import S3RangeFile, S3_RANGE_MIN_MB, open_lazy_pdf
+from app.utils.text_chunker import PAGE_BREAK, join_pages
 from app.services.search_service import SearchService
 
 # BM25 imports với fallback (giữ lại để tương thích)
@@ -63,6 +76,15 @@ ALLOWED_IMG_EXT = {"png", "jpg", "jpeg", "webp"}
 # ====== Cờ tối ưu qua ENV (A-tweaks) ======
 SKIP_WORD_CONVERSION = os.getenv("SKIP_WORD_CONVERSION", "false").lower() == "true"
 USE_AI = os.getenv("USE_AI", "true").lower() == "true"
+# Số trang tối đa trả về trong 1 request /text?fromPage=&toPage=
+TEXT_PAGE_WINDOW_MAX = int(os.getenv("TEXT_PAGE_WINDOW_MAX", "50"))
+# Cách giao file ở /raw: "proxy" (stream qua Flask) | "redirect" (302 tới presigned URL)
+RAW_DELIVERY_MODE = os.getenv("RAW_DELIVERY_MODE", "proxy").lower()
+RAW_PRESIGN_TTL = int(os.getenv("RAW_PRESIGN_TTL", "300"))  # giây
+# Multipart upload trực tiếp lên S3 (FE chia file thành part, upload lại được từng part)
+MULTIPART_PART_MB = max(5, int(os.getenv("MULTIPART_PART_MB", "8")))  # S3 yêu cầu >= 5MB
+DIRECT_UPLOAD_MAX_MB = int(os.getenv("DIRECT_UPLOAD_MAX_MB", "500"))
+MULTIPART_PRESIGN_BATCH = 100  # số URL part tối đa mỗi request
 
 
 # ===================== Helpers =====================
@@ -79,6 +101,82 @@ def _allowed_ext(filename: str, allow: set[str]) -> bool:
 
 
 
+def _get_cached_s3_object(s3_url: str):
+    """
+    Lấy bản sao cục bộ (disk cache) của object S3; None nếu không dùng được cache.
+    Entry đã được pin: gọi s3_object_cache.release(entry) khi đọc xong.
+    """
+    bucket, key = _parse_s3_url(s3_url)
+    if not bucket or not key:
+        return None
+    return s3_object_cache.get(aws_service, bucket, key)
+
+
+def _fetch_s3_bytes(s3_url: str, timeout: int = 45) -> bytes | None:
+    """Đọc toàn bộ file: ưu tiên disk cache, fallback tải qua HTTP."""
+    cached = _get_cached_s3_object(s3_url)
+    if cached:
+        try:
+            return cached.read_all()
+        finally:
+            s3_object_cache.release(cached)
+    bucket, key = _parse_s3_url(s3_url)
+    if bucket and key:
+        try:
+            return aws_service.read_object(key, bucket=bucket)
+        except Exception as e:
+            print(f"[S3] read_object lỗi, thử public URL: {e}")
+    r = requests.get(s3_url, timeout=timeout)
+    if r.status_code >= 400:
+        return None
+    return r.content
+
+
+def _open_lazy_s3_pdf(s3_url: str):
+    """
+    Mở PDF lớn trên S3 để đọc lười (ranged GET, cache theo block).
+    None nếu file nhỏ (< S3_RANGE_MIN_MB), không phải object S3, hoặc thiếu pypdfium2.
+    """
+    bucket, key = _parse_s3_url(s3_url)
+    if not bucket or not key:
+        return None
+    try:
+        source = S3RangeFile(aws_service, key, bucket=bucket)
+    except Exception as e:
+        print(f"[S3Range] HEAD lỗi {key}: {e}")
+        return None
+    if source.size < S3_RANGE_MIN_MB * 1024 * 1024:
+        return None
+    return open_lazy_pdf(source)
+
+
+def _lazy_pdf_preview(lazy_doc, render_cover: bool = True) -> dict:
+    """Số trang + text các trang đầu + ảnh trang 1 từ PDF đọc lười."""
+    page_count = lazy_doc.page_count
+    # Cùng quy tắc với bản đọc cả file: >100 trang lấy 50 trang, còn lại 6 trang đầu
+    max_pages = 50 if page_count > 100 else min(6, page_count)
+    texts, cover = [], None
+    for i in range(max_pages):
+        page = lazy_doc.load_page(i)
+        try:
+            t = page.get_text("text")
+            if t and t.strip():
+                texts.append(t.strip())
+            if i == 0 and render_cover:
+                cover = page.render(max(THUMB_SIZES.values()))
+        except Exception as e:
+            print(f"[S3Range] Lỗi đọc trang {i + 1}: {e}")
+        finally:
+            page.close()
+    return {"pages": page_count, "text": join_pages(texts).strip(), "cover": cover}
+
+
+def _plain_summary(text: str, title: str) -> str:
+    """Tóm tắt dự phòng khi không có AI: 1200 ký tự đầu của text (bỏ ngắt trang)."""
+    text = (text or "").replace(PAGE_BREAK, "\n").strip()
+    return (text[:1200] + "…") if len(text) > 1200 else (text or f"Tài liệu: {title}.")
+
+
 def _naive_keywords(text: str, k: int = 12) -> list[str]:
     words = re.findall(r"[a-zA-ZÀ-ỹ0-9]{3,}", (text or "").lower())
     stop = {"the","and","for","with","that","this","from","have","you","are","not","your","of","to","in","on","by","is",
@@ -93,7 +191,7 @@ def _extract_text_from_pdf_bytes(file_bytes: bytes, max_pages: int = 6) -> str:
     texts = []
     for i in range(min(max_pages, doc.page_count)):
         texts.append(doc.load_page(i).get_text("text"))
-    return "\n".join(texts).strip()
+    return join_pages(texts).strip()
 
 
 def _extract_text_from_pdf_bytes_smart(file_bytes: bytes, max_pages: int = 50) -> str:
@@ -139,7 +237,7 @@ def _extract_text_from_pdf_bytes_smart(file_bytes: bytes, max_pages: int = 50) -
                 print(f"[Extract Text] Lỗi khi trích text từ trang {i}: {e}")
                 continue
         
-        result = "\n".join(texts).strip()
+        result = join_pages(texts).strip()
         print(f"[Extract Text] Phương pháp 1 (PyMuPDF): {len(result)} ký tự từ {len(texts)} trang")
         
         # Nếu không có text, thử phương pháp 2: pdfplumber
@@ -159,7 +257,7 @@ def _extract_text_from_pdf_bytes_smart(file_bytes: bytes, max_pages: int = 50) -
                             print(f"[Extract Text] pdfplumber lỗi trang {i}: {e}")
                             continue
                 
-                result_plumber = "\n".join(texts_plumber).strip()
+                result_plumber = join_pages(texts_plumber).strip()
                 print(f"[Extract Text] Phương pháp 2 (pdfplumber): {len(result_plumber)} ký tự từ {len(texts_plumber)} trang")
                 
                 if len(result_plumber) > len(result):
@@ -216,7 +314,7 @@ def _ocr_text_from_pdf_bytes(file_bytes: bytes, pages_max: int = 5, scale: float
                 print(f"[OCR] Lỗi OCR trang {i}: {e}")
                 continue
         
-        result = "\n".join(texts).strip()
+        result = join_pages(texts).strip()
         print(f"[OCR] OCR thành công: {len(result)} ký tự từ {len(texts)} trang")
         doc.close()
         return result
@@ -227,24 +325,6 @@ def _ocr_text_from_pdf_bytes(file_bytes: bytes, pages_max: int = 5, scale: float
         return ""
 
 
-def _generate_thumb_from_pdf_bytes(file_bytes: bytes, scale: float = 1.0) -> BytesIO | None:
-    """Render trang đầu PDF -> JPEG thumbnail (qua PIL)."""
-    try:
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        if doc.page_count == 0:
-            return None
-        pix = doc.load_page(0).get_pixmap(alpha=False, matrix=fitz.Matrix(scale, scale))
-        if pix.alpha:
-            pix = fitz.Pixmap(fitz.csRGB, pix)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        buf = BytesIO()
-        img.save(buf, format="JPEG", optimize=True, quality=85)
-        buf.seek(0)
-        return buf
-    except Exception:
-        return None
-
-
 def _get_pdf_page_count(file_bytes: bytes) -> int:
     try:
         doc = fitz.open(stream=file_bytes, filetype="pdf")
@@ -259,10 +339,17 @@ def _infer_document_page_count(document: dict) -> int:
         if not url:
             return 0
         ext = url.split("?", 1)[0].rsplit(".", 1)[-1].lower()
-        response = requests.get(url, timeout=45)
-        if response.status_code >= 400:
+        if ext == "pdf":
+            # Chỉ cần xref + cây trang: đọc lười thay vì tải cả file
+            lazy_doc = _open_lazy_s3_pdf(url)
+            if lazy_doc is not None:
+                try:
+                    return int(lazy_doc.page_count or 0)
+                finally:
+                    lazy_doc.close()
+        content = _fetch_s3_bytes(url)
+        if not content:
             return 0
-        content = response.content
         if ext == "pdf":
             return _get_pdf_page_count(content)
         if ext in {"docx", "doc"}:
@@ -274,28 +361,28 @@ def _infer_document_page_count(document: dict) -> int:
         return 0
 
 
-def _generate_placeholder_thumb(title: str, width: int = 800, height: int = 500) -> BytesIO:
-    """Placeholder thumbnail khi không có PDF để render."""
-    bg, fg, accent = (245, 248, 255), (33, 37, 41), (0, 123, 255)
-    img = Image.new("RGB", (width, height), bg)
-    draw = ImageDraw.Draw(img)
-    draw.rounded_rectangle([20, 20, width-20, height-20], radius=24, outline=accent, width=3)
-    try:
-        font_big = ImageFont.truetype("arial.ttf", 32)
-        font_small = ImageFont.truetype("arial.ttf", 20)
-    except Exception:
-        font_big = ImageFont.load_default()
-        font_small = ImageFont.load_default()
-    draw.text((40, 40), "Document Preview", fill=accent, font=font_small)
-    draw.multiline_text((40, 90), textwrap.fill(title or "Tài liệu", width=28), fill=fg, font=font_big, spacing=8)
-    buf = BytesIO()
-    img.save(buf, format="JPEG", optimize=True, quality=85)
-    buf.seek(0)
-    return buf
+def _convert_word_file_to_pdf(src_path: str, ext: str) -> str | None:
+    """Convert file .doc/.docx trên đĩa -> PDF cùng thư mục; trả đường dẫn PDF hoặc None."""
+    ext = ext.lower().lstrip(".")
+    if ext not in ("docx", "doc"):
+        return None
+    pdf_path = os.path.splitext(src_path)[0] + ".pdf"
+    if office_converter.convert_to_pdf(src_path, pdf_path):
+        return pdf_path
+
+    if ext == "docx":
+        try:
+            from docx2pdf import convert
+            convert(src_path, os.path.dirname(src_path))
+            if os.path.exists(pdf_path):
+                return pdf_path
+        except Exception:
+            pass
+    return None
 
 
 def _convert_word_to_pdf_bytes(file_bytes: bytes, ext: str) -> bytes | None:
-    """Convert .doc/.docx -> PDF bằng LibreOffice; fallback docx2pdf."""
+    """Convert .doc/.docx -> PDF qua pool LibreOffice (có timeout); fallback docx2pdf."""
     ext = ext.lower().lstrip(".")
     if ext not in ("docx", "doc"):
         return None
@@ -304,35 +391,11 @@ def _convert_word_to_pdf_bytes(file_bytes: bytes, ext: str) -> bytes | None:
     try:
         with open(src_path, "wb") as f:
             f.write(file_bytes)
-
-        soffice = shutil.which("soffice")
-        if not soffice and platform.system() == "Windows":
-            for c in [r"C:\Program Files\LibreOffice\program\soffice.exe",
-                      r"C:\Program Files (x86)\LibreOffice\program\soffice.exe"]:
-                if os.path.isfile(c):
-                    soffice = c
-                    break
-
-        if soffice:
-            try:
-                subprocess.run([soffice, "--headless", "--convert-to", "pdf", "--outdir", tmpdir, src_path],
-                               check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                pdf_path = os.path.join(tmpdir, "input.pdf")
-                if os.path.exists(pdf_path):
-                    return open(pdf_path, "rb").read()
-            except subprocess.CalledProcessError:
-                pass
-
-        if ext == "docx":
-            try:
-                from docx2pdf import convert
-                convert(src_path, tmpdir)
-                pdf_path = os.path.join(tmpdir, "input.pdf")
-                if os.path.exists(pdf_path):
-                    return open(pdf_path, "rb").read()
-            except Exception:
-                pass
-        return None
+        pdf_path = _convert_word_file_to_pdf(src_path, ext)
+        if not pdf_path:
+            return None
+        with open(pdf_path, "rb") as f:
+            return f.read()
     finally:
         shutil.rmtree(tmpdir, ignore_errors=True)
 
@@ -365,24 +428,26 @@ def _ensure_lookup_ids(school_id: str, category_id: str) -> tuple[str, str]:
         s = mongo_collections.schools.find_one({}, {"_id": 1})
         if not s:
             mongo_collections.schools.insert_many([
-                {"name": "ĐH Bách Khoa TP.HCM"},
-                {"name": "ĐH Khoa học Tự nhiên TP.HCM"},
-                {"name": "ĐH CNTT (UIT)"},
+                {"name": "ĐH Bách Khoa TP.HCM", "documentCount": 0},
+                {"name": "ĐH Khoa học Tự nhiên TP.HCM", "documentCount": 0},
+                {"name": "ĐH CNTT (UIT)", "documentCount": 0},
             ])
+            lookup_cache.bump("schools")
             s = mongo_collections.schools.find_one({}, {"_id": 1})
         school_id = str(s["_id"])
     if not category_id:
         c = mongo_collections.categories.find_one({}, {"_id": 1})
         if not c:
             mongo_collections.categories.insert_many([
-                {"name": "Toán cao cấp"},
-                {"name": "Cấu trúc dữ liệu & Giải thuật"},
-                {"name": "Cơ sở dữ liệu"},
-                {"name": "Mạng máy tính"},
-                {"name": "Hệ điều hành"},
-                {"name": "Kinh tế vi mô"},
-                {"name": "Marketing căn bản"},
+                {"name": "Toán cao cấp", "documentCount": 0},
+                {"name": "Cấu trúc dữ liệu & Giải thuật", "documentCount": 0},
+                {"name": "Cơ sở dữ liệu", "documentCount": 0},
+                {"name": "Mạng máy tính", "documentCount": 0},
+                {"name": "Hệ điều hành", "documentCount": 0},
+                {"name": "Kinh tế vi mô", "documentCount": 0},
+                {"name": "Marketing căn bản", "documentCount": 0},
             ])
+            lookup_cache.bump("categories")
             c = mongo_collections.categories.find_one({}, {"_id": 1})
         category_id = str(c["_id"])
     return school_id, category_id
@@ -467,19 +532,332 @@ def presign_upload():
     except Exception as e:
         return jsonify({"error": f"Auth lỗi: {e}"}), 401
 
-    bucket = os.getenv("S3_BUCKET_NAME")
-    region = os.getenv("AWS_REGION", "ap-southeast-1")
     key = f"documents/{uuid.uuid4()}.{ext}"
+    url = aws_service.presign_put_url(key, content_type=ct, expires_in=900)  # 15 phút
+    if not url:
+        return jsonify({"error": "Không tạo được URL upload"}), 500
+    # Ghi chủ sở hữu key để /register chỉ cho đúng user đăng ký (TTL chung với multipart)
+    mongo_collections.multipart_uploads.insert_one({
+        "_id": f"presign:{key}",
+        "key": key,
+        "userId": _uid,
+        "ext": ext,
+        "status": "presigned",
+        "createdAt": datetime.utcnow(),
+    })
+    return jsonify({"key": key, "url": url}), 200
+
+
+def _load_multipart(data: dict, user_oid):
+    """Lấy bản ghi multipart của user hiện tại theo {key, uploadId}; trả (record, error_response)."""
+    key = (data.get("key") or "").strip()
+    upload_id = (data.get("uploadId") or "").strip()
+    if not key or not upload_id:
+        return None, (jsonify({"error": "Thiếu key hoặc uploadId"}), 400)
+    rec = mongo_collections.multipart_uploads.find_one({"_id": upload_id, "key": key})
+    # Bản ghi "presigned" chỉ giữ chủ sở hữu của key PUT 1 lần, không phải phiên multipart
+    if not rec or rec.get("userId") != user_oid or rec.get("status") == "presigned":
+        return None, (jsonify({"error": "Không tìm thấy phiên upload"}), 404)
+    return rec, None
+
+
+def _presign_parts(key: str, upload_id: str, part_numbers) -> list:
+    parts = []
+    for n in part_numbers:
+        url = aws_service.presign_upload_part(key, upload_id, n)
+        if url:
+            parts.append({"partNumber": n, "url": url})
+    return parts
+
+
+@documents_bp.route("/multipart/initiate", methods=["POST"])
+def multipart_initiate():
+    """
+    Bắt đầu multipart upload trực tiếp lên S3 cho file lớn.
+    Body: { "ext": "pdf|docx|doc", "contentType": "...", "size": <bytes> }
+    Trả: { key, uploadId, partSize, partCount, parts: [{partNumber, url}] }
+    (tối đa MULTIPART_PRESIGN_BATCH URL; phần còn lại lấy qua /multipart/presign)
+    """
+    data = request.get_json() or {}
+    ext = (data.get("ext") or "pdf").lower().strip(".")
+    if ext not in ALLOWED_DOC_EXT:
+        return jsonify({"error": "Định dạng không hợp lệ"}), 400
+    try:
+        size = int(data.get("size") or 0)
+    except (TypeError, ValueError):
+        size = 0
+    if size <= 0:
+        return jsonify({"error": "Thiếu kích thước file (size)"}), 400
+    if size > DIRECT_UPLOAD_MAX_MB * 1024 * 1024:
+        return jsonify({"error": f"File quá lớn. Giới hạn {DIRECT_UPLOAD_MAX_MB}MB."}), 413
+    try:
+        user_oid, _ = _get_current_user_strict()
+    except Exception as e:
+        return jsonify({"error": f"Auth lỗi: {e}"}), 401
+
+    ct = data.get("contentType") or "application/octet-stream"
+    key = f"documents/{uuid.uuid4()}.{ext}"
+    upload_id = aws_service.create_multipart_upload(key, content_type=ct)
+    if not upload_id:
+        return jsonify({"error": "Không khởi tạo được upload"}), 500
+
+    part_size = MULTIPART_PART_MB * 1024 * 1024
+    part_count = max(1, -(-size // part_size))
+    mongo_collections.multipart_uploads.insert_one({
+        "_id": upload_id,
+        "key": key,
+        "userId": user_oid,
+        "ext": ext,
+        "size": size,
+        "partSize": part_size,
+        "partCount": part_count,
+        "status": "uploading",
+        "createdAt": datetime.utcnow(),
+    })
+    return jsonify({
+        "key": key,
+        "uploadId": upload_id,
+        "partSize": part_size,
+        "partCount": part_count,
+        "parts": _presign_parts(key, upload_id, range(1, min(part_count, MULTIPART_PRESIGN_BATCH) + 1)),
+    }), 200
+
+
+@documents_bp.route("/multipart/presign", methods=["POST"])
+def multipart_presign():
+    """
+    Cấp thêm URL cho các part (tiếp tục upload hoặc URL hết hạn).
+    Body: { key, uploadId, partNumbers: [..] }
+    """
+    data = request.get_json() or {}
+    try:
+        user_oid, _ = _get_current_user_strict()
+    except Exception as e:
+        return jsonify({"error": f"Auth lỗi: {e}"}), 401
+    rec, err = _load_multipart(data, user_oid)
+    if err:
+        return err
+    try:
+        numbers = sorted({int(n) for n in (data.get("partNumbers") or [])})
+    except (TypeError, ValueError):
+        return jsonify({"error": "partNumbers không hợp lệ"}), 400
+    numbers = [n for n in numbers if 1 <= n <= rec["partCount"]][:MULTIPART_PRESIGN_BATCH]
+    if not numbers:
+        return jsonify({"error": "Thiếu partNumbers"}), 400
+    return jsonify({"parts": _presign_parts(rec["key"], rec["_id"], numbers)}), 200
+
 
-    s3 = boto3.client("s3", region_name=region,
-                      aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                      aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"))
-    url = s3.generate_presigned_url(
-        ClientMethod="put_object",
-        Params={"Bucket": bucket, "Key": key, "ContentType": ct},
-        ExpiresIn=900  # 15 phút
+@documents_bp.route("/multipart/parts", methods=["POST"])
+def multipart_list_parts():
+    """
+    Các part S3 đã nhận (để FE resume: chỉ upload các part còn thiếu).
+    Body: { key, uploadId } -> { parts: [{partNumber, etag, size}], partCount }
+    """
+    data = request.get_json() or {}
+    try:
+        user_oid, _ = _get_current_user_strict()
+    except Exception as e:
+        return jsonify({"error": f"Auth lỗi: {e}"}), 401
+    rec, err = _load_multipart(data, user_oid)
+    if err:
+        return err
+    try:
+        parts = aws_service.list_parts(rec["key"], rec["_id"])
+    except Exception as e:
+        return jsonify({"error": f"Không lấy được danh sách part: {e}"}), 502
+    return jsonify({
+        "partCount": rec["partCount"],
+        "parts": [{"partNumber": p["PartNumber"], "etag": p["ETag"], "size": p["Size"]} for p in parts],
+    }), 200
+
+
+@documents_bp.route("/multipart/complete", methods=["POST"])
+def multipart_complete():
+    """
+    Hoàn tất multipart upload (server gọi CompleteMultipartUpload).
+    Body: { key, uploadId, parts?: [{partNumber, etag}] } – bỏ trống parts thì lấy từ S3.
+    Sau đó FE gọi /register với s3Key = key.
+    """
+    data = request.get_json() or {}
+    try:
+        user_oid, _ = _get_current_user_strict()
+    except Exception as e:
+        return jsonify({"error": f"Auth lỗi: {e}"}), 401
+    rec, err = _load_multipart(data, user_oid)
+    if err:
+        return err
+    if rec.get("status") == "completed":
+        return jsonify({"key": rec["key"], "status": "completed"}), 200
+
+    parts = None
+    if data.get("parts"):
+        try:
+            parts = [{"PartNumber": int(p["partNumber"]), "ETag": str(p["etag"])} for p in data["parts"]]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "parts không hợp lệ"}), 400
+    if not aws_service.complete_multipart_upload(rec["key"], rec["_id"], parts):
+        return jsonify({"error": "Không hoàn tất được upload (thiếu part?)"}), 409
+
+    mongo_collections.multipart_uploads.update_one(
+        {"_id": rec["_id"]}, {"$set": {"status": "completed", "completedAt": datetime.utcnow()}}
     )
-    return jsonify({"key": key, "url": url}), 200
+    return jsonify({"key": rec["key"], "status": "completed"}), 200
+
+
+@documents_bp.route("/multipart/abort", methods=["POST"])
+def multipart_abort():
+    """Huỷ multipart upload, S3 xoá các part đã nhận. Body: { key, uploadId }"""
+    data = request.get_json() or {}
+    try:
+        user_oid, _ = _get_current_user_strict()
+    except Exception as e:
+        return jsonify({"error": f"Auth lỗi: {e}"}), 401
+    rec, err = _load_multipart(data, user_oid)
+    if err:
+        return err
+    aws_service.abort_multipart_upload(rec["key"], rec["_id"])
+    mongo_collections.multipart_uploads.delete_one({"_id": rec["_id"]})
+    return jsonify({"status": "aborted"}), 200
+
+
+def _build_enrichment(doc_id, s3_url: str, title: str, image_url: str | None = None,
+                      with_thumbnails: bool = True, fallback: bool = True) -> dict | None:
+    """
+    Trích text -> tóm tắt/keywords (AI) -> số trang -> thumbnail cho 1 tài liệu.
+    Trả dict các trường cần $set (None nếu không đọc được file).
+    fallback=False: AI không tóm tắt được thì dict không có summary/keywords/searchText
+    (giữ nguyên giá trị đang có, caller coi là lỗi) thay vì tóm tắt cơ bản từ title/text.
+    Dùng chung cho xử lý nền sau /register và scripts/reenrich.py.
+    """
+    s3_key = (_parse_s3_url(s3_url)[1] or urlparse(s3_url).path).lower()
+    is_pdf = s3_key.endswith(".pdf")
+    text = ""
+    summary, keywords = None, None
+    page_count = 0
+    cover_img = None
+    pdf_bytes = None
+
+    # PDF lớn: đọc lười bằng ranged GET (xref + các trang cần + trang 1 cho thumbnail)
+    lazy_doc = _open_lazy_s3_pdf(s3_url) if is_pdf else None
+    if lazy_doc is not None:
+        try:
+            preview = _lazy_pdf_preview(lazy_doc, render_cover=with_thumbnails and not image_url)
+            page_count, text, cover_img = preview["pages"], preview["text"], preview["cover"]
+            print(f"[Register] Đọc lười {page_count} trang: {lazy_doc.source.get_stats()}")
+        finally:
+            lazy_doc.close()
+
+    # File nhỏ, Word, hoặc PDF scan (cần OCR/Vision trên toàn bộ file): tải cả file
+    if lazy_doc is None or len(text.strip()) < 100:
+        file_bytes = _fetch_s3_bytes(s3_url)
+        if not file_bytes:
+            return None
+        pdf_bytes = file_bytes if is_pdf else None
+        if not pdf_bytes and s3_key.endswith((".docx", ".doc")):
+            pdf_bytes = _convert_word_to_pdf_bytes(file_bytes, s3_key.rsplit(".", 1)[-1])
+        text = ""
+
+    if pdf_bytes:
+        # Sử dụng hàm smart để trích text từ nhiều phần cho tài liệu dài
+        page_count = _get_pdf_page_count(pdf_bytes)
+        if page_count > 100:
+            # Tài liệu quá dài (>100 trang): chỉ lấy 50 trang đầu để tóm tắt
+            text = _extract_text_from_pdf_bytes_smart(pdf_bytes, max_pages=50)
+        else:
+            # Tài liệu ngắn: lấy tất cả hoặc 6 trang đầu
+            text = _extract_text_from_pdf_bytes(pdf_bytes, max_pages=min(6, page_count))
+        if not text or len(text.strip()) < 100:
+            print(f"[Register] Text quá ngắn ({len(text) if text else 0} ký tự), thử OCR...")
+            # Với tài liệu dài, OCR nhiều trang hơn để có đủ nội dung
+            ocr_pages = 10 if page_count > 100 else 5
+            ocr_text = _ocr_text_from_pdf_bytes(pdf_bytes, pages_max=ocr_pages, scale=2.0)
+            if ocr_text and len(ocr_text.strip()) > len(text.strip() if text else ""):
+                text = ocr_text
+                print(f"[Register] OCR thành công, sử dụng text từ OCR: {len(text)} ký tự")
+            elif not text:
+                text = ocr_text  # Sử dụng OCR text ngay cả khi ngắn nếu không có text nào
+            
+            # Nếu vẫn không có text (PDF scan, tesseract không có), thử Gemini Vision API
+            if (not text or len(text.strip()) < 50) and USE_AI and ai_service:
+                print(f"[Register] Thử sử dụng Gemini Vision API để OCR và tóm tắt trực tiếp...")
+                try:
+                    vision_summary, vision_keywords = ai_service.extract_and_summarize_from_pdf_images(
+                        pdf_bytes, max_pages=10, page_count=page_count
+                    )
+                    if vision_summary:
+                        # Sử dụng summary từ Gemini Vision, không cần text nữa
+                        summary = vision_summary
+                        keywords = vision_keywords
+                        print(f"[Register] Gemini Vision thành công: summary={len(vision_summary)} ký tự")
+                        # Đặt text rỗng vì đã có summary từ Vision API
+                        text = ""  # Không cần text nữa vì đã có summary
+                except Exception as e:
+                    print(f"[Register] Lỗi khi dùng Gemini Vision: {e}")
+                    import traceback
+                    traceback.print_exc()
+    elif s3_key.endswith(".docx"):
+        # không convert tại đây để tiết kiệm thời gian; chỉ fallback text thô nếu cần
+        pass
+
+    # Lưu ý: summary có thể đã được tạo từ Gemini Vision API ở trên
+    # Chỉ tóm tắt bằng text nếu chưa có summary từ Vision API
+    if USE_AI and ai_service and text and len(text.strip()) > 50 and not summary:
+        try:
+            print(f"[AI Summary] Bắt đầu tóm tắt tài liệu: {page_count} trang, text length: {len(text)} ký tự")
+            # Truyền page_count để AI service biết đây là tài liệu dài
+            summary, keywords = ai_service.summarize_content(text, page_count=page_count)
+            print(f"[AI Summary] Tóm tắt thành công: summary length={len(summary) if summary else 0}, keywords count={len(keywords) if keywords else 0}")
+        except Exception as e:
+            print(f"[AI Summary] Lỗi khi tóm tắt: {e}")
+            import traceback
+            traceback.print_exc()
+            summary, keywords = None, None
+    ai_summary = bool(summary)
+
+    # Nếu không có summary, tạo tóm tắt cơ bản dựa trên title và metadata
+    if not summary and fallback:
+        if not text or len(text.strip()) < 50:
+            # PDF scan hoặc không có text: tạo tóm tắt dựa trên title
+            if page_count > 100:
+                summary = f"Tài liệu {title} ({page_count} trang). Đây là một tài liệu dài về chủ đề được đề cập trong tiêu đề. Tài liệu có thể chứa nội dung quan trọng về {title.lower()}."
+            else:
+                summary = f"Tài liệu {title} ({page_count} trang). Tài liệu về chủ đề được đề cập trong tiêu đề."
+            print(f"[AI Summary] Tạo tóm tắt cơ bản từ title: {summary[:100]}...")
+        else:
+            # Có text nhưng ngắn: sử dụng text làm summary
+            summary = _plain_summary(text, title)
+    if not keywords and (ai_summary or fallback):
+        seed = (text or f"{title}").lower()
+        keywords = _naive_keywords(seed, 12)
+
+    # Thumbnail nhiều size: từ ảnh bìa FE gửi lên, nếu không có thì render trang đầu PDF
+    final_img = image_url
+    thumbnails = None
+    if with_thumbnails and image_url:
+        cover_bytes = _fetch_s3_bytes(image_url)
+        thumbnails = thumbnail_service.from_image(doc_id, cover_bytes) if cover_bytes else None
+    elif with_thumbnails and pdf_bytes:
+        thumbnails = thumbnail_service.from_pdf(doc_id, pdf_bytes)
+    elif cover_img is not None:
+        thumbnails = thumbnail_service.from_pil(doc_id, cover_img)
+    if not final_img and thumbnails:
+        final_img = thumbnails.get("large")
+
+    if pdf_bytes:
+        page_count = _get_pdf_page_count(pdf_bytes)
+
+    update_fields = {"image_url": final_img}
+    if thumbnails:
+        update_fields["thumbnails"] = thumbnails
+    if page_count:
+        update_fields["pages"] = page_count
+    if ai_summary or fallback:
+        update_fields["summary"] = summary
+        update_fields["keywords"] = keywords
+        # Cập nhật searchText khi có summary/keywords mới
+        update_fields["searchText"] = create_normalized_text(title or "", summary or "", keywords or [])
+
+    return update_fields
 
 
 @documents_bp.route("/register", methods=["POST"])
@@ -509,8 +887,6 @@ def register_document():
         if not s3_key:
             return jsonify({"error": "Thiếu s3Key"}), 400
 
-        school_id, category_id = _ensure_lookup_ids(school_id, category_id)
-
         # xác thực user
         try:
             current_user_oid, uploader_name = _get_current_user_strict()
@@ -523,6 +899,44 @@ def register_document():
         region = os.getenv("AWS_REGION", "ap-southeast-1")
         s3_url = f"https://{bucket}.s3.{region}.amazonaws.com/{s3_key}"
 
+        # Key phải do chính user upload (có bản ghi presign/multipart) và chỉ đăng ký 1 lần:
+        # chuyển nguyên tử completed|presigned -> registered, không khớp thì từ chối
+        upload_rec = mongo_collections.multipart_uploads.find_one_and_update(
+            {"key": s3_key, "userId": current_user_oid, "status": {"$in": ["completed", "presigned"]}},
+            {"$set": {"status": "registered", "registeredAt": datetime.utcnow()}},
+            projection={"status": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if not upload_rec:
+            own = mongo_collections.multipart_uploads.find_one(
+                {"key": s3_key, "userId": current_user_oid}, {"status": 1}
+            )
+            if own and own.get("status") == "uploading":
+                return jsonify({"error": "Upload chưa hoàn tất (gọi /multipart/complete trước)"}), 409
+            if own and own.get("status") == "registered":
+                return jsonify({"error": "File này đã được đăng ký"}), 409
+            return jsonify({"error": "Không có quyền đăng ký file này"}), 403
+
+        def _release_upload():
+            # Đăng ký thất bại: trả bản ghi về trạng thái cũ để user gọi lại
+            mongo_collections.multipart_uploads.update_one(
+                {"_id": upload_rec["_id"], "status": "registered"},
+                {"$set": {"status": upload_rec["status"]}, "$unset": {"registeredAt": ""}},
+            )
+
+        if mongo_collections.documents.find_one({"s3_url": s3_url}, {"_id": 1}):
+            return jsonify({"error": "File này đã được đăng ký"}), 409
+        # PUT presign không báo về server: object phải tồn tại trên S3
+        if upload_rec.get("status") == "presigned" and not aws_service.exists(s3_key):
+            _release_upload()
+            return jsonify({"error": "Không tìm thấy file trên S3 (upload chưa hoàn tất?)"}), 409
+
+        try:
+            school_id, category_id = _ensure_lookup_ids(school_id, category_id)
+        except Exception:
+            _release_upload()
+            raise
+
         # Tạo document (đặt summary/keywords tạm)
         doc = Document(
             title=title,
@@ -541,121 +955,23 @@ def register_document():
         # Tạo searchText normalized (tạm thời với summary/keywords tạm)
         doc_dict["searchText"] = create_normalized_text(title, doc_dict.get("summary", ""), doc_dict.get("keywords", []))
         
-        result = mongo_collections.documents.insert_one(doc_dict)
+        try:
+            result = mongo_collections.documents.insert_one(doc_dict)
+        except Exception:
+            _release_upload()
+            raise
         doc_id = result.inserted_id
+        lookup_counts.document_added(doc_dict)
 
         # Xử lý AI/thumbnail bất đồng bộ
         def _bg_enrich():
             try:
-                r = requests.get(s3_url, timeout=45)
-                if r.status_code >= 400:
-                    return
-                pdf_bytes = r.content if s3_key.lower().endswith(".pdf") else None
-                if not pdf_bytes and s3_key.lower().endswith((".docx", ".doc")):
-                    pdf_bytes = _convert_word_to_pdf_bytes(r.content, s3_key.rsplit(".", 1)[-1])
-
-                text = ""
-                if pdf_bytes:
-                    # Sử dụng hàm smart để trích text từ nhiều phần cho tài liệu dài
-                    page_count = _get_pdf_page_count(pdf_bytes)
-                    if page_count > 100:
-                        # Tài liệu quá dài (>100 trang): chỉ lấy 50 trang đầu để tóm tắt
-                        text = _extract_text_from_pdf_bytes_smart(pdf_bytes, max_pages=50)
-                    else:
-                        # Tài liệu ngắn: lấy tất cả hoặc 6 trang đầu
-                        text = _extract_text_from_pdf_bytes(pdf_bytes, max_pages=min(6, page_count))
-                    if not text or len(text.strip()) < 100:
-                        print(f"[Register] Text quá ngắn ({len(text) if text else 0} ký tự), thử OCR...")
-                        # Với tài liệu dài, OCR nhiều trang hơn để có đủ nội dung
-                        ocr_pages = 10 if page_count > 100 else 5
-                        ocr_text = _ocr_text_from_pdf_bytes(pdf_bytes, pages_max=ocr_pages, scale=2.0)
-                        if ocr_text and len(ocr_text.strip()) > len(text.strip() if text else ""):
-                            text = ocr_text
-                            print(f"[Register] OCR thành công, sử dụng text từ OCR: {len(text)} ký tự")
-                        elif not text:
-                            text = ocr_text  # Sử dụng OCR text ngay cả khi ngắn nếu không có text nào
-                        
-                        # Nếu vẫn không có text (PDF scan, tesseract không có), thử Gemini Vision API
-                        if (not text or len(text.strip()) < 50) and USE_AI and ai_service:
-                            print(f"[Register] Thử sử dụng Gemini Vision API để OCR và tóm tắt trực tiếp...")
-                            try:
-                                vision_summary, vision_keywords = ai_service.extract_and_summarize_from_pdf_images(
-                                    pdf_bytes, max_pages=10, page_count=page_count
-                                )
-                                if vision_summary:
-                                    # Sử dụng summary từ Gemini Vision, không cần text nữa
-                                    summary = vision_summary
-                                    keywords = vision_keywords
-                                    print(f"[Register] Gemini Vision thành công: summary={len(vision_summary)} ký tự")
-                                    # Đặt text rỗng vì đã có summary từ Vision API
-                                    text = ""  # Không cần text nữa vì đã có summary
-                            except Exception as e:
-                                print(f"[Register] Lỗi khi dùng Gemini Vision: {e}")
-                                import traceback
-                                traceback.print_exc()
-                elif s3_key.lower().endswith(".docx"):
-                    # không convert tại đây để tiết kiệm thời gian; chỉ fallback text thô nếu cần
-                    pass
-
-                # Lưu ý: summary có thể đã được tạo từ Gemini Vision API ở trên
-                if 'summary' not in locals():
-                    summary, keywords = None, None
-                # Chỉ tóm tắt bằng text nếu chưa có summary từ Vision API
-                if USE_AI and ai_service and text and len(text.strip()) > 50 and not summary:
-                    try:
-                        print(f"[AI Summary] Bắt đầu tóm tắt tài liệu: {page_count} trang, text length: {len(text)} ký tự")
-                        # Truyền page_count để AI service biết đây là tài liệu dài
-                        summary, keywords = ai_service.summarize_content(text, page_count=page_count)
-                        print(f"[AI Summary] Tóm tắt thành công: summary length={len(summary) if summary else 0}, keywords count={len(keywords) if keywords else 0}")
-                    except Exception as e:
-                        print(f"[AI Summary] Lỗi khi tóm tắt: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        summary, keywords = None, None
-
-                # Nếu không có summary, tạo tóm tắt cơ bản dựa trên title và metadata
-                if not summary:
-                    if not text or len(text.strip()) < 50:
-                        # PDF scan hoặc không có text: tạo tóm tắt dựa trên title
-                        if page_count > 100:
-                            summary = f"Tài liệu {title} ({page_count} trang). Đây là một tài liệu dài về chủ đề được đề cập trong tiêu đề. Tài liệu có thể chứa nội dung quan trọng về {title.lower()}."
-                        else:
-                            summary = f"Tài liệu {title} ({page_count} trang). Tài liệu về chủ đề được đề cập trong tiêu đề."
-                        print(f"[AI Summary] Tạo tóm tắt cơ bản từ title: {summary[:100]}...")
-                    else:
-                        # Có text nhưng ngắn: sử dụng text làm summary
-                        summary = (text[:1200] + "…") if text and len(text) > 1200 else (text or f"Tài liệu: {title}.")
-                if not keywords:
-                    seed = (text or f"{title}").lower()
-                    keywords = _naive_keywords(seed, 12)
-
-                final_img = image_url
-                if not final_img and pdf_bytes:
-                    buf = _generate_thumb_from_pdf_bytes(pdf_bytes, 1.0)
-                    if buf:
-                        img_key = f"images/auto_thumb_{uuid.uuid4()}.jpg"
-                        final_img = aws_service.upload_file(buf, img_key, "image/jpeg")
-
-                page_count = _get_pdf_page_count(pdf_bytes) if pdf_bytes else 0
-
-                update_fields = {"summary": summary, "keywords": keywords, "image_url": final_img}
-                if page_count:
-                    update_fields["pages"] = page_count
-                
-                # Cập nhật searchText khi có summary/keywords mới
-                # Lấy title từ document hiện tại
-                current_doc = mongo_collections.documents.find_one({"_id": doc_id}, {"title": 1})
-                if current_doc:
-                    update_fields["searchText"] = create_normalized_text(
-                        current_doc.get("title", ""), 
-                        summary or "", 
-                        keywords or []
+                update_fields = _build_enrichment(doc_id, s3_url, title, image_url)
+                if update_fields:
+                    mongo_collections.documents.update_one(
+                        {"_id": doc_id},
+                        {"$set": update_fields}
                     )
-
-                mongo_collections.documents.update_one(
-                    {"_id": doc_id},
-                    {"$set": update_fields}
-                )
             except Exception as e:
                 print("[bg_enrich] lỗi:", e)
 
@@ -702,7 +1018,11 @@ def upload_document():
     - Trích text (PyMuPDF/OCR) -> Tóm tắt AI + keywords (chỉ OCR khi cần)
     - Tạo thumbnail tự sinh (nếu có PDF) hoặc placeholder
     - Upload S3 & Lưu Mongo (cộng điểm user)
+    File được spool ra đĩa + mmap, không đọc toàn bộ vào RAM.
     """
+    spool = None
+    workdir = None
+    upload_fh = None
     try:
         if "file" not in request.files:
             return jsonify({"error": "Thiếu file tài liệu (field 'file')."}), 400
@@ -734,24 +1054,29 @@ def upload_document():
         except InvalidTokenError as e:
             return jsonify({"error": f"Token không hợp lệ: {e}"}), 401
 
-        # Đọc bytes & chuẩn bị
-        # Tối ưu memory: Đọc file và sẽ giải phóng sau khi xử lý xong
-        raw_bytes = up_file.read()
+        # Spool file ra đĩa theo chunk (hash + nhận diện định dạng trong lúc copy),
+        # sau đó đọc qua mmap -> bộ nhớ mỗi upload không tỉ lệ với kích thước file
         ext = os.path.splitext(secure_filename(up_file.filename))[1].lower().lstrip(".") or "pdf"
+        spool = UploadSpool.from_stream(up_file.stream, max_bytes=current_app.config.get("MAX_CONTENT_LENGTH"))
+        sniffed = spool.kind
+        if (ext == "pdf") != (sniffed == "pdf"):
+            return jsonify({"error": "Nội dung file không khớp với định dạng (.pdf/.doc/.docx)."}), 400
+        raw_bytes = spool.map()
 
         # Convert Word -> PDF (tùy ENV)
         pdf_bytes = None
-        pdf_is_raw = False  # Flag để biết pdf_bytes có phải là raw_bytes không
+        pdf_path = None  # PDF trên đĩa để upload bằng file handle
         conversion_warning = None
         if ext in ("docx", "doc") and not SKIP_WORD_CONVERSION:
-            pdf_bytes = _convert_word_to_pdf_bytes(raw_bytes, ext)
-            if not pdf_bytes:
+            workdir = tempfile.mkdtemp(prefix="upload_")
+            src_path = spool.copy_to_path(os.path.join(workdir, f"input.{ext}"))
+            pdf_path = _convert_word_file_to_pdf(src_path, ext)
+            if pdf_path:
+                pdf_bytes = spool.map_path(pdf_path)
+            else:
                 conversion_warning = "Không thể chuyển Word sang PDF: đã upload file gốc và sinh thumbnail placeholder."
         elif ext == "pdf":
             pdf_bytes = raw_bytes
-            pdf_is_raw = True  # pdf_bytes là cùng object với raw_bytes
-        else:
-            pdf_bytes = None
 
         # Trích text – chỉ OCR khi cần
         text = ""
@@ -832,19 +1157,28 @@ def upload_document():
                 print(f"[AI Summary] Tạo tóm tắt cơ bản từ title: {summary[:100]}...")
             else:
                 # Có text nhưng ngắn: sử dụng text làm summary
-                summary = (text[:1200] + "…") if text and len(text) > 1200 else (text or f"Tài liệu: {title}.")
+                summary = _plain_summary(text, title)
         if not keywords:
             seed = (text or f"{title} {up_file.filename}").lower()
             keywords = _naive_keywords(seed, 12)
 
         image_url = None
+        thumbnails = None
+        # Cấp _id trước để thumbnail có key S3 cố định theo tài liệu
+        doc_oid = ObjectId()
+        has_cover = bool(image and image.filename)
         # ==== Song song: upload + render thumb ====
         with concurrent.futures.ThreadPoolExecutor(max_workers=4) as ex:
-            thumb_future = ex.submit(_generate_thumb_from_pdf_bytes, pdf_bytes, 1.0) if pdf_bytes else None
+            thumb_future = ex.submit(thumbnail_service.from_pdf, doc_oid, pdf_bytes) if pdf_bytes and not has_cover else None
 
-            if pdf_bytes:
+            # Upload từ file handle (multipart theo chunk), không tạo bản copy BytesIO
+            if pdf_path:
+                pdf_key = f"documents/{uuid.uuid4()}.pdf"
+                upload_fh = open(pdf_path, "rb")
+                upload_future = ex.submit(aws_service.upload_file, upload_fh, pdf_key, "application/pdf")
+            elif pdf_bytes:
                 pdf_key = f"documents/{uuid.uuid4()}.pdf"
-                upload_future = ex.submit(aws_service.upload_file, BytesIO(pdf_bytes), pdf_key, "application/pdf")
+                upload_future = ex.submit(aws_service.upload_file, spool.rewind(), pdf_key, "application/pdf")
             else:
                 obj_ext = "." + ext
                 obj_ct = up_file.mimetype or (
@@ -852,26 +1186,30 @@ def upload_document():
                     "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
                 )
                 doc_key = f"documents/{uuid.uuid4()}{obj_ext}"
-                upload_future = ex.submit(aws_service.upload_file, BytesIO(raw_bytes), doc_key, obj_ct)
+                upload_future = ex.submit(aws_service.upload_file, spool.rewind(), doc_key, obj_ct)
 
             s3_url = upload_future.result()
             if not s3_url:
                 return jsonify({"error": "Upload lên S3 thất bại."}), 500
 
-            if image and image.filename:
+            if has_cover:
                 try:
                     img_ext = os.path.splitext(secure_filename(image.filename))[1].lower() or ".jpg"
                     img_key = f"images/{uuid.uuid4()}{img_ext}"
                     img_ct = image.mimetype or "image/jpeg"
-                    image_url = aws_service.upload_file(image.stream, img_key, img_ct)
+                    cover_bytes = image.read()
+                    image_url = aws_service.upload_file(BytesIO(cover_bytes), img_key, img_ct)
+                    thumbnails = thumbnail_service.from_image(doc_oid, cover_bytes)
                 except Exception:
                     image_url = None
 
             if not image_url and thumb_future:
-                thumb_buf = thumb_future.result()
-                if thumb_buf:
-                    thumb_key = f"images/auto_thumb_{uuid.uuid4()}.jpg"
-                    image_url = aws_service.upload_file(thumb_buf, thumb_key, "image/jpeg")
+                thumbnails = thumb_future.result()
+            if not image_url and not thumbnails:
+                # Không có PDF để render (Word chưa convert) -> placeholder theo tiêu đề
+                thumbnails = thumbnail_service.placeholder(doc_oid, title)
+            if not image_url and thumbnails:
+                image_url = thumbnails.get("large")
 
         page_count = _get_pdf_page_count(pdf_bytes) if pdf_bytes else 0
 
@@ -888,12 +1226,19 @@ def upload_document():
             pages=page_count if page_count else None,
         )
         doc_dict = doc.to_mongo_doc()
+        doc_dict["_id"] = doc_oid
         doc_dict["uploaderName"] = uploader_name
+        # Hash tính trong lúc spool: dùng để phát hiện file trùng
+        doc_dict["sha256"] = spool.sha256
+        doc_dict["fileSize"] = spool.size
+        if thumbnails:
+            doc_dict["thumbnails"] = thumbnails
         
         # Tạo searchText normalized để tìm kiếm nhanh (có dấu/không dấu, có cách/không cách)
         doc_dict["searchText"] = create_normalized_text(title, summary, keywords or [])
         
         result = mongo_collections.documents.insert_one(doc_dict)
+        lookup_counts.document_added(doc_dict)
 
         # Cộng điểm + ghi transaction
         try:
@@ -908,21 +1253,12 @@ def upload_document():
         except Exception as e:
             print("[upload_document] lỗi cộng điểm:", e)
 
-
-        # Giải phóng memory sau khi upload xong
-        if 'raw_bytes' in locals():
-            del raw_bytes
-        # Chỉ xóa pdf_bytes nếu nó không phải là raw_bytes (tức là object mới được tạo)
-        if 'pdf_bytes' in locals() and pdf_bytes is not None and not pdf_is_raw:
-            del pdf_bytes
-        import gc
-        gc.collect()
-        
         payload = {
             "message": "Upload thành công",
             "document_id": str(result.inserted_id),
             "s3_url": s3_url,
             "image_url": image_url,
+            **thumbnail_fields({"_id": doc_oid, "thumbnails": thumbnails}),
             "summary": summary,
             "keywords": keywords,
         }
@@ -930,22 +1266,22 @@ def upload_document():
             payload["warning"] = conversion_warning
         return jsonify(payload), 200
 
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         print(f"[ERROR] upload_document: {e}")
         import traceback
         traceback.print_exc()
-        # Giải phóng memory nếu có exception (chỉ khi biến đã được định nghĩa)
-        try:
-            if 'raw_bytes' in locals():
-                del raw_bytes
-        except:
-            pass
-        try:
-            if 'pdf_bytes' in locals() and 'pdf_is_raw' in locals() and not pdf_is_raw:
-                del pdf_bytes
-        except:
-            pass
         return jsonify({"error": f"Lỗi server nội bộ: {e}"}), 500
+    finally:
+        # Giải phóng mmap/file tạm (bộ nhớ không phụ thuộc GC)
+        raw_bytes = pdf_bytes = None
+        if upload_fh is not None:
+            upload_fh.close()
+        if spool is not None:
+            spool.close()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
 
 
 # ===================== LIST =====================
@@ -969,104 +1305,26 @@ def get_documents():
         search_result = SearchService.search_documents(params, use_cache=True)
         docs = search_result["documents"]
         total_count = search_result["total"]
-
-        # Chuẩn bị map thống kê phản ứng/bình luận
-        doc_ids = [doc.get("_id") for doc in docs if doc.get("_id")]
-        reaction_map = {}
-        comment_map = {}
-        if doc_ids:
-            try:
-                reaction_pipeline = [
-                    {"$match": {"documentId": {"$in": doc_ids}}},
-                    {
-                        "$group": {
-                            "_id": "$documentId",
-                            "likes": {
-                                "$sum": {
-                                    "$cond": [
-                                        {"$eq": ["$reaction", "like"]},
-                                        1,
-                                        0,
-                                    ]
-                                }
-                            },
-                            "dislikes": {
-                                "$sum": {
-                                    "$cond": [
-                                        {"$eq": ["$reaction", "dislike"]},
-                                        1,
-                                        0,
-                                    ]
-                                }
-                            },
-                        }
-                    },
-                ]
-                for row in mongo_collections.document_reactions.aggregate(reaction_pipeline):
-                    reaction_map[str(row.get("_id"))] = {
-                        "likes": row.get("likes", 0),
-                        "dislikes": row.get("dislikes", 0),
-                    }
-            except Exception as agg_err:
-                print("[get_documents] aggregate reactions error:", agg_err)
-
-            try:
-                comment_pipeline = [
-                    {"$match": {"documentId": {"$in": doc_ids}}},
-                    {"$group": {"_id": "$documentId", "count": {"$sum": 1}}},
-                ]
-                for row in mongo_collections.document_comments.aggregate(comment_pipeline):
-                    comment_map[str(row.get("_id"))] = row.get("count", 0)
-            except Exception as agg_err:
-                print("[get_documents] aggregate comments error:", agg_err)
+        # Kết quả tìm kiếm được cache vài phút: đọc lại likes/dislikes/commentCount của trang
+        # từ primary (document cũ chưa có bộ đếm thì đếm 1 lượt cho cả trang và lưu lại)
+        docs = document_counters.fresh(docs)
 
         # Tối ưu: Load tất cả schools/categories/users một lần thay vì N queries
-        school_ids = set()
-        category_ids = set()
-        user_ids = set()
+        # (batch loader: 1 query mỗi loại cho id chưa có trong hot cache)
         pages_to_update = []  # Collect updates để thực hiện sau
-        
-        for doc in docs:
-            sid = doc.get("schoolId") or doc.get("school_id")
-            if sid:
-                try:
-                    school_ids.add(sid if isinstance(sid, ObjectId) else ObjectId(str(sid)))
-                except Exception:
-                    pass
-            
-            cid = doc.get("categoryId") or doc.get("category_id")
-            if cid:
-                try:
-                    category_ids.add(cid if isinstance(cid, ObjectId) else ObjectId(str(cid)))
-                except Exception:
-                    pass
-            
-            uid = doc.get("userId") or doc.get("user_id")
-            if uid:
-                try:
-                    user_ids.add(uid if isinstance(uid, ObjectId) else ObjectId(str(uid)))
-                except Exception:
-                    pass
-
-        # Load tất cả schools/categories/users trong 1 query mỗi loại
-        school_map = {}
-        if school_ids:
-            for s in mongo_collections.schools.find({"_id": {"$in": list(school_ids)}}):
-                school_map[str(s["_id"])] = {"_id": str(s["_id"]), "name": s.get("name", "")}
-        
-        category_map = {}
-        if category_ids:
-            for c in mongo_collections.categories.find({"_id": {"$in": list(category_ids)}}):
-                category_map[str(c["_id"])] = {"_id": str(c["_id"]), "name": c.get("name", "")}
-        
-        user_map = {}
-        if user_ids:
-            for u in mongo_collections.users.find({"_id": {"$in": list(user_ids)}}):
-                user_map[str(u["_id"])] = {
-                    "_id": str(u["_id"]),
-                    "username": u.get("username", ""),
-                    "name": u.get("fullName") or u.get("name", "")
-                }
+        loader = entity_loader()
+        school_map = {
+            k: {"_id": k, "name": s.get("name", "")}
+            for k, s in loader.load_many("schools", (d.get("schoolId") or d.get("school_id") for d in docs)).items()
+        }
+        category_map = {
+            k: {"_id": k, "name": c.get("name", "")}
+            for k, c in loader.load_many("categories", (d.get("categoryId") or d.get("category_id") for d in docs)).items()
+        }
+        user_map = {
+            k: {"_id": k, "username": u.get("username", ""), "name": u.get("fullName") or u.get("name", "")}
+            for k, u in loader.load_many("users", (d.get("userId") or d.get("user_id") for d in docs)).items()
+        }
 
         # Map kết quả
         result = []
@@ -1105,10 +1363,9 @@ def get_documents():
                 else:
                     pages_to_update.append((doc_id_obj, 0))
 
-            reactions = reaction_map.get(doc_id_str, {})
-            likes = reactions.get("likes", 0)
-            dislikes = reactions.get("dislikes", 0)
-            comment_count = comment_map.get(doc_id_str, 0)
+            # Bộ đếm denormalized trên document (không aggregate reactions/comments)
+            counters = counter_fields(doc)
+            likes, dislikes, comment_count = counters["likes"], counters["dislikes"], counters["commentCount"]
 
             out = {
                 "_id": doc_id_str,
@@ -1130,6 +1387,7 @@ def get_documents():
                 "dislikes": dislikes,
                 "commentCount": comment_count,
                 "totalReviews": likes + dislikes + comment_count,
+                **thumbnail_fields(doc),
             }
 
             # Join school/category/user từ maps đã load
@@ -1215,47 +1473,29 @@ def get_document_detail(doc_id):
     proj = {
         "title": 1, "summary": 1, "keywords": 1, "image_url": 1, "s3_url": 1,
         "schoolId": 1, "categoryId": 1, "userId": 1, "uploaderName": 1,
-        "createdAt": 1, "created_at": 1
+        "createdAt": 1, "created_at": 1, "thumbnails": 1
     }
     d = mongo_collections.documents.find_one({"_id": _id}, proj)
     if not d:
         return jsonify({"error": "Không tìm thấy tài liệu"}), 404
 
+    loader = entity_loader()
+
     # School
-    school_name = None
-    sid = d.get("schoolId")
-    if sid:
-        try:
-            s = mongo_collections.schools.find_one({"_id": sid if isinstance(sid, ObjectId) else ObjectId(str(sid))}, {"name": 1})
-            if s:
-                school_name = s.get("name")
-        except Exception:
-            pass
+    s = loader.get("schools", d.get("schoolId"))
+    school_name = s.get("name") if s else None
 
     # Category
-    category_name = None
-    cid = d.get("categoryId")
-    if cid:
-        try:
-            c = mongo_collections.categories.find_one({"_id": cid if isinstance(cid, ObjectId) else ObjectId(str(cid))}, {"name": 1})
-            if c:
-                category_name = c.get("name")
-        except Exception:
-            pass
+    c = loader.get("categories", d.get("categoryId"))
+    category_name = c.get("name") if c else None
 
     # Uploader
     uploader = d.get("uploaderName")
     uploader_id_val = d.get("userId") or d.get("user_id")
     if not uploader and uploader_id_val:
-        try:
-            u = mongo_collections.users.find_one(
-                {"_id": uploader_id_val if isinstance(uploader_id_val, ObjectId) else ObjectId(str(uploader_id_val))},
-                {"fullName": 1, "username": 1, "name": 1, "email": 1}
-            )
-            if u:
-                uploader = u.get("fullName") or u.get("username") or u.get("name") or u.get("email")
-        except Exception:
-            pass
+        u = loader.get("users", uploader_id_val)
+        if u:
+            uploader = u.get("fullName") or u.get("username") or u.get("name") or u.get("email")
 
     created = d.get("createdAt") or d.get("created_at")
     page_count = (
@@ -1274,6 +1514,7 @@ def get_document_detail(doc_id):
         "summary": d.get("summary"),
         "keywords": d.get("keywords") or [],
         "image_url": d.get("image_url"),
+        **thumbnail_fields(d),
         "s3_url": d.get("s3_url"),
         "schoolName": school_name,
         "categoryName": category_name,
@@ -1291,8 +1532,7 @@ def get_document_reactions(doc_id):
     except Exception:
         return jsonify({"error": "document id không hợp lệ"}), 400
 
-    like_count = mongo_collections.document_reactions.count_documents({"documentId": doc_oid, "reaction": "like"})
-    dislike_count = mongo_collections.document_reactions.count_documents({"documentId": doc_oid, "reaction": "dislike"})
+    counters = document_counters.get(doc_oid)
 
     user_id, _ = _get_current_user_optional()
     my_reaction = None
@@ -1302,8 +1542,8 @@ def get_document_reactions(doc_id):
             my_reaction = doc.get("reaction")
 
     return jsonify({
-        "likes": like_count,
-        "dislikes": dislike_count,
+        "likes": counters["likes"],
+        "dislikes": counters["dislikes"],
         "myReaction": my_reaction,
     }), 200
 
@@ -1327,21 +1567,11 @@ def set_document_reaction(doc_id):
     if action not in {"like", "dislike", "none"}:
         return jsonify({"error": "action phải là like/dislike/none"}), 400
 
-    if action == "none":
-        mongo_collections.document_reactions.delete_one({"documentId": doc_oid, "userId": user_id})
-    else:
-        mongo_collections.document_reactions.update_one(
-            {"documentId": doc_oid, "userId": user_id},
-            {"$set": {"reaction": action, "updatedAt": datetime.utcnow()}},
-            upsert=True,
-        )
-
-    like_count = mongo_collections.document_reactions.count_documents({"documentId": doc_oid, "reaction": "like"})
-    dislike_count = mongo_collections.document_reactions.count_documents({"documentId": doc_oid, "reaction": "dislike"})
+    counters = document_counters.set_reaction(doc_oid, user_id, action)
 
     return jsonify({
-        "likes": like_count,
-        "dislikes": dislike_count,
+        "likes": counters["likes"],
+        "dislikes": counters["dislikes"],
         "myReaction": None if action == "none" else action,
     }), 200
 
@@ -1416,6 +1646,7 @@ def create_document_comment(doc_id):
         "createdAt": datetime.utcnow(),
     }
     result = mongo_collections.document_comments.insert_one(comment_doc)
+    document_counters.comment_added(doc_oid)
 
     payload = {
         "id": str(result.inserted_id),
@@ -1475,34 +1706,30 @@ def _parse_s3_url(s3_url: str):
     return None, None
 
 
-def _stream_boto3(bucket: str, key: str, range_header: str | None):
-    """Stream object từ S3 bằng boto3, hỗ trợ Range (cần cho pdf.js)."""
-    s3 = boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-    )
-    params = {"Bucket": bucket, "Key": key}
-    if range_header:
-        params["Range"] = range_header
-
-    obj = s3.get_object(**params)
+def _stream_boto3(bucket: str, key: str, range_header: str | None, download_name: str | None = None):
+    """Stream object từ S3 bằng client dùng chung của aws_service, hỗ trợ Range (cần cho pdf.js)."""
+    obj = aws_service.get_object(key, bucket=bucket, range_header=range_header)
     body = obj["Body"]
 
     def gen():
-        for chunk in body.iter_chunks(chunk_size=8192):
-            if chunk:
-                yield chunk
+        try:
+            for chunk in body.iter_chunks(chunk_size=64 * 1024):
+                if chunk:
+                    yield chunk
+        finally:
+            body.close()
 
     headers = {
-        "Content-Type": obj.get("ContentType", "application/pdf"),
+        "Content-Type": obj.get("ContentType", "application/octet-stream"),
         "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
     }
-    if "ContentLength" in obj and not range_header:
+    if "ContentLength" in obj:
         headers["Content-Length"] = str(obj["ContentLength"])
     if "ContentRange" in obj:
         headers["Content-Range"] = obj["ContentRange"]
+    if download_name:
+        headers["Content-Disposition"] = _encode_filename_for_header(download_name)
     status = 206 if "Content-Range" in headers else 200
     return Response(stream_with_context(gen()), status=status, headers=headers)
 
@@ -1558,80 +1785,60 @@ def _stream_boto3(bucket: str, key: str, range_header: str | None):
 #         return jsonify({"error": f"Không thể đọc PDF từ S3: {str(e)}"}), 502
 # # ... phía trên đã có import fitz, PIL, requests, v.v.
 
-@documents_bp.route("/<string:doc_id>/text", methods=["GET"])
-def get_document_text(doc_id):
+_PAGE_RE_1 = re.compile(r"^\s*page\s+\d+(\s*(/|of)\s*\d+)?\s*$", re.IGNORECASE)
+_PAGE_RE_2 = re.compile(r"^\s*\d+\s*/\s*\d+\s*$")
+_PAGE_RE_3 = re.compile(r"^\s*\d+\s*$")  # dòng chỉ là số
+
+
+def _normalize_document_text(raw: str) -> str:
     """
-    Trả về văn bản thuần đã CHUẨN HOÁ:
+    Chuẩn hoá văn bản thuần trích từ tài liệu:
       - Bỏ ngắt trang (\f)
       - Bỏ dòng số trang / 'Page x / y'
       - Ghép từ bị gạch nối ở cuối dòng
       - Gộp các dòng trong cùng đoạn thành 1 dòng (giữ khoảng trống giữa đoạn)
-    Response: { text: "..." }
     """
-    def _normalize_text(raw: str) -> str:
-        import re
-        if not raw:
-            return ""
+    if not raw:
+        return ""
 
-        # 1) thống nhất xuống dòng, bỏ form-feed (ngắt trang)
-        s = raw.replace("\r\n", "\n").replace("\r", "\n")
-        s = s.replace("\x0c", "\n").replace("\f", "\n")  # page breaks
-
-        # 2) bỏ header/footer kiểu "Page 1 of 69", "1 / 69", hoặc dòng chỉ có số
-        #   - xử lý theo dòng để an toàn
-        lines = s.split("\n")
-        cleaned = []
-        page_re_1 = re.compile(r"^\s*page\s+\d+(\s*(/|of)\s*\d+)?\s*$", re.IGNORECASE)
-        page_re_2 = re.compile(r"^\s*\d+\s*/\s*\d+\s*$")
-        page_re_3 = re.compile(r"^\s*\d+\s*$")  # dòng chỉ là số
-        for ln in lines:
-            l = ln.strip()
-            if not l:
-                cleaned.append(ln)
-                continue
-            if page_re_1.match(l) or page_re_2.match(l) or page_re_3.match(l):
-                # bỏ dòng số trang/header/footer
-                continue
+    # 1) thống nhất xuống dòng, bỏ form-feed (ngắt trang)
+    s = raw.replace("\r\n", "\n").replace("\r", "\n")
+    s = s.replace("\x0c", "\n").replace("\f", "\n")  # page breaks
+
+    # 2) bỏ header/footer kiểu "Page 1 of 69", "1 / 69", hoặc dòng chỉ có số
+    #   - xử lý theo dòng để an toàn
+    lines = s.split("\n")
+    cleaned = []
+    for ln in lines:
+        l = ln.strip()
+        if not l:
             cleaned.append(ln)
-        s = "\n".join(cleaned)
-
-        # 3) xoá khoảng trắng thừa đầu/cuối dòng
-        s = "\n".join([re.sub(r"\s+$", "", re.sub(r"^\s+", "", ln)) for ln in s.split("\n")])
+            continue
+        if _PAGE_RE_1.match(l) or _PAGE_RE_2.match(l) or _PAGE_RE_3.match(l):
+            # bỏ dòng số trang/header/footer
+            continue
+        cleaned.append(ln)
+    s = "\n".join(cleaned)
 
-        # 4) nối từ bị gạch nối ở cuối dòng: "thuật-\n toán" -> "thuật toán"
-        s = re.sub(r"(\w)-\n(\w)", r"\1\2", s)
+    # 3) xoá khoảng trắng thừa đầu/cuối dòng
+    s = "\n".join([ln.strip() for ln in s.split("\n")])
 
-        # 5) gộp các dòng đơn trong cùng đoạn thành 1 dòng:
-        #    - 2+ newline => giữ làm ngắt đoạn
-        #    - 1 newline giữa 2 chữ => thay bằng khoảng trắng
-        s = re.sub(r"[ \t]*\n[ \t]*(?=\S)", " ", s)  # newline đơn -> space
-        s = re.sub(r"(?:\n\s*){2,}", "\n\n", s)     # nhiều newline -> 2 newline
+    # 4) nối từ bị gạch nối ở cuối dòng: "thuật-\n toán" -> "thuật toán"
+    s = re.sub(r"(\w)-\n(\w)", r"\1\2", s)
 
-        # 6) bỏ khoảng trắng thừa
-        s = re.sub(r"[ \t]{2,}", " ", s)
-        s = s.strip()
+    # 5) gộp các dòng đơn trong cùng đoạn thành 1 dòng:
+    #    - 2+ newline => giữ làm ngắt đoạn
+    #    - 1 newline giữa 2 chữ => thay bằng khoảng trắng
+    s = re.sub(r"[ \t]*\n[ \t]*(?=\S)", " ", s)  # newline đơn -> space
+    s = re.sub(r"(?:\n\s*){2,}", "\n\n", s)     # nhiều newline -> 2 newline
 
-        return s
-
-    from bson.objectid import ObjectId
-    try:
-        _id = ObjectId(doc_id)
-    except Exception:
-        return jsonify({"error": "document id không hợp lệ"}), 400
-
-    d = mongo_collections.documents.find_one({"_id": _id}, {"s3_url": 1, "title": 1})
-    if not d or not d.get("s3_url"):
-        return jsonify({"error": "Không tìm thấy file"}), 404
+    # 6) bỏ khoảng trắng thừa
+    s = re.sub(r"[ \t]{2,}", " ", s)
+    return s.strip()
 
-    s3_url = d["s3_url"]
-    try:
-        r = requests.get(s3_url, timeout=45)
-        if r.status_code >= 400:
-            return jsonify({"error": f"Không tải được file từ S3: HTTP {r.status_code}"}), 502
-        file_bytes = r.content
-    except Exception as e:
-        return jsonify({"error": f"Lỗi tải file: {e}"}), 502
 
+def _extract_document_text(s3_url: str, file_bytes: bytes) -> str:
+    """Trích toàn bộ text (chưa chuẩn hoá) theo loại file."""
     text = ""
     low = s3_url.lower()
     try:
@@ -1647,15 +1854,296 @@ def get_document_text(doc_id):
                 text = _extract_text_from_pdf_bytes(pdf_bytes, max_pages=999)
     except Exception:
         text = ""
+    return text
+
+
+def _download_to_tempfile(url: str, suffix: str = "") -> str | None:
+    """Tải file từ URL xuống file tạm theo từng chunk (không giữ toàn bộ trong RAM)."""
+    fd, path = tempfile.mkstemp(prefix="dl_", suffix=suffix)
+    bucket, key = _parse_s3_url(url)
+    if bucket and key:
+        try:
+            os.close(fd)
+            aws_service.download_to_path(key, path, bucket=bucket)
+            return path
+        except Exception as e:
+            print(f"[S3] download_to_path lỗi, thử public URL: {e}")
+            fd = os.open(path, os.O_WRONLY | os.O_TRUNC | getattr(os, "O_BINARY", 0))
+    try:
+        with requests.get(url, stream=True, timeout=45) as r:
+            if r.status_code >= 400:
+                os.close(fd)
+                os.remove(path)
+                return None
+            with os.fdopen(fd, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1024 * 1024):
+                    if chunk:
+                        f.write(chunk)
+        return path
+    except Exception:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def _page_arg(name: str, default):
+    try:
+        return int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _page_window_error() -> str | None:
+    """Lỗi của ?fromPage/&toPage do client gửi (kiểm tra trước khi tải file); None nếu hợp lệ."""
+    to_page = _page_arg("toPage", None)
+    if to_page is None:
+        return None
+    if to_page <= 0:
+        return "toPage phải >= 1"
+    if to_page < max(1, _page_arg("fromPage", 1)):
+        return "toPage phải >= fromPage"
+    return None
+
+
+def _parse_page_window(total_pages: int) -> tuple[int, int]:
+    """Đọc ?fromPage/&toPage (1-based, bao gồm 2 đầu) và giới hạn kích thước cửa sổ."""
+    from_page = max(1, _page_arg("fromPage", 1))
+    default_to = total_pages if request.args.get("format") == "ndjson" else from_page + TEXT_PAGE_WINDOW_MAX - 1
+    to_page = min(total_pages, _page_arg("toPage", default_to))
+    if request.args.get("format") != "ndjson":
+        to_page = min(to_page, from_page + TEXT_PAGE_WINDOW_MAX - 1)
+    return from_page, to_page
+
+
+def _get_document_text_pages(_id: ObjectId):
+    """Trích text theo khoảng trang; bộ nhớ tỉ lệ với cửa sổ trang, không phải cả tài liệu."""
+    window_error = _page_window_error()
+    if window_error:
+        return jsonify({"error": window_error}), 400
+
+    d = mongo_collections.documents.find_one({"_id": _id}, {"s3_url": 1, "title": 1})
+    if not d or not d.get("s3_url"):
+        return jsonify({"error": "Không tìm thấy file"}), 404
+
+    s3_url = d["s3_url"]
+    ext = os.path.splitext(urlparse(s3_url).path)[1].lower()
+    # PDF lớn: đọc lười chỉ các trang trong cửa sổ (ranged GET), không tải cả file
+    lazy_doc = _open_lazy_s3_pdf(s3_url) if ext == ".pdf" else None
+    # Ưu tiên file trong disk cache (không xoá sau khi dùng), fallback file tạm
+    cached = _get_cached_s3_object(s3_url) if lazy_doc is None else None
+    owns_path = cached is None and lazy_doc is None
+    path = None
+    if lazy_doc is not None:
+        pass
+    elif cached:
+        path = cached.path
+    else:
+        try:
+            path = _download_to_tempfile(s3_url, suffix=ext)
+        except Exception as e:
+            return jsonify({"error": f"Lỗi tải file: {e}"}), 502
+        if not path:
+            return jsonify({"error": "Không tải được file từ S3"}), 502
+
+    pdf_doc = lazy_doc
+    try:
+        if pdf_doc is not None:
+            pass
+        elif ext == ".pdf":
+            pdf_doc = fitz.open(path)
+        elif ext == ".doc":
+            with open(path, "rb") as f:
+                converted = _convert_word_to_pdf_bytes(f.read(), "doc")
+            if converted:
+                pdf_doc = fitz.open(stream=converted, filetype="pdf")
+    except Exception as e:
+        s3_object_cache.release(cached)
+        if owns_path:
+            os.remove(path)
+        return jsonify({"error": f"Không mở được tài liệu: {e}"}), 502
+
+    if pdf_doc is None:
+        # DOCX (không có khái niệm trang) -> coi toàn bộ là trang 1
+        try:
+            with open(path, "rb") as f:
+                text = _normalize_document_text(_extract_text_from_docx_bytes(f.read()))
+        finally:
+            s3_object_cache.release(cached)
+        if owns_path:
+            os.remove(path)
+        pages_iter_source = [(1, text)]
+        total_pages = 1
+    else:
+        total_pages = pdf_doc.page_count
+
+    from_page, to_page = _parse_page_window(total_pages)
+
+    def iter_pages():
+        if pdf_doc is None:
+            for item in pages_iter_source:
+                if from_page <= item[0] <= to_page:
+                    yield item
+            return
+        for i in range(from_page - 1, to_page):
+            try:
+                raw = pdf_doc.load_page(i).get_text("text")
+            except Exception as e:
+                print(f"[Text Pages] Lỗi trích trang {i + 1}: {e}")
+                raw = ""
+            yield i + 1, _normalize_document_text(raw)
+
+    closed = []
+
+    def cleanup():
+        # Có thể được gọi từ cả finally của generator và call_on_close -> chỉ chạy 1 lần
+        if closed:
+            return
+        closed.append(True)
+        if pdf_doc is not None:
+            pdf_doc.close()
+            s3_object_cache.release(cached)
+            if owns_path and os.path.exists(path):
+                os.remove(path)
+
+    next_page = to_page + 1 if to_page < total_pages else None
+
+    if request.args.get("format") == "ndjson":
+        def gen():
+            try:
+                yield json.dumps({"type": "meta", "totalPages": total_pages,
+                                  "fromPage": from_page, "toPage": to_page},
+                                 ensure_ascii=False) + "\n"
+                for page_no, page_text in iter_pages():
+                    yield json.dumps({"type": "page", "page": page_no, "text": page_text},
+                                     ensure_ascii=False) + "\n"
+                yield json.dumps({"type": "end", "nextPage": next_page}) + "\n"
+            finally:
+                cleanup()
+        resp = Response(stream_with_context(gen()), mimetype="application/x-ndjson")
+        # Client ngắt trước chunk đầu / response không được iterate -> finally của gen() không chạy
+        resp.call_on_close(cleanup)
+        return resp
+
+    try:
+        pages = [{"page": n, "text": t} for n, t in iter_pages()]
+    finally:
+        cleanup()
+    return jsonify({
+        "pages": pages,
+        "fromPage": from_page,
+        "toPage": to_page,
+        "totalPages": total_pages,
+        "nextPage": next_page,
+    })
+
+
+def _text_response(text: str, etag: str):
+    resp = jsonify({"text": text})
+    resp.set_etag(etag)
+    # Cho phép trình duyệt giữ bản sao nhưng luôn hỏi lại bằng If-None-Match
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+@documents_bp.route("/<string:doc_id>/text", methods=["GET"])
+def get_document_text(doc_id):
+    """
+    Trả về văn bản thuần đã CHUẨN HOÁ (xem _normalize_document_text).
+    Văn bản được tính 1 lần rồi cache (gzip) trong GridFS; lần sau
+    không cần tải file từ S3 hay parse lại. Hỗ trợ ETag/If-None-Match -> 304.
+    Response: { text: "..." }
+
+    Chế độ theo trang (chỉ trích đúng khoảng trang được yêu cầu):
+      - ?fromPage=1&toPage=20  -> { pages: [{page, text}], totalPages, nextPage }
+      - ?format=ndjson         -> stream từng trang dạng NDJSON
+    """
+    try:
+        _id = ObjectId(doc_id)
+    except Exception:
+        return jsonify({"error": "document id không hợp lệ"}), 400
+
+    if (request.args.get("fromPage") or request.args.get("toPage")
+            or request.args.get("format") == "ndjson"):
+        return _get_document_text_pages(_id)
+
+    # 304 nhanh: chỉ đọc metadata GridFS, không đọc nội dung
+    if request.if_none_match:
+        cached_etag = document_text_cache.get_etag(_id)
+        if cached_etag and request.if_none_match.contains(cached_etag):
+            resp = Response(status=304)
+            resp.set_etag(cached_etag)
+            return resp
+
+    cached = document_text_cache.get(_id)
+    if cached:
+        text, etag = cached
+        return _text_response(text, etag)
+
+    d = mongo_collections.documents.find_one({"_id": _id}, {"s3_url": 1, "title": 1})
+    if not d or not d.get("s3_url"):
+        return jsonify({"error": "Không tìm thấy file"}), 404
+
+    s3_url = d["s3_url"]
+    try:
+        file_bytes = _fetch_s3_bytes(s3_url)
+        if not file_bytes:
+            return jsonify({"error": "Không tải được file từ S3"}), 502
+    except Exception as e:
+        return jsonify({"error": f"Lỗi tải file: {e}"}), 502
+
+    text = _normalize_document_text(_extract_document_text(s3_url, file_bytes))
+    del file_bytes
 
     if not text:
+        # Không cache placeholder để lần sau còn thử trích lại (OCR có thể khả dụng sau)
         title = d.get("title") or "Document"
-        text = f"{title}\n\n(Chưa thể trích xuất nội dung hoặc file là ảnh scan.)"
+        text = _normalize_document_text(f"{title}\n\n(Chưa thể trích xuất nội dung hoặc file là ảnh scan.)")
+        return _text_response(text, document_text_cache.make_etag(text))
 
-    return jsonify({"text": _normalize_text(text)})
+    etag = document_text_cache.set(_id, text)
+    if request.if_none_match and request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    return _text_response(text, etag)
 
 # app/controllers/documents.py  (chỉ hiển thị phần route /raw đã sửa)
 
+def _serve_cached_object(cached, download_name: str | None = None):
+    """Trả file từ disk cache, hỗ trợ Range (206) cho pdf.js. Bỏ pin entry khi response đóng."""
+    size = cached.size
+    headers = {
+        "Content-Type": cached.content_type or "application/octet-stream",
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if cached.etag:
+        headers["ETag"] = f'"{cached.etag}"'
+    if download_name:
+        headers["Content-Disposition"] = _encode_filename_for_header(download_name)
+
+    start, stop, status = 0, size, 200
+    rng = request.range
+    if rng is not None and rng.units == "bytes":
+        bounds = rng.range_for_length(size)
+        if bounds is None:
+            s3_object_cache.release(cached)
+            return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+        start, stop = bounds
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    headers["Content-Length"] = str(stop - start)
+    resp = Response(stream_with_context(cached.iter_range(start, stop - start)),
+                    status=status, headers=headers)
+    # Chạy cả khi client ngắt kết nối trước khi đọc hết / response không được iterate
+    resp.call_on_close(lambda: s3_object_cache.release(cached))
+    return resp
+
+
 @documents_bp.route("/<string:doc_id>/raw", methods=["GET"])
 def get_document_raw(doc_id):
     """
@@ -1663,6 +2151,10 @@ def get_document_raw(doc_id):
       - ?download=1 => ép tải xuống (Content-Disposition: attachment; filename="...")
       - không download => xem trước (iframe)
       - Hỗ trợ Range cho PDF
+    Chế độ giao file (mặc định theo RAW_DELIVERY_MODE, ghi đè bằng ?mode=):
+      - proxy    => stream bytes qua Flask (cho client không theo được redirect/CORS)
+      - redirect => 302 tới presigned GET URL ngắn hạn, S3 phục vụ trực tiếp
+      - url      => trả JSON { url, expiresIn } để client tự tải
     """
     try:
         _id = ObjectId(doc_id)
@@ -1681,15 +2173,48 @@ def get_document_raw(doc_id):
     range_h = request.headers.get("Range")
     safe_name = re.sub(r'[\\/:*?"<>|]+', "_", custom_name)
 
-    # 1) Thử stream trực tiếp theo URL đã lưu
+    mode = (request.args.get("mode") or RAW_DELIVERY_MODE).lower()
+    if mode in ("redirect", "url"):
+        bucket, key = _parse_s3_url(s3_url)
+        ext = os.path.splitext(key or "")[1] or ".bin"
+        url = aws_service.presign_get_url(
+            key,
+            expires_in=RAW_PRESIGN_TTL,
+            bucket=bucket,
+            content_disposition=_encode_filename_for_header(f"{safe_name}{ext}") if dl else None,
+        ) if key else None
+        if url:
+            if mode == "url":
+                return jsonify({"url": url, "expiresIn": RAW_PRESIGN_TTL}), 200
+            resp = redirect(url, code=302)
+            # Cho phép cache redirect ngắn hơn TTL của URL
+            resp.headers["Cache-Control"] = f"private, max-age={max(0, RAW_PRESIGN_TTL - 60)}"
+            return resp
+        # Không ký được URL -> rơi xuống proxy
+
+    # 0) Phục vụ từ disk cache nếu đã có (đọc Range bằng pread, không gọi S3 lại)
+    bucket, key = _parse_s3_url(s3_url)
+    cached = s3_object_cache.lookup(aws_service, bucket, key)
+    if cached:
+        ext = os.path.splitext(urlparse(s3_url).path)[1] or ".bin"
+        return _serve_cached_object(cached, safe_name + ext if dl else None)
+
+    # 1) Miss: stream thẳng từ S3 (byte đầu tiên không phải chờ tải cả file), tải vào cache ở nền
+    if bucket and key:
+        ext = os.path.splitext(key)[1] or ".bin"
+        s3_object_cache.fill_async(aws_service, bucket, key)
+        try:
+            return _stream_boto3(bucket, key, range_h, f"{safe_name}{ext}" if dl else None)
+        except Exception as e:
+            print(f"[raw] boto3 lỗi, thử public URL: {e}")
+
+    # 2) Fallback: stream theo URL đã lưu (public/presigned)
     try:
         fwd = {"Range": range_h} if range_h else {}
         r = requests.get(s3_url, headers=fwd, stream=True, timeout=20)
         if r.status_code < 400:
-            ctype = r.headers.get("Content-Type") or "application/octet-stream"
-
             def gen_req():
-                for chunk in r.iter_content(chunk_size=8192):
+                for chunk in r.iter_content(chunk_size=64 * 1024):
                     if chunk:
                         yield chunk
 
@@ -1708,53 +2233,84 @@ def get_document_raw(doc_id):
                 full_filename = f"{safe_name}{ext}"
                 resp.headers["Content-Disposition"] = _encode_filename_for_header(full_filename)
             return resp
-    except Exception:
-        pass
+        return jsonify({"error": f"Không thể đọc từ S3: HTTP {r.status_code}"}), 502
+    except Exception as e:
+        return jsonify({"error": f"Không thể đọc từ S3: {str(e)}"}), 502
 
-    # 2) Fallback: đọc trực tiếp từ S3 bằng boto3
-    bucket, key = _parse_s3_url(s3_url)
-    if not bucket or not key:
-        return jsonify({"error": "Không parse được S3 URL (bucket/key)."}), 500
 
-    try:
-        s3 = boto3.client(
-            "s3",
-            region_name=os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION"),
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-        )
-        params = {"Bucket": bucket, "Key": key}
-        if range_h:
-            params["Range"] = range_h
-        obj = s3.get_object(**params)
-        body = obj["Body"]
+# ===================== VIEW COUNT =====================
 
-        def gen():
-            for chunk in body.iter_chunks(chunk_size=8192):
-                if chunk:
-                    yield chunk
+@documents_bp.route("/<string:doc_id>/thumbnail", methods=["GET"])
+def get_document_thumbnail(doc_id):
+    """
+    Redirect tới thumbnail theo size (?size=small|medium|large, mặc định small).
+    Tài liệu cũ chưa có thumbnails được sinh lazy ở lần gọi đầu rồi lưu lại.
+    Lỗi tạm (S3/render) -> lưu placeholder kèm retryAt, sau THUMB_RETRY_AFTER giây thử sinh lại.
+    """
+    try:
+        _id = ObjectId(doc_id)
+    except Exception:
+        return jsonify({"error": "document id không hợp lệ"}), 400
 
-        headers = {
-            "Content-Type": obj.get("ContentType", "application/octet-stream"),
-            "Accept-Ranges": "bytes",
-        }
-        if "ContentLength" in obj and not range_h:
-            headers["Content-Length"] = str(obj["ContentLength"])
-        if "ContentRange" in obj:
-            headers["Content-Range"] = obj["ContentRange"]
-
-        if dl:
-            ext = os.path.splitext(key)[1] or ".bin"
-            full_filename = f"{safe_name}{ext}"
-            headers["Content-Disposition"] = _encode_filename_for_header(full_filename)
-
-        status = 206 if "Content-Range" in headers else 200
-        return Response(stream_with_context(gen()), status=status, headers=headers)
-    except Exception as e:
-        return jsonify({"error": f"Không thể đọc từ S3: {str(e)}"}), 502
+    size = (request.args.get("size") or "small").lower()
+    d = mongo_collections.documents.find_one(
+        {"_id": _id}, {"thumbnails": 1, "image_url": 1, "s3_url": 1, "title": 1}
+    )
+    if not d:
+        return jsonify({"error": "Không tìm thấy tài liệu"}), 404
 
+    thumbs = d.get("thumbnails") or {}
+    if not thumbs.get(size) or thumbnail_service.needs_retry(thumbs):
+        with thumbnail_service.doc_lock(_id):
+            fresh = mongo_collections.documents.find_one({"_id": _id}, {"thumbnails": 1}) or {}
+            thumbs = fresh.get("thumbnails") or {}
+            if not thumbs.get(size) or thumbnail_service.needs_retry(thumbs):
+                previous = thumbs
+                thumbs = None
+                if d.get("image_url"):
+                    cover_bytes = _fetch_s3_bytes(d["image_url"])
+                    thumbs = thumbnail_service.from_image(_id, cover_bytes) if cover_bytes else None
+                s3_url = d.get("s3_url") or ""
+                if not thumbs and s3_url.split("?", 1)[0].lower().endswith(".pdf"):
+                    pdf_bytes = _fetch_s3_bytes(s3_url)
+                    thumbs = thumbnail_service.from_pdf(_id, pdf_bytes) if pdf_bytes else None
+                if thumbs:
+                    mongo_collections.documents.update_one({"_id": _id}, {"$set": {"thumbnails": thumbs}})
+                elif previous.get("placeholder"):
+                    # Vẫn lỗi: giữ placeholder cũ, hẹn lần thử tiếp theo
+                    thumbs = {**previous, "retryAt": thumbnail_service.retry_at()}
+                    mongo_collections.documents.update_one(
+                        {"_id": _id}, {"$set": {"thumbnails.retryAt": thumbs["retryAt"]}}
+                    )
+                else:
+                    thumbs = thumbnail_service.placeholder(_id, d.get("title") or "", retry=True)
+                    if thumbs:
+                        mongo_collections.documents.update_one({"_id": _id}, {"$set": {"thumbnails": thumbs}})
+
+    url = (thumbs or {}).get(size) or (thumbs or {}).get("small") or d.get("image_url")
+    if not url:
+        return jsonify({"error": "Không tạo được thumbnail"}), 404
+    resp = redirect(url, code=302)
+    # Key thumbnail cố định -> cho phép client cache redirect (placeholder tạm: cache ngắn)
+    max_age = 300 if (thumbs or {}).get("placeholder") else 86400
+    resp.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return resp
+
+
+@documents_bp.route("/<string:doc_id>/views/daily", methods=["GET"])
+def get_document_daily_views(doc_id):
+    """Lượt xem theo ngày (UTC) của tài liệu. Query: days (mặc định 7, tối đa 30)."""
+    try:
+        _id = ObjectId(doc_id)
+    except Exception:
+        return jsonify({"error": "document id không hợp lệ"}), 400
+    try:
+        days = min(max(int(request.args.get("days", VIEW_WINDOW_DAYS)), 1), 30)
+    except ValueError:
+        days = VIEW_WINDOW_DAYS
+    series = view_stats.daily_series(_id, days)
+    return jsonify({"days": series, "total": sum(d["views"] for d in series)}), 200
 
-# ===================== VIEW COUNT =====================
 
 @documents_bp.route("/<string:doc_id>/view", methods=["POST"])
 def increment_document_view(doc_id):
@@ -1772,31 +2328,11 @@ def increment_document_view(doc_id):
         except Exception:
             pass  # Cho phép xem không cần đăng nhập
 
-        result = mongo_collections.documents.update_one(
-            {"_id": _id},
-            {"$inc": {"views": 1}},
-            upsert=False
-        )
-        
-        if result.matched_count == 0:
+        # Gom vào buffer, flush định kỳ bằng bulk_write (views + view_history)
+        views = view_counter.record(_id, current_user_oid)
+        if views is None:
             return jsonify({"error": "Không tìm thấy tài liệu"}), 404
         
-        # Lưu vào lịch sử xem nếu có user đăng nhập
-        if current_user_oid:
-            try:
-                # Tạo hoặc cập nhật view history (chỉ lưu 1 lần gần nhất cho mỗi user-document)
-                mongo_collections.view_history.update_one(
-                    {"userId": current_user_oid, "documentId": _id},
-                    {"$set": {"viewedAt": datetime.utcnow()}},
-                    upsert=True
-                )
-            except Exception as e:
-                print(f"[WARNING] Lỗi lưu view history: {e}")
-        
-        # Lấy lượt xem mới
-        doc = mongo_collections.documents.find_one({"_id": _id}, {"views": 1})
-        views = doc.get("views", 0) if doc else 0
-        
         return jsonify({"success": True, "views": views}), 200
     except Exception as e:
         print(f"[ERROR] increment_document_view: {e}")
@@ -1813,76 +2349,13 @@ def get_featured_documents_week():
         if limit < 1 or limit > 10:
             limit = 3
         
-        # Tính ngày bắt đầu (7 ngày trước)
-        now = datetime.utcnow()
-        week_start = now - timedelta(days=7)
-        
-        # Query: tài liệu được tạo trong 7 ngày qua, sort theo views giảm dần
-        mongo_query = {
-            "$or": [
-                {"createdAt": {"$gte": week_start}},
-                {"created_at": {"$gte": week_start}}
-            ]
-        }
-        
-        # Lấy documents và sort theo views
-        cursor = mongo_collections.documents.find(mongo_query).sort("views", -1).limit(limit)
-        docs = list(cursor)
+        # Bảng xếp hạng lượt xem 7 ngày gần nhất (documents.viewsWeek, 1 query có index)
+        docs = list(view_stats.top_documents(limit=limit))
+        document_counters.fill_missing(docs)
         
         if not docs:
             return jsonify({"documents": []}), 200
         
-        # Lấy doc_ids để aggregate reactions và comments
-        doc_ids = [doc.get("_id") for doc in docs if doc.get("_id")]
-        reaction_map = {}
-        comment_map = {}
-        
-        if doc_ids:
-            try:
-                reaction_pipeline = [
-                    {"$match": {"documentId": {"$in": doc_ids}}},
-                    {
-                        "$group": {
-                            "_id": "$documentId",
-                            "likes": {
-                                "$sum": {
-                                    "$cond": [
-                                        {"$eq": ["$reaction", "like"]},
-                                        1,
-                                        0,
-                                    ]
-                                }
-                            },
-                            "dislikes": {
-                                "$sum": {
-                                    "$cond": [
-                                        {"$eq": ["$reaction", "dislike"]},
-                                        1,
-                                        0,
-                                    ]
-                                }
-                            },
-                        }
-                    },
-                ]
-                for row in mongo_collections.document_reactions.aggregate(reaction_pipeline):
-                    reaction_map[str(row.get("_id"))] = {
-                        "likes": row.get("likes", 0),
-                        "dislikes": row.get("dislikes", 0),
-                    }
-            except Exception as agg_err:
-                print("[get_featured_documents_week] aggregate reactions error:", agg_err)
-            
-            try:
-                comment_pipeline = [
-                    {"$match": {"documentId": {"$in": doc_ids}}},
-                    {"$group": {"_id": "$documentId", "count": {"$sum": 1}}},
-                ]
-                for row in mongo_collections.document_comments.aggregate(comment_pipeline):
-                    comment_map[str(row.get("_id"))] = row.get("count", 0)
-            except Exception as agg_err:
-                print("[get_featured_documents_week] aggregate comments error:", agg_err)
-        
         # Helper function để tính grade
         def calculate_grade(likes, dislikes, comments):
             total = likes + dislikes + comments
@@ -1914,16 +2387,21 @@ def get_featured_documents_week():
             else:
                 return "C-", f"{score:.1f}"
         
+        # Join school/category/user: 1 query mỗi loại cho cả danh sách
+        loader = entity_loader()
+        loader.load_many("schools", (d.get("schoolId") or d.get("school_id") for d in docs))
+        loader.load_many("categories", (d.get("categoryId") or d.get("category_id") for d in docs))
+        loader.load_many("users", (d.get("userId") or d.get("user_id") for d in docs))
+
         # Format kết quả
+        now = datetime.utcnow()
         result = []
         for doc in docs:
             doc_id_obj = doc.get("_id")
             doc_id_str = str(doc_id_obj) if doc_id_obj else None
             
-            reactions = reaction_map.get(doc_id_str, {})
-            likes = reactions.get("likes", 0)
-            dislikes = reactions.get("dislikes", 0)
-            comment_count = comment_map.get(doc_id_str, 0)
+            counters = counter_fields(doc)
+            likes, dislikes, comment_count = counters["likes"], counters["dislikes"], counters["commentCount"]
             
             grade, grade_score = calculate_grade(likes, dislikes, comment_count)
             
@@ -1932,32 +2410,17 @@ def get_featured_documents_week():
             category_name = ""
             uploader_name = ""
             
-            sid = doc.get("schoolId") or doc.get("school_id")
-            if sid:
-                try:
-                    s = mongo_collections.schools.find_one({"_id": sid if isinstance(sid, ObjectId) else ObjectId(str(sid))})
-                    if s:
-                        school_name = s.get("name", "")
-                except Exception:
-                    pass
+            s = loader.get("schools", doc.get("schoolId") or doc.get("school_id"))
+            if s:
+                school_name = s.get("name", "")
             
-            cid = doc.get("categoryId") or doc.get("category_id")
-            if cid:
-                try:
-                    c = mongo_collections.categories.find_one({"_id": cid if isinstance(cid, ObjectId) else ObjectId(str(cid))})
-                    if c:
-                        category_name = c.get("name", "")
-                except Exception:
-                    pass
+            c = loader.get("categories", doc.get("categoryId") or doc.get("category_id"))
+            if c:
+                category_name = c.get("name", "")
             
-            uid = doc.get("userId") or doc.get("user_id")
-            if uid:
-                try:
-                    u = mongo_collections.users.find_one({"_id": uid if isinstance(uid, ObjectId) else ObjectId(str(uid))})
-                    if u:
-                        uploader_name = u.get("fullName") or u.get("username") or ""
-                except Exception:
-                    pass
+            u = loader.get("users", doc.get("userId") or doc.get("user_id"))
+            if u:
+                uploader_name = u.get("fullName") or u.get("username") or ""
             
             # Format meta string
             meta_parts = []
@@ -2009,6 +2472,7 @@ def get_featured_documents_week():
                 "grade": grade,
                 "gradeScore": grade_score,
                 "views": doc.get("views", 0),
+                "viewsWeek": doc.get("viewsWeek", 0),
                 "downloads": downloads,
                 "time": time_ago,
                 "schoolName": school_name,
@@ -2043,7 +2507,10 @@ def delete_document(doc_id):
             return jsonify({"error": f"Token không hợp lệ: {e}"}), 401
 
         # Kiểm tra document có tồn tại và thuộc về user này không
-        doc = mongo_collections.documents.find_one({"_id": _id}, {"userId": 1, "user_id": 1})
+        doc = mongo_collections.documents.find_one(
+            {"_id": _id},
+            {"userId": 1, "user_id": 1, "thumbnails": 1, "schoolId": 1, "school_id": 1, "categoryId": 1, "category_id": 1},
+        )
         if not doc:
             return jsonify({"error": "Không tìm thấy tài liệu"}), 404
 
@@ -2061,12 +2528,20 @@ def delete_document(doc_id):
         if result.deleted_count == 0:
             return jsonify({"error": "Xóa tài liệu thất bại"}), 500
 
+        lookup_counts.document_removed(doc)
+
         # Xóa view history liên quan (optional)
+        view_counter.discard(_id)
+        home_feed_snapshot.invalidate()
         try:
             mongo_collections.view_history.delete_many({"documentId": _id})
         except Exception:
             pass
 
+        # Xóa văn bản đã cache + thumbnail
+        document_text_cache.delete(_id)
+        thumbnail_service.delete(_id, doc.get("thumbnails"))
+
         return jsonify({"success": True, "message": "Đã xóa tài liệu"}), 200
     except Exception as e:
         print(f"[ERROR] delete_document: {e}")
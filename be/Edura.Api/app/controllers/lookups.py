@@ -1,9 +1,10 @@
 from flask import Blueprint, jsonify, request
 from bson import ObjectId
 from pymongo.errors import DuplicateKeyError
-import re
 
 from app.services.mongo_service import mongo_collections
+from app.services.lookup_cache import conditional_json, lookup_cache
+from app.services.lookup_counts import COUNT_FIELD, lookup_counts
 
 lookups_bp = Blueprint('lookups', __name__, url_prefix='/api/lookups')
 
@@ -29,21 +30,12 @@ def _serialize_school(doc, doc_count: int | None = None):
 def _count_documents_for_school(oid: ObjectId):
     if not oid:
         return 0
-    oid_str = str(oid)
-    return mongo_collections.documents.count_documents({
-        "$or": [
-            {"schoolId": oid},
-            {"schoolId": oid_str},
-            {"school_id": oid},
-            {"school_id": oid_str},
-        ]
-    })
+    return lookup_counts.count("schools", oid)
 
 
 @lookups_bp.route('/schools', methods=['GET'])
 def get_schools():
-    schools = list(mongo_collections.schools.find({}, {"name": 1, "shortName": 1}).sort("name", 1))
-    return jsonify([_serialize_school(s) for s in schools])
+    return conditional_json("schools", lambda: [_serialize_school(s) for s in lookup_cache.all("schools")])
 
 
 @lookups_bp.route('/schools/<school_id>', methods=['GET'])
@@ -51,7 +43,7 @@ def get_school_by_id(school_id):
     oid = _to_object_id(school_id)
     if not oid:
         return jsonify({"error": "Invalid school id"}), 400
-    school = mongo_collections.schools.find_one({"_id": oid})
+    school = lookup_cache.get("schools", oid) or mongo_collections.schools.find_one({"_id": oid})
     if not school:
         return jsonify({"error": "School not found"}), 404
     doc_count = _count_documents_for_school(oid)
@@ -63,87 +55,14 @@ def search_schools():
     query = (request.args.get("q") or "").strip()
     limit = max(1, min(int(request.args.get("limit", 20)), 100))
 
-    filter_query = {}
-    if query:
-        # Tìm kiếm theo cả name và shortName
-        # Escape regex special characters
-        escaped_query = re.escape(query)
-        filter_query["$or"] = [
-            {"name": {"$regex": escaped_query, "$options": "i"}},
-            {"shortName": {"$regex": escaped_query, "$options": "i"}}
-        ]
-
-    schools = list(
-        mongo_collections.schools.find(filter_query, {"name": 1, "shortName": 1})
-        .limit(limit * 2)  # Lấy nhiều hơn để sắp xếp
+    # Tìm trong index không dấu của lookup_cache (không query DB):
+    # khớp đầu tên/tên viết tắt > khớp đầu 1 từ > acronym (vd "dhbk") > chứa query.
+    # Cùng hạng: trường có nhiều tài liệu hơn lên trước; không có query -> theo tên.
+    doc_counts = lookup_counts.all_counts("schools")
+    schools = lookup_cache.search(
+        "schools", query, limit, rank=lambda s: doc_counts.get(str(s["_id"]), 0)
     )
     
-    # Sắp xếp: ưu tiên kết quả bắt đầu bằng query, sau đó là chứa query
-    if query:
-        query_lower = query.lower()
-        schools.sort(key=lambda s: (
-            0 if s.get("name", "").lower().startswith(query_lower) else (1 if s.get("shortName", "").lower().startswith(query_lower) else 2),
-            s.get("name", "").lower()
-        ))
-        # Chỉ lấy số lượng cần thiết sau khi sắp xếp
-        schools = schools[:limit]
-    else:
-        # Nếu không có query, sắp xếp theo tên
-        schools.sort(key=lambda s: s.get("name", "").lower())
-    
-    # Đếm số tài liệu cho mỗi trường học
-    school_ids = [s["_id"] for s in schools]
-    doc_counts = {}
-    
-    if school_ids:
-        # Sử dụng aggregation để đếm documents cho tất cả schools cùng lúc
-        # Tương tự như get_popular_schools nhưng chỉ đếm cho các schools được tìm thấy
-        school_id_strings = [str(oid) for oid in school_ids]
-        
-        # Tạo match conditions cho cả ObjectId và string
-        match_conditions = []
-        match_conditions.append({"schoolId": {"$in": school_ids}})
-        match_conditions.append({"school_id": {"$in": school_ids}})
-        match_conditions.append({"schoolId": {"$in": school_id_strings}})
-        match_conditions.append({"school_id": {"$in": school_id_strings}})
-        
-        pipeline = [
-            {
-                "$match": {
-                    "$or": match_conditions
-                }
-            },
-            {
-                "$project": {
-                    "schoolRef": {
-                        "$ifNull": ["$schoolId", "$school_id"]
-                    }
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$schoolRef",
-                    "documentCount": {"$sum": 1}
-                }
-            }
-        ]
-        
-        try:
-            count_results = list(mongo_collections.documents.aggregate(pipeline))
-            for result in count_results:
-                school_ref = result["_id"]
-                # Normalize school_ref về string để so sánh
-                if isinstance(school_ref, ObjectId):
-                    school_id_key = str(school_ref)
-                else:
-                    school_id_key = str(school_ref)
-                doc_counts[school_id_key] = int(result.get("documentCount", 0))
-        except Exception as e:
-            # Fallback: đếm từng school nếu aggregation fail
-            print(f"Error in aggregation, using fallback: {e}")
-            for school in schools:
-                doc_counts[str(school["_id"])] = _count_documents_for_school(school["_id"])
-    
     # Serialize với document count
     result = []
     for school in schools:
@@ -158,59 +77,20 @@ def search_schools():
 def get_popular_schools():
     limit = max(1, min(int(request.args.get("limit", 12)), 50))
 
-    pipeline = [
-        {"$project": {"schoolRef": {"$ifNull": ["$schoolId", "$school_id"]}}},
-        {"$match": {"schoolRef": {"$ne": None}}},
-        {"$group": {"_id": "$schoolRef", "documentCount": {"$sum": 1}}},
-        {"$sort": {"documentCount": -1}},
-        {"$limit": limit}
-    ]
-
-    popular_entries = list(mongo_collections.documents.aggregate(pipeline))
-    school_ids = []
-    doc_counts = {}
-    for entry in popular_entries:
-        key = str(entry["_id"])
-        doc_counts[key] = int(entry.get("documentCount", 0))
-        oid = _to_object_id(entry["_id"])
-        if oid:
-            school_ids.append(oid)
-
-    school_map = {}
-    if school_ids:
-        cursor = mongo_collections.schools.find({"_id": {"$in": school_ids}}, {"name": 1, "shortName": 1})
-        for school in cursor:
-            school_map[str(school["_id"])] = school
-
-    result = []
-    for entry in popular_entries:
-        key = str(entry["_id"])
-        school = school_map.get(key)
-        if school:
-            result.append(_serialize_school(school, doc_counts.get(key, 0)))
-        else:
-            # fallback in case school document is missing (data inconsistency)
-            result.append({
-                "_id": key,
-                "name": key,
-                "shortName": None,
-                "documentCount": doc_counts.get(key, 0)
-            })
+    # Sort theo index documentCount (không aggregate trên documents)
+    popular = lookup_counts.top("schools", limit, {"name": 1, "shortName": 1, "documentCount": 1})
+    result = [_serialize_school(s) for s in popular]
 
     if not result:
-        fallback = list(
-            mongo_collections.schools.find({}, {"name": 1, "shortName": 1})
-            .sort("name", 1)
-            .limit(limit)
-        )
-        result = [_serialize_school(s, doc_count=0) for s in fallback]
+        result = [_serialize_school(s, doc_count=0) for s in lookup_cache.all("schools")[:limit]]
 
     return jsonify(result), 200
 
 @lookups_bp.route('/categories', methods=['GET'])
 def get_categories():
-    cats = list(mongo_collections.categories.find({}, {"name": 1}))
-    return jsonify([{"_id": str(c["_id"]), "name": c["name"]} for c in cats])
+    return conditional_json(
+        "categories", lambda: [{"_id": str(c["_id"]), "name": c["name"]} for c in lookup_cache.all("categories")]
+    )
 
 @lookups_bp.route('/seed', methods=['POST'])
 def seed():
@@ -253,7 +133,7 @@ def seed():
     for name in default_schools:
         try:
             mongo_collections.schools.update_one(
-                {"name": name}, {"$setOnInsert": {"name": name}}, upsert=True
+                {"name": name}, {"$setOnInsert": {"name": name, COUNT_FIELD: 0}}, upsert=True
             )
             inserted["schools"] += 1
         except DuplicateKeyError:
@@ -262,10 +142,12 @@ def seed():
     for name in default_categories:
         try:
             mongo_collections.categories.update_one(
-                {"name": name}, {"$setOnInsert": {"name": name}}, upsert=True
+                {"name": name}, {"$setOnInsert": {"name": name, COUNT_FIELD: 0}}, upsert=True
             )
             inserted["categories"] += 1
         except DuplicateKeyError:
             pass
 
+    lookup_cache.bump("schools")
+    lookup_cache.bump("categories")
     return jsonify({"message": "Seed completed (idempotent)", "inserted": inserted}), 200
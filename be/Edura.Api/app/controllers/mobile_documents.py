@@ -1,6 +1,13 @@
 from flask import Blueprint, jsonify, request, current_app
 from bson import ObjectId
 from app.services.mongo_service import mongo_collections
+from app.services.thumbnail_service import thumbnail_fields
+from app.services.document_counters import document_counters, counter_fields
+from app.services.view_stats import LEADERBOARD_SORT
+from app.services.home_feed_snapshot import home_feed_snapshot
+from app.services.entity_loader import entity_loader
+from app.services.lookup_cache import conditional_json, lookup_cache
+from app.utils.document_schema import and_filters, by_category, by_school, created_sort
 from app.utils.search_utils import calculate_relevance_score
 import os
 import jwt
@@ -58,30 +65,15 @@ def _jwt_user_optional():
         return None
 
 def _uploader_name(uid):
-    uid = _to_oid(uid)
-    if not uid:
-        return None
-    u = mongo_collections.users.find_one(
-        {"_id": uid}, {"username": 1, "fullName": 1, "name": 1}
-    )
-    if not u:
-        return None
-    return u.get("fullName") or u.get("name") or u.get("username")
+    """Tên người đăng (qua batch loader của request: gom trước bằng load_many thì không tốn query)."""
+    return entity_loader().name("users", uid)
 
 def _safe_iso(dt):
     return dt.isoformat() if hasattr(dt, "isoformat") else dt
 
 def _school_name(sid):
     """Trả về tên trường (school name) từ ObjectId hoặc ID dạng chuỗi."""
-    sid = _to_oid(sid)
-    if not sid:
-        return None
-    s = mongo_collections.schools.find_one(
-        {"_id": sid}, {"name": 1, "shortName": 1}
-    )
-    if not s:
-        return None
-    return s.get("name") or s.get("shortName")
+    return entity_loader().name("schools", sid)
 
 # =========================================================
 # Blueprint: /api/mobile/documents
@@ -110,32 +102,14 @@ def list_documents():
         school_id = request.args.get("schoolId")
 
         # 1) Xây dựng truy vấn cơ bản (Chỉ lọc theo ID Trường/Thể loại)
-        base_query = {}
-        if category_id:
-            cat_oid = _to_oid(category_id)
-            base_query.setdefault("$and", []).append(
-                {
-                    "$or": [
-                        {"categoryId": cat_oid or category_id},
-                        {"category_id": cat_oid or category_id},
-                    ]
-                }
-            )
-
-        if school_id:
-            sch_oid = _to_oid(school_id)
-            base_query.setdefault("$and", []).append(
-                {
-                    "$or": [
-                        {"schoolId": sch_oid or school_id},
-                        {"school_id": sch_oid or school_id},
-                    ]
-                }
-            )
+        base_query = and_filters(
+            by_category(category_id) if category_id else None,
+            by_school(school_id) if school_id else None,
+        )
 
         # Cần lấy đủ các trường để lọc bằng Python (title, keywords, summary)
         projection = {
-            "title": 1, "keywords": 1, "summary": 1, "image_url": 1, "s3_url": 1,
+            "title": 1, "keywords": 1, "summary": 1, "image_url": 1, "thumbnails": 1, "s3_url": 1,
             "createdAt": 1, "created_at": 1, "views": 1, "likes": 1, "dislikes": 1,
             "pages": 1, "pageCount": 1, "userId": 1, "user_id": 1, 
             "schoolId": 1, "school_id": 1,
@@ -143,8 +117,8 @@ def list_documents():
 
         # LẤY TẤT CẢ docs thỏa mãn điều kiện lọc (TRƯỚC KHI PHÂN TRANG)
         all_docs = list(
-            mongo_collections.documents.find(base_query, projection)
-            .sort([("createdAt", -1), ("created_at", -1)])
+            mongo_collections.for_analytics(mongo_collections.documents).find(base_query, projection)
+            .sort(created_sort())
         )
 
         # 2) Filter + tính điểm relevance bằng Python
@@ -152,13 +126,9 @@ def list_documents():
         if search_stripped:
             filtered_docs = []
             # Load categories trước để join với documents
-            category_ids_for_search = {d.get("categoryId") for d in all_docs if d.get("categoryId")}
-            category_map_for_search = {}
-            if category_ids_for_search:
-                for c in mongo_collections.categories.find(
-                    {"_id": {"$in": list(category_ids_for_search)}}, {"name": 1}
-                ):
-                    category_map_for_search[c["_id"]] = c.get("name", "")
+            category_map_for_search = entity_loader().names(
+                "categories", (d.get("categoryId") for d in all_docs)
+            )
             
             for d in all_docs:
                 title = d.get("title", "") or ""
@@ -168,7 +138,7 @@ def list_documents():
                 category_name = ""
                 cid = d.get("categoryId")
                 if cid:
-                    category_name = category_map_for_search.get(cid, "")
+                    category_name = category_map_for_search.get(str(cid)) or ""
 
                 # Tính relevance score theo thứ tự ưu tiên: Category > Title > Keywords
                 # Hỗ trợ tìm kiếm không dấu và không khoảng cách
@@ -202,35 +172,10 @@ def list_documents():
         
         # --- Bắt đầu xử lý join (school_map và user_map) như cũ ---
         
-        # Gom tất cả schoolId / school_id
-        school_ids = {
-            _to_oid(d.get("schoolId") or d.get("school_id"))
-            for d in docs
-            if _to_oid(d.get("schoolId") or d.get("school_id"))
-        }
-
-        # Map id -> tên trường
-        school_map = {}
-        if school_ids:
-            for s in mongo_collections.schools.find(
-                {"_id": {"$in": list(school_ids)}},
-                {"name": 1, "shortName": 1},
-            ):
-                school_map[str(s["_id"])] = s.get("name") or s.get("shortName")
-
-        # Map user id -> tên người đăng (làm thủ công vì không có list user_id tập trung)
-        user_map = {}
-        user_ids_to_fetch = {
-            _to_oid(d.get("userId") or d.get("user_id"))
-            for d in docs
-            if _to_oid(d.get("userId") or d.get("user_id"))
-        }
-        if user_ids_to_fetch:
-            for u in mongo_collections.users.find(
-                {"_id": {"$in": list(user_ids_to_fetch)}},
-                {"username": 1, "fullName": 1, "name": 1},
-            ):
-                user_map[str(u["_id"])] = u.get("fullName") or u.get("name") or u.get("username")
+        # Map id -> tên trường / tên người đăng (1 query mỗi loại, có hot cache)
+        loader = entity_loader()
+        school_map = loader.names("schools", (d.get("schoolId") or d.get("school_id") for d in docs))
+        user_map = loader.names("users", (d.get("userId") or d.get("user_id") for d in docs))
 
 
         items = []
@@ -260,6 +205,7 @@ def list_documents():
                     "title": d.get("title", ""),
                     "summary": d.get("summary", ""),
                     "image_url": d.get("image_url"),
+                    **thumbnail_fields(d),
                     "s3_url": d.get("s3_url"),
                     "created_at": _safe_iso(created),
                     "views": views,
@@ -322,14 +268,15 @@ def docs_by_category(category_id):
         if not oid:
             return jsonify({"error": "Invalid category id"}), 400
 
-        q = {"$or": [{"categoryId": oid}, {"category_id": oid}]}
+        q = by_category(oid)
 
         cursor = (
-            mongo_collections.documents.find(
+            mongo_collections.for_analytics(mongo_collections.documents).find(
                 q,
                 {
                     "title": 1,
                     "image_url": 1,
+                    "thumbnails": 1,
                     "s3_url": 1,
                     "userId": 1,
                     "user_id": 1,
@@ -343,25 +290,17 @@ def docs_by_category(category_id):
                     "summary": 1,          # <--- THÊM
                 },
             )
-            .sort([("views", -1), ("createdAt", -1), ("created_at", -1)])
+            .sort(created_sort(("views", -1)))
             .skip(skip)
             .limit(limit)
         )
 
         docs = list(cursor)
 
-        # Map school id -> name
-        school_ids = {
-            _to_oid(d.get("schoolId") or d.get("school_id"))
-            for d in docs
-            if _to_oid(d.get("schoolId") or d.get("school_id"))
-        }
-        school_map = {}
-        if school_ids:
-            for s in mongo_collections.schools.find(
-                {"_id": {"$in": list(school_ids)}}, {"name": 1, "shortName": 1}
-            ):
-                school_map[str(s["_id"])] = s.get("name") or s.get("shortName")
+        # Map school id -> name, gom luôn người đăng cho _uploader_name
+        loader = entity_loader()
+        school_map = loader.names("schools", (d.get("schoolId") or d.get("school_id") for d in docs))
+        loader.load_many("users", (d.get("userId") or d.get("user_id") for d in docs))
 
         items = []
         for d in docs:
@@ -379,6 +318,7 @@ def docs_by_category(category_id):
                     "id": str(d["_id"]),
                     "title": d.get("title", ""),
                     "image_url": d.get("image_url"),
+                    **thumbnail_fields(d),
                     "s3_url": d.get("s3_url"),
                     "uploader": _uploader_name(uid) or "ADMIN",
                     "views": views,
@@ -413,6 +353,162 @@ mobile_home_bp = Blueprint(
     url_prefix="/api/mobile",
 )
 
+# =========================================================
+# Home feed snapshot: phần ẩn danh build sẵn (home_feed_snapshot),
+# mỗi request chỉ tính myReaction / isFavorite của user.
+# =========================================================
+_HOME_SECTIONS = [
+    # (key, tiêu đề, tên danh mục)
+    ("toan-cao-cap", "Trending in Science & Mathematics", "Toán cao cấp"),
+    ("ctdl-gt", "Trending in Data Structures & Algorithms", "Cấu trúc dữ liệu và giải thuật"),
+    ("marketing-can-ban", "Trending in Marketing", "Marketing căn bản"),
+    ("kinh-te-vi-mo", "Trending in Economics", "Kinh tế vi mô"),
+]
+
+# ===== 3 CATEGORY CŨ (đang dùng trong app) + 12 CATEGORY MỚI (đa dạng ngành) =====
+_HOME_15_CATEGORIES = [
+    "Science & Mathematics",
+    "Marketing",
+    "Economics",
+    "Toán cao cấp",
+    "Cấu trúc dữ liệu & Giải thuật",
+    "Cơ sở dữ liệu",
+    "Mạng máy tính",
+    "Hệ điều hành",
+    "Lập trình Java",
+    "Lập trình Python",
+    "Trí tuệ nhân tạo (AI)",
+    "Khoa học dữ liệu",
+    "An toàn thông tin",
+    "Quản trị kinh doanh",
+    "Tài chính – Ngân hàng",
+]
+
+_HOME_DOC_PROJECTION = {
+    "title": 1, "image_url": 1, "thumbnails": 1, "s3_url": 1, "summary": 1,
+    "userId": 1, "user_id": 1, "views": 1, "viewsWeek": 1, "likes": 1, "dislikes": 1, "commentCount": 1,
+    "createdAt": 1, "created_at": 1, "pages": 1, "pageCount": 1,
+}
+
+
+def _category_ids(names):
+    """Tên danh mục (không phân biệt hoa thường, dấu) -> ObjectId, tra trong lookup_cache."""
+    found = {n: lookup_cache.find_by_name("categories", n) for n in names}
+    return {n: c["_id"] if c else None for n, c in found.items()}
+
+
+def _home_top_docs(cat_oid, limit):
+    if not cat_oid:
+        return []
+    return list(
+        mongo_collections.for_analytics(mongo_collections.documents).find(by_category(cat_oid), _HOME_DOC_PROJECTION)
+        .sort(created_sort(*LEADERBOARD_SORT))
+        .limit(limit)
+    )
+
+
+def _uploader_names(docs):
+    """userId -> tên hiển thị, 1 query users cho mọi tài liệu."""
+    return entity_loader().names("users", (d.get("userId") or d.get("user_id") for d in docs))
+
+
+def _home_item(d, user_map):
+    """Item ẩn danh của feed trang chủ (không có trường riêng của user)."""
+    uid = _to_oid(d.get("userId") or d.get("user_id"))
+    counters = counter_fields(d)
+
+    # Đọc pages đúng từ Mongo
+    raw_pages = d.get("pages") or d.get("pageCount") or 0
+    try:
+        pages = int(raw_pages)
+    except Exception:
+        pages = 0
+
+    return {
+        "id": str(d["_id"]),
+        "title": d.get("title", ""),
+        "image_url": d.get("image_url"),
+        **thumbnail_fields(d),
+        "s3_url": d.get("s3_url"),
+        "uploader": user_map.get(str(uid)) if uid else None,
+        "views": int(d.get("views", 0) or 0),
+        "viewsWeek": int(d.get("viewsWeek", 0) or 0),
+        "likes": counters["likes"],
+        "dislikes": counters["dislikes"],
+        "pages": pages,
+        "created_at": _safe_iso(d.get("created_at") or d.get("createdAt")),
+        "summary": d.get("summary", ""),
+    }
+
+
+def _build_home_trending(limit):
+    cat_ids = _category_ids([name for _, _, name in _HOME_SECTIONS])
+    buckets = [(key, title, cat_ids.get(name)) for key, title, name in _HOME_SECTIONS]
+    docs = {key: _home_top_docs(cat_oid, limit) for key, _, cat_oid in buckets}
+    document_counters.fill_missing([d for ds in docs.values() for d in ds])
+    user_map = _uploader_names([d for ds in docs.values() for d in ds])
+    return [
+        {
+            "key": key,
+            "title": title,
+            "categoryId": str(cat_oid) if cat_oid else None,
+            "items": [_home_item(d, user_map) for d in docs[key]],
+        }
+        for key, title, cat_oid in buckets
+    ]
+
+
+def _build_home_trending_15(limit):
+    cat_map = _category_ids(_HOME_15_CATEGORIES)
+    docs = {name: _home_top_docs(cat_map.get(name), limit) for name in _HOME_15_CATEGORIES}
+    user_map = _uploader_names([d for ds in docs.values() for d in ds])
+    sections = []
+    for name in _HOME_15_CATEGORIES:
+        cat_oid = cat_map.get(name)
+        items = []
+        for d in docs[name]:
+            item = {k: v for k, v in _home_item(d, user_map).items() if k not in ("viewsWeek", "likes", "dislikes")}
+            item["uploader"] = item["uploader"] or "ADMIN"
+            items.append(item)
+        sections.append({
+            "title": f"Trending in {name}",
+            "category": name,
+            "categoryId": str(cat_oid) if cat_oid else None,
+            "items": items,
+        })
+    return sections
+
+
+home_feed_snapshot.register("trending", _build_home_trending)
+home_feed_snapshot.register("trending-15", _build_home_trending_15)
+
+
+def _user_overlay(me, doc_ids):
+    """(myReaction theo doc id, tập doc id đã favorite) của user hiện tại."""
+    my_map, fav_set = {}, set()
+    if not me or not doc_ids:
+        return my_map, fav_set
+    oids = [_to_oid(d) for d in doc_ids]
+    for r in mongo_collections.document_reactions.find(
+        {"userId": me, "documentId": {"$in": oids}},
+        {"documentId": 1, "reaction": 1},
+    ):
+        my_map[str(r["documentId"])] = r.get("reaction")
+
+    coll_names = set(mongo_collections.db.list_collection_names())
+    fav_coll = None
+    if "favorites" in coll_names:
+        fav_coll = "favorites"
+    elif "saved_documents" in coll_names:
+        fav_coll = "saved_documents"
+    if fav_coll:
+        for f in mongo_collections.db[fav_coll].find(
+            {"userId": me, "documentId": {"$in": oids}}, {"documentId": 1}
+        ):
+            fav_set.add(str(f["documentId"]))
+    return my_map, fav_set
+
+
 @mobile_home_bp.route("/home/trending", methods=["GET"])
 def home_trending():
     """
@@ -423,181 +519,20 @@ def home_trending():
         limit = max(int(request.args.get("limit", 12)), 1)
         me = _jwt_user_optional()
 
-        names_vi = {
-            "toan": "Toán cao cấp",
-            "dsa": "Cấu trúc dữ liệu và giải thuật",
-            "mkt": "Marketing căn bản",
-            "micro": "Kinh tế vi mô",
-        }
-        cat_ids = {}
-        for key, vn_name in names_vi.items():
-            cat = mongo_collections.categories.find_one(
-                {"name": {"$regex": f"^{vn_name}$", "$options": "i"}}, {"_id": 1}
-            )
-            cat_ids[key] = cat["_id"] if cat else None
-
-        def top_docs(cat_oid):
-            if not cat_oid:
-                return []
-            return list(
-                mongo_collections.documents.find(
-                    {"$or": [{"categoryId": cat_oid}, {"category_id": cat_oid}]},
-                    {
-                        "title": 1,
-                        "image_url": 1,
-                        "s3_url": 1,
-                        "userId": 1,
-                        "user_id": 1,
-                        "views": 1,
-                        "createdAt": 1,
-                        "created_at": 1,
-                        "pages": 1,
-                        "pageCount": 1,
-                        "summary": 1,   # <--- THÊM
-                    },
-                )
-                .sort([("views", -1), ("createdAt", -1), ("created_at", -1)])
-                .limit(limit)
-            )
-
-        buckets = {
-            "toan": top_docs(cat_ids.get("toan")),
-            "dsa": top_docs(cat_ids.get("dsa")),
-            "mkt": top_docs(cat_ids.get("mkt")),
-            "micro": top_docs(cat_ids.get("micro")),
-        }
-
-        all_doc_ids, all_user_ids = [], set()
-        for docs in buckets.values():
-            for d in docs:
-                all_doc_ids.append(d["_id"])
-                uid = _to_oid(d.get("userId") or d.get("user_id"))
-                if uid:
-                    all_user_ids.add(uid)
-
-        like_map, dislike_map = {}, {}
-        if all_doc_ids:
-            pipeline = [
-                {"$match": {"documentId": {"$in": all_doc_ids}}},
-                {
-                    "$group": {
-                        "_id": {"id": "$documentId", "reaction": "$reaction"},
-                        "cnt": {"$sum": 1},
-                    }
-                },
-            ]
-            for row in mongo_collections.document_reactions.aggregate(pipeline):
-                did = str(row["_id"]["id"])
-                if row["_id"]["reaction"] == "like":
-                    like_map[did] = row["cnt"]
-                elif row["_id"]["reaction"] == "dislike":
-                    dislike_map[did] = row["cnt"]
-
-        my_map, fav_map = {}, {}
-        if me and all_doc_ids:
-            for r in mongo_collections.document_reactions.find(
-                {"userId": me, "documentId": {"$in": all_doc_ids}},
-                {"documentId": 1, "reaction": 1},
-            ):
-                my_map[str(r["documentId"])] = r.get("reaction")
-
-            coll_names = set(mongo_collections.db.list_collection_names())
-            fav_cur = None
-            if "favorites" in coll_names:
-                fav_cur = mongo_collections.db["favorites"].find(
-                    {"userId": me, "documentId": {"$in": all_doc_ids}},
-                    {"documentId": 1},
-                )
-            elif "saved_documents" in coll_names:
-                fav_cur = mongo_collections.db["saved_documents"].find(
-                    {"userId": me, "documentId": {"$in": all_doc_ids}},
-                    {"documentId": 1},
-                )
-            if fav_cur:
-                for f in fav_cur:
-                    fav_map[str(f["documentId"])] = True
-
-        user_map = {}
-        if all_user_ids:
-            for u in mongo_collections.users.find(
-                {"_id": {"$in": list(all_user_ids)}},
-                {"username": 1, "fullName": 1, "name": 1},
-            ):
-                user_map[str(u["_id"])] = (
-                    u.get("fullName") or u.get("name") or u.get("username")
-                )
-
-        def pack(docs):
-            out = []
-            for d in docs:
-                did = str(d["_id"])
-                uid = _to_oid(d.get("userId") or d.get("user_id"))
-                views = int(d.get("views", 0) or 0)
-
-                # Đọc pages đúng từ Mongo
-                raw_pages = d.get("pages") or d.get("pageCount") or 0
-                try:
-                    pages = int(raw_pages)
-                except Exception:
-                    pages = 0
-
-                created = d.get("created_at") or d.get("createdAt")
-
-                out.append(
-                    {
-                        "id": did,
-                        "title": d.get("title", ""),
-                        "image_url": d.get("image_url"),
-                        "s3_url": d.get("s3_url"),
-                        "uploader": user_map.get(str(uid)) if uid else None,
-                        "views": views,
-                        "likes": int(like_map.get(did, 0)),
-                        "dislikes": int(dislike_map.get(did, 0)),
-                        "myReaction": my_map.get(did),
-                        "isFavorite": bool(fav_map.get(did, False)),
-                        "pages": pages,                         # <--- giờ đúng
-                        "created_at": _safe_iso(created),
-                        "summary": d.get("summary", ""),
-                    }
-                )
-            return out
-
-
+        sections = home_feed_snapshot.get("trending", limit)
+        doc_ids = [item["id"] for s in sections for item in s["items"]]
+        my_map, fav_set = _user_overlay(me, doc_ids)
 
         payload = {
             "sections": [
                 {
-                    "key": "toan-cao-cap",
-                    "title": "Trending in Science & Mathematics",
-                    "categoryId": str(cat_ids.get("toan"))
-                    if cat_ids.get("toan")
-                    else None,
-                    "items": pack(buckets["toan"]),
-                },
-                {
-                    "key": "ctdl-gt",
-                    "title": "Trending in Data Structures & Algorithms",
-                    "categoryId": str(cat_ids.get("dsa"))
-                    if cat_ids.get("dsa")
-                    else None,
-                    "items": pack(buckets["dsa"]),
-                },
-                {
-                    "key": "marketing-can-ban",
-                    "title": "Trending in Marketing",
-                    "categoryId": str(cat_ids.get("mkt"))
-                    if cat_ids.get("mkt")
-                    else None,
-                    "items": pack(buckets["mkt"]),
-                },
-                {
-                    "key": "kinh-te-vi-mo",
-                    "title": "Trending in Economics",
-                    "categoryId": str(cat_ids.get("micro"))
-                    if cat_ids.get("micro")
-                    else None,
-                    "items": pack(buckets["micro"]),
-                },
+                    **s,
+                    "items": [
+                        {**item, "myReaction": my_map.get(item["id"]), "isFavorite": item["id"] in fav_set}
+                        for item in s["items"]
+                    ],
+                }
+                for s in sections
             ]
         }
         return jsonify(payload), 200
@@ -679,21 +614,12 @@ def recommended_documents(doc_id):
 
         # Lấy các doc cùng category, exclude chính nó
         cursor = (
-            mongo_collections.documents.find(
-                {
-                    "$and": [
-                        {
-                            "$or": [
-                                {"categoryId": cat_oid},
-                                {"category_id": cat_oid},
-                            ]
-                        },
-                        {"_id": {"$ne": doc_oid}},
-                    ]
-                },
+            mongo_collections.for_analytics(mongo_collections.documents).find(
+                and_filters(by_category(cat_oid), {"_id": {"$ne": doc_oid}}),
                 {
                     "title": 1,
                     "image_url": 1,
+                    "thumbnails": 1,
                     "s3_url": 1,
                     "userId": 1,
                     "user_id": 1,
@@ -707,24 +633,16 @@ def recommended_documents(doc_id):
                     "summary": 1,
                 },
             )
-            .sort([("views", -1), ("createdAt", -1), ("created_at", -1)])
+            .sort(created_sort(("views", -1)))
             .limit(12)
         )
 
         docs = list(cursor)
 
-        # Map school id -> name (giống by-category)
-        school_ids = {
-            _to_oid(d.get("schoolId") or d.get("school_id"))
-            for d in docs
-            if _to_oid(d.get("schoolId") or d.get("school_id"))
-        }
-        school_map = {}
-        if school_ids:
-            for s in mongo_collections.schools.find(
-                {"_id": {"$in": list(school_ids)}}, {"name": 1, "shortName": 1}
-            ):
-                school_map[str(s["_id"])] = s.get("name") or s.get("shortName")
+        # Map school id -> name (giống by-category), gom luôn người đăng cho _uploader_name
+        loader = entity_loader()
+        school_map = loader.names("schools", (d.get("schoolId") or d.get("school_id") for d in docs))
+        loader.load_many("users", (d.get("userId") or d.get("user_id") for d in docs))
 
         items = []
         for d in docs:
@@ -746,6 +664,7 @@ def recommended_documents(doc_id):
                     "id": str(d["_id"]),
                     "title": d.get("title", ""),
                     "image_url": d.get("image_url"),
+                    **thumbnail_fields(d),
                     "s3_url": d.get("s3_url"),
                     "uploader": _uploader_name(uid) or "ADMIN",
                     "views": views,
@@ -768,24 +687,19 @@ def recommended_documents(doc_id):
 
 @mobile_home_bp.route("/categories", methods=["GET"])
 def mobile_categories():
-    items = []
-    for c in mongo_collections.categories.find({}, {"name": 1}):
-        items.append({
-            "id": str(c["_id"]),
-            "name": c["name"]
-        })
-    return jsonify({"items": items}), 200
+    return conditional_json("categories", lambda: {
+        "items": [{"id": str(c["_id"]), "name": c["name"]} for c in lookup_cache.all("categories")]
+    })
 
 
 @mobile_home_bp.route("/schools", methods=["GET"])
 def mobile_schools():
-    items = []
-    for s in mongo_collections.schools.find({}, {"name": 1, "shortName": 1}):
-        items.append({
-            "id": str(s["_id"]),
-            "name": s.get("name") or s.get("shortName")
-        })
-    return jsonify({"items": items}), 200
+    return conditional_json("schools", lambda: {
+        "items": [
+            {"id": str(s["_id"]), "name": s.get("name") or s.get("shortName")}
+            for s in lookup_cache.all("schools")
+        ]
+    })
 
 @mobile_documents_bp.route("/saved", methods=["GET"])
 def list_saved_documents():
@@ -820,26 +734,16 @@ def list_saved_documents():
         docs = list(
             mongo_collections.documents.find(
                 {"_id": {"$in": doc_ids}}
-            ).sort([("createdAt", -1), ("created_at", -1)])
+            ).sort(created_sort())
         )
 
-        # Lấy school name 1 lần
-        school_ids = set()
-        for d in docs:
-            sid = _to_oid(d.get("schoolId") or d.get("school_id"))
-            if sid:
-                school_ids.add(sid)
-
-        school_map = {}
-        if school_ids:
-            cursor_s = mongo_collections.schools.find(
-                {"_id": {"$in": list(school_ids)}},
-                {"name": 1, "shortName": 1},
-            )
-            for s in cursor_s:
-                school_map[str(s["_id"])] = (
-                    s.get("name") or s.get("shortName") or "Unknown school"
-                )
+        # Lấy school name + người đăng 1 lần
+        loader = entity_loader()
+        school_map = {
+            k: name or "Unknown school"
+            for k, name in loader.names("schools", (d.get("schoolId") or d.get("school_id") for d in docs)).items()
+        }
+        loader.load_many("users", (d.get("userId") or d.get("user_id") for d in docs))
 
         items = []
         for d in docs:
@@ -862,6 +766,7 @@ def list_saved_documents():
                     "title": d.get("title", ""),
                     "summary": d.get("summary", ""),
                     "image_url": d.get("image_url"),
+                    **thumbnail_fields(d),
                     "s3_url": d.get("s3_url"),
                     "created_at": _safe_iso(created),
                     "views": views,
@@ -977,6 +882,7 @@ def get_list_detail(list_id):
                     "title": 1,
                     "summary": 1,
                     "image_url": 1,
+                    "thumbnails": 1,
                     "s3_url": 1,
                     "pages": 1,
                     "pageCount": 1,
@@ -984,8 +890,10 @@ def get_list_detail(list_id):
                     "user_id": 1
                 }
             )
+            rows = list(cursor)
+            entity_loader().load_many("users", (d.get("userId") or d.get("user_id") for d in rows))
 
-            for d in cursor:
+            for d in rows:
                 pages = (
                     d.get("pages")
                     or d.get("pageCount")
@@ -997,6 +905,7 @@ def get_list_detail(list_id):
                     "title": d.get("title", ""),
                     "summary": d.get("summary", ""),
                     "imageUrl": d.get("image_url"),
+                    **thumbnail_fields(d),
                     "s3Url": d.get("s3_url"),
                     "pages": int(pages),
                     "uploader": _uploader_name(
@@ -1107,104 +1016,7 @@ def home_trending_15():
 
     try:
         limit = max(int(request.args.get("limit", 12)), 1)
-
-        # ===== 3 CATEGORY CŨ (đang dùng trong app) =====
-        old_categories = [
-            "Science & Mathematics",
-            "Marketing",
-            "Economics",
-        ]
-
-        # ===== 12 CATEGORY MỚI (đa dạng ngành) =====
-        new_categories = [
-            "Toán cao cấp",
-            "Cấu trúc dữ liệu & Giải thuật",
-            "Cơ sở dữ liệu",
-            "Mạng máy tính",
-            "Hệ điều hành",
-            "Lập trình Java",
-            "Lập trình Python",
-            "Trí tuệ nhân tạo (AI)",
-            "Khoa học dữ liệu",
-            "An toàn thông tin",
-            "Quản trị kinh doanh",
-            "Tài chính – Ngân hàng",
-        ]
-
-        all_categories = old_categories + new_categories   # TOTAL = 15
-
-        # ===== LẤY CATEGORY OID =====
-        cat_map = {}
-        for name in all_categories:
-            c = mongo_collections.categories.find_one(
-                {"name": {"$regex": f"^{name}$", "$options": "i"}},
-                {"_id": 1}
-            )
-            if c:
-                cat_map[name] = c["_id"]
-
-        # ===== FUNCTION LẤY TOP DOCS =====
-        def top_docs(cat_oid):
-            if not cat_oid:
-                return []
-            return list(
-                mongo_collections.documents.find(
-                    {"$or": [
-                        {"categoryId": cat_oid},
-                        {"category_id": cat_oid}
-                    ]},
-                    {
-                        "title": 1, "image_url": 1, "s3_url": 1,
-                        "summary": 1, "views": 1,
-                        "createdAt": 1, "created_at": 1,
-                        "pages": 1, "pageCount": 1,
-                        "userId": 1, "user_id": 1
-                    }
-                )
-                .sort([("views", -1), ("createdAt", -1), ("created_at", -1)])
-                .limit(limit)
-            )
-
-        # ===== PACK DOCUMENT =====
-        def pack(docs):
-            out = []
-            for d in docs:
-                did = str(d["_id"])
-                uid = d.get("userId") or d.get("user_id")
-                created = d.get("created_at") or d.get("createdAt")
-
-                raw_pages = d.get("pages") or d.get("pageCount") or 0
-                try:
-                    pages = int(raw_pages)
-                except:
-                    pages = 0
-
-                out.append({
-                    "id": did,
-                    "title": d.get("title", ""),
-                    "image_url": d.get("image_url"),
-                    "s3_url": d.get("s3_url"),
-                    "summary": d.get("summary", ""),
-                    "views": int(d.get("views", 0)),
-                    "pages": pages,
-                    "created_at": _safe_iso(created),
-                    "uploader": _uploader_name(uid) or "ADMIN",
-                })
-            return out
-
-        # ===== BUILD 15 SECTIONS =====
-        sections = []
-        for name in all_categories:
-            cat_oid = cat_map.get(name)
-            docs = top_docs(cat_oid)
-            sections.append({
-                "title": f"Trending in {name}",
-                "category": name,
-                "categoryId": str(cat_oid) if cat_oid else None,
-                "items": pack(docs)
-            })
-
-        return jsonify({"sections": sections}), 200
+        return jsonify({"sections": home_feed_snapshot.get("trending-15", limit)}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
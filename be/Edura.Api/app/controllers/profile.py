@@ -8,12 +8,13 @@ from jwt import ExpiredSignatureError, InvalidTokenError
 import jwt
 import os
 import uuid
-import boto3
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
 from app.services.mongo_service import mongo_collections
 from app.services.aws_service import aws_service
+from app.services.entity_loader import entity_cache
+from app.utils.document_schema import by_user, created_sort
 
 profile_bp = Blueprint("profile", __name__, url_prefix="/api/profile")
 
@@ -90,6 +91,7 @@ def update_my_profile():
             {"_id": user_id},
             {"$set": {"fullName": full_name, "updatedAt": datetime.utcnow()}}
         )
+        entity_cache.invalidate("users", user_id)
 
         if result.matched_count == 0:
             return jsonify({"error": "Không tìm thấy user"}), 404
@@ -137,6 +139,7 @@ def upload_avatar():
             {"_id": user_id},
             {"$set": {"avatarUrl": avatar_url, "updatedAt": datetime.utcnow()}}
         )
+        entity_cache.invalidate("users", user_id)
 
         if result.matched_count == 0:
             return jsonify({"error": "Không tìm thấy user"}), 404
@@ -158,7 +161,7 @@ def get_my_documents():
         user_id = _get_current_user_strict()
 
         # Tìm tất cả documents của user này
-        docs = list(mongo_collections.documents.find({"userId": user_id}).sort("createdAt", -1))
+        docs = list(mongo_collections.documents.find(by_user(user_id)).sort(created_sort()))
 
         result = []
         for doc in docs:
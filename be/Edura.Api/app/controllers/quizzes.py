@@ -10,6 +10,7 @@ import tempfile
 import jwt  # pyjwt
 
 from app.services.mongo_service import mongo_collections
+from app.utils.ai_response_cache import ai_response_cache
 
 QUIZ_COST = int(os.getenv("QUIZ_COST_POINTS", "5"))  # mặc định 5 điểm/lần làm
 # Optional: AI & parser
@@ -25,6 +26,11 @@ try:
 except Exception:
     _parse_quiz_docx = None
 
+try:
+    from app.services.ai_service import MODEL_NAME as AI_MODEL_NAME, PROMPT_VERSION as AI_PROMPT_VERSION
+except Exception:
+    AI_MODEL_NAME, AI_PROMPT_VERSION = "unknown", "v1"
+
 quizzes_bp = Blueprint("quizzes", __name__, url_prefix="/api/quizzes")
 
 ALLOWED_EXTS = {".doc", ".docx"}
@@ -97,6 +103,11 @@ def _generate_quiz_local(text: str):
 
 def _generate_quiz(text: str):
     if _ai_generate_quiz:
+        # Cache theo hash nội dung: sinh lại quiz từ cùng tài liệu không gọi AI nữa
+        cache_key = ai_response_cache.make_key("quiz", AI_MODEL_NAME, AI_PROMPT_VERSION, text or "")
+        cached = ai_response_cache.get(cache_key)
+        if cached and cached.get("questions"):
+            return (cached.get("title") or "Bài trắc nghiệm", cached["questions"])
         try:
             title, questions = _ai_generate_quiz(text)
             title = title or "Bài trắc nghiệm"
@@ -112,6 +123,9 @@ def _generate_quiz(text: str):
                     "answer": q.get("answer") or "A",
                     "explanation": q.get("explanation") or ""
                 })
+            if fixed:
+                ai_response_cache.set(cache_key, "quiz", AI_MODEL_NAME, AI_PROMPT_VERSION,
+                                      {"title": title, "questions": fixed})
             return (title, fixed)
         except Exception as e:
             print("[AI] generate_quiz_from_text lỗi, fallback:", e)
@@ -3,6 +3,7 @@
 from flask import Blueprint, request, jsonify
 from bson import ObjectId
 from app.services.mongo_service import mongo_collections
+from app.services.entity_loader import entity_loader
 from flask import current_app
 from app.utils.search_utils import calculate_relevance_score
 
@@ -128,13 +129,8 @@ def search_documents():
         docs = list(mongo_collections.documents.find(base_match, projection))
 
         # 3) Load categories trước để join với documents
-        category_ids_for_search = {d.get("categoryId") for d in docs if d.get("categoryId")}
-        category_map_for_search = {}
-        if category_ids_for_search:
-            for c in mongo_collections.categories.find(
-                {"_id": {"$in": list(category_ids_for_search)}}, {"name": 1}
-            ):
-                category_map_for_search[c["_id"]] = c.get("name", "")
+        loader = entity_loader()
+        category_map_for_search = loader.names("categories", (d.get("categoryId") for d in docs))
         
         # 4) Filter + tính điểm relevance bằng Python
         # THỨ TỰ ƯU TIÊN: Category > Title > Keywords
@@ -149,7 +145,7 @@ def search_documents():
                 category_name = ""
                 cid = d.get("categoryId")
                 if cid:
-                    category_name = category_map_for_search.get(cid, "")
+                    category_name = category_map_for_search.get(str(cid)) or ""
 
                 # Tính relevance score theo thứ tự ưu tiên: Category > Title > Keywords
                 # Hỗ trợ tìm kiếm không dấu và không khoảng cách
@@ -162,31 +158,15 @@ def search_documents():
             filtered = docs
 
         # 5) Join tên trường/thể loại/người đăng (một lượt rồi map)
-        school_ids = {d.get("schoolId") for d in filtered if d.get("schoolId")}
-        category_ids = {d.get("categoryId") for d in filtered if d.get("categoryId")}
-        user_ids = {d.get("userId") for d in filtered if d.get("userId")}
-
-        school_map = {}
-        if school_ids:
-            for s in mongo_collections.schools.find(
-                {"_id": {"$in": list(school_ids)}}, {"name": 1}
-            ):
-                school_map[s["_id"]] = s.get("name")
-
-        category_map = {}
-        if category_ids:
-            for c in mongo_collections.categories.find(
-                {"_id": {"$in": list(category_ids)}}, {"name": 1}
-            ):
-                category_map[c["_id"]] = c.get("name")
-
-        user_map = {}
-        if user_ids:
-            for u in mongo_collections.users.find(
-                {"_id": {"$in": list(user_ids)}},
-                {"fullName": 1, "username": 1, "name": 1, "email": 1},
-            ):
-                user_map[u["_id"]] = _uploader_name(u)
+        school_map = {
+            k: sc.get("name") for k, sc in loader.load_many("schools", (d.get("schoolId") for d in filtered)).items()
+        }
+        category_map = {
+            k: c.get("name") for k, c in loader.load_many("categories", (d.get("categoryId") for d in filtered)).items()
+        }
+        user_map = {
+            k: _uploader_name(u) for k, u in loader.load_many("users", (d.get("userId") for d in filtered)).items()
+        }
 
         # 6) Sort & paginate
         if q_stripped:
@@ -221,10 +201,10 @@ def search_documents():
                 "schoolId": str(d["schoolId"]) if d.get("schoolId") else None,
                 "categoryId": str(d["categoryId"]) if d.get("categoryId") else None,
                 "userId": str(d["userId"]) if d.get("userId") else None,
-                "schoolName": school_map.get(d.get("schoolId")),
-                "categoryName": category_map.get(d.get("categoryId")),
+                "schoolName": school_map.get(str(d.get("schoolId"))),
+                "categoryName": category_map.get(str(d.get("categoryId"))),
                # "uploaderName": user_map.get(d.get("userId")),
-                "uploaderName": user_map.get(d.get("userId")) or d.get("uploaderName"),
+                "uploaderName": user_map.get(str(d.get("userId"))) or d.get("uploaderName"),
             }
             items.append(it)
 
@@ -3,6 +3,8 @@ from datetime import datetime
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 
+from app.utils.document_schema import DOCUMENT_SCHEMA_VERSION
+
 class Document:
     def __init__(
         self,
@@ -57,6 +59,11 @@ class Document:
             "summary": self.summary,
             "keywords": self.keywords,
             "createdAt": self.created_at,
+            # Bộ đếm denormalized, cập nhật bằng $inc (app/services/document_counters.py)
+            "likes": 0,
+            "dislikes": 0,
+            "commentCount": 0,
+            "schemaVersion": DOCUMENT_SCHEMA_VERSION,
         }
         if self.image_url:                         # <-- NEW
             doc["image_url"] = self.image_url
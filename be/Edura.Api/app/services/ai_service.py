@@ -4,27 +4,168 @@ from google import genai
 from google.genai.errors import APIError
 import pdfplumber  # <-- THƯ VIỆN MỚI: Dùng để trích xuất text từ PDF
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from docx import Document
 from collections import Counter
 
+from app.utils.ai_response_cache import ai_response_cache
+from app.utils.text_chunker import (
+    AI_CHUNK_TOKEN_BUDGET,
+    PAGE_BREAK,
+    chunk_text,
+    estimate_tokens,
+    strip_repeated_lines,
+    truncate_to_token_budget,
+)
+
 load_dotenv()
 
 # Lấy Key từ biến môi trường
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Dùng client giả lập (không gọi mạng) khi phát triển/kiểm thử local
+USE_FAKE_GEMINI = os.getenv("USE_FAKE_GEMINI", "false").lower() == "true"
 
 # Tên mô hình bạn muốn sử dụng
 MODEL_NAME = "gemini-2.5-flash" 
+# Tăng khi sửa prompt để cache AI cũ không còn được dùng
+PROMPT_VERSION = "v1"
+
+# Số chunk tóm tắt song song cho tài liệu dài (map stage)
+AI_MAP_CONCURRENCY = int(os.getenv("AI_MAP_CONCURRENCY", "4"))
+# Giới hạn số request Gemini đồng thời trên toàn process (cho 1 API key)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "6"))
+# Retry khi bị rate limit / lỗi tạm thời
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "2.0"))  # giây
+_RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+_gemini_semaphore = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+# Giới hạn số request Gemini / phút (0 = không giới hạn), dùng cho job chạy lô
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "0"))
+
+
+class _RateLimiter:
+    """Token bucket đơn giản: tối đa `rpm` lần acquire mỗi phút, cho phép burst nhỏ."""
+
+    def __init__(self, rpm: float = 0):
+        self._lock = threading.Lock()
+        self.set_rate(rpm)
+
+    def set_rate(self, rpm: float):
+        with self._lock:
+            self.rpm = max(0.0, float(rpm or 0))
+            self.capacity = max(1.0, self.rpm / 60.0 * 5) if self.rpm else 0.0
+            self._tokens = self.capacity
+            self._updated = time.monotonic()
+            self.waited_s = 0.0
+
+    def acquire(self):
+        if not self.rpm:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rpm / 60.0)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) * 60.0 / self.rpm
+                self.waited_s += delay
+            time.sleep(delay)
+
+
+gemini_rate_limiter = _RateLimiter(GEMINI_RPM)
+
+# Ảnh trang gửi cho Gemini Vision: chỉ render số trang thực sự gửi,
+# thu nhỏ về cạnh dài tối đa và encode 1 lần sang JPEG/WebP
+VISION_MAX_PAGES = int(os.getenv("VISION_MAX_PAGES", "5"))
+VISION_IMAGE_MAX_SIDE = int(os.getenv("VISION_IMAGE_MAX_SIDE", "1600"))  # px
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "jpeg").lower()  # jpeg | webp
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "80"))
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model=None, contents=None, config=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        raw = contents if isinstance(contents, str) else " ".join(p for p in (contents or []) if isinstance(p, str))
+        words = [w.strip(".,;:()[]") for w in raw.split() if len(w) > 4]
+        keywords = list(dict.fromkeys(words))[:12] or ["tài liệu"]
+        return _FakeResponse(
+            f"Tóm tắt: Bản tóm tắt giả lập ({len(raw)} ký tự đầu vào).\n"
+            f"Từ khóa: {', '.join(keywords)}"
+        )
+
+
+class FakeGeminiClient:
+    """
+    Client Gemini giả lập, cùng interface `client.models.generate_content(...)`.
+    Trả kết quả đúng định dạng "Tóm tắt: ... / Từ khóa: ..." sau một độ trễ cố định.
+    Bật bằng USE_FAKE_GEMINI=true (latency qua FAKE_GEMINI_LATENCY, giây).
+    """
+
+    def __init__(self, latency: float = None):
+        if latency is None:
+            latency = float(os.getenv("FAKE_GEMINI_LATENCY", "0.5"))
+        self.models = _FakeModels(latency)
+
 
 class AIService:
     """Class dịch vụ để tương tác với Gemini API."""
-    def __init__(self):
+    def __init__(self, client=None):
+        if client is not None:
+            self.client = client
+            return
+        if USE_FAKE_GEMINI:
+            print("[AI] Đang dùng FakeGeminiClient (USE_FAKE_GEMINI=true)")
+            self.client = FakeGeminiClient()
+            return
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY chưa được cấu hình trong .env")
         
         # Khởi tạo client
         self.client = genai.Client(api_key=GEMINI_API_KEY)
 
+    # ----------------------------------------------------
+    # Gọi Gemini có giới hạn đồng thời + backoff khi bị rate limit
+    # ----------------------------------------------------
+    def _generate(self, contents, config):
+        """generate_content với semaphore toàn cục và retry (429/5xx) theo exponential backoff + jitter."""
+        attempt = 0
+        while True:
+            gemini_rate_limiter.acquire()
+            try:
+                with _gemini_semaphore:
+                    return self.client.models.generate_content(
+                        model=MODEL_NAME,
+                        contents=contents,
+                        config=config,
+                    )
+            except APIError as e:
+                code = getattr(e, "code", None)
+                if code not in _RETRYABLE_CODES or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                delay = GEMINI_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+                print(f"[AI] Gemini trả {code}, thử lại sau {delay:.1f}s (lần {attempt + 1}/{GEMINI_MAX_RETRIES})")
+                time.sleep(delay)
+                attempt += 1
+
     # ----------------------------------------------------
     # HÀM MỚI: Khắc phục lỗi AttributeError
     # ----------------------------------------------------
@@ -43,64 +184,51 @@ class AIService:
     def extract_and_summarize_from_pdf_images(self, pdf_bytes: bytes, max_pages: int = 10, page_count: int = None):
         """
         Sử dụng Gemini Vision API để OCR và tóm tắt trực tiếp từ hình ảnh PDF.
-        Dùng cho PDF scan không có text layer.
+        Dùng cho PDF scan không có text layer. Kết quả được cache theo hash bytes PDF.
         """
+        is_long_doc = page_count is not None and page_count > 100
+        cache_key = ai_response_cache.make_key(
+            "vision_summary", MODEL_NAME, PROMPT_VERSION, pdf_bytes,
+            max_pages=min(max_pages, VISION_MAX_PAGES), is_long_doc=is_long_doc,
+            image=f"{VISION_IMAGE_FORMAT}:{VISION_IMAGE_MAX_SIDE}:{VISION_IMAGE_QUALITY}",
+        )
+        cached = ai_response_cache.get(cache_key)
+        if cached:
+            print("[Gemini Vision] Dùng kết quả từ cache")
+            return cached.get("summary"), cached.get("keywords") or []
+
+        summary, keywords = self._extract_and_summarize_from_pdf_images(pdf_bytes, max_pages, page_count)
+        if summary:
+            ai_response_cache.set(cache_key, "vision_summary", MODEL_NAME, PROMPT_VERSION,
+                                  {"summary": summary, "keywords": keywords or []})
+        return summary, keywords
+
+    def _extract_and_summarize_from_pdf_images(self, pdf_bytes: bytes, max_pages: int = 10, page_count: int = None):
+        """OCR + tóm tắt bằng Gemini Vision (không qua cache)."""
         try:
             import fitz  # PyMuPDF
-            from io import BytesIO
-            from PIL import Image
             
             doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            total_pages = doc.page_count
-            pages_to_process = min(max_pages, total_pages)
-            
-            print(f"[Gemini Vision] Xử lý {pages_to_process}/{total_pages} trang đầu tiên bằng Gemini Vision API...")
-            
-            # Lấy hình ảnh từ các trang đầu tiên
-            page_images = []
-            for i in range(pages_to_process):
-                try:
-                    page = doc.load_page(i)
-                    pix = page.get_pixmap(alpha=False, matrix=fitz.Matrix(2.0, 2.0))  # Scale 2x cho chất lượng tốt hơn
-                    if pix.alpha:
-                        pix = fitz.Pixmap(fitz.csRGB, pix)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    page_images.append(img)
-                except Exception as e:
-                    print(f"[Gemini Vision] Lỗi khi render trang {i}: {e}")
-                    continue
-            
-            doc.close()
+            try:
+                total_pages = doc.page_count
+                # Chỉ render những trang sẽ gửi đi
+                pages_to_process = min(max_pages, VISION_MAX_PAGES, total_pages)
+                print(f"[Gemini Vision] Xử lý {pages_to_process}/{total_pages} trang đầu tiên bằng Gemini Vision API...")
+                
+                image_parts = []
+                for i in range(pages_to_process):
+                    encoded = self._render_page_for_vision(doc, i)
+                    if encoded:
+                        image_parts.append(encoded)
+            finally:
+                doc.close()
             
-            if not page_images:
+            if not image_parts:
                 print(f"[Gemini Vision] Không render được hình ảnh nào")
                 return None, None
             
-            # Gửi hình ảnh đến Gemini Vision API để OCR và tóm tắt
-            print(f"[Gemini Vision] Gửi {len(page_images)} hình ảnh đến Gemini Vision API...")
-            
-            # Chuyển đổi hình ảnh thành base64
-            import base64
-            from io import BytesIO as BIO
-            
-            image_parts = []
-            for i, img in enumerate(page_images[:5]):  # Giới hạn 5 trang để tránh quá tải
-                try:
-                    buf = BIO()
-                    img.save(buf, format='PNG')
-                    img_bytes = buf.getvalue()
-                    # Lưu cả bytes và base64 string để có thể dùng cả hai cách
-                    image_parts.append({
-                        "mime_type": "image/png",
-                        "data_bytes": img_bytes,  # Bytes gốc
-                        "data_base64": base64.b64encode(img_bytes).decode('utf-8')  # Base64 string
-                    })
-                except Exception as e:
-                    print(f"[Gemini Vision] Lỗi khi encode hình ảnh {i}: {e}")
-                    continue
-            
-            if not image_parts:
-                return None, None
+            total_kb = sum(len(p["data_bytes"]) for p in image_parts) // 1024
+            print(f"[Gemini Vision] Gửi {len(image_parts)} hình ảnh ({total_kb} KB) đến Gemini Vision API...")
             
             # Tạo prompt cho Gemini Vision
             is_long_doc = page_count is not None and page_count > 100
@@ -137,6 +265,7 @@ class AIService:
             try:
                 # Tạo contents với text và images
                 # Thử nhiều cách để tương thích với API
+                import base64
                 from google.genai import types
                 
                 # Tạo list parts với text và images
@@ -145,46 +274,20 @@ class AIService:
                 
                 for img_part in image_parts:
                     try:
-                        # Cách 1: Thử sử dụng Blob với data là bytes
-                        try:
-                            blob = types.Blob(
-                                data=img_part["data_bytes"],  # Bytes gốc
-                                mime_type=img_part["mime_type"]
-                            )
-                            part_obj = types.Part(inline_data=blob)
-                            parts.append(part_obj)
-                            continue
-                        except Exception as e1:
-                            print(f"[Gemini Vision] Cách 1 (Blob với bytes) thất bại: {e1}")
-                        
-                        # Cách 2: Thử sử dụng Blob với data là base64 string
-                        try:
-                            blob = types.Blob(
-                                data=img_part["data_base64"],  # Base64 string
-                                mime_type=img_part["mime_type"]
-                            )
-                            part_obj = types.Part(inline_data=blob)
-                            parts.append(part_obj)
-                            continue
-                        except Exception as e2:
-                            print(f"[Gemini Vision] Cách 2 (Blob với base64) thất bại: {e2}")
-                        
-                        # Cách 3: Thử dict trực tiếp
-                        try:
-                            part_dict = {
-                                "inline_data": {
-                                    "mime_type": img_part["mime_type"],
-                                    "data": img_part["data_base64"]  # Base64 string
-                                }
+                        blob = types.Blob(
+                            data=img_part["data_bytes"],
+                            mime_type=img_part["mime_type"]
+                        )
+                        parts.append(types.Part(inline_data=blob))
+                    except Exception as e1:
+                        print(f"[Gemini Vision] Blob với bytes thất bại, dùng base64: {e1}")
+                        # Chỉ encode base64 khi cách dùng bytes không được hỗ trợ
+                        parts.append({
+                            "inline_data": {
+                                "mime_type": img_part["mime_type"],
+                                "data": base64.b64encode(img_part["data_bytes"]).decode("utf-8")
                             }
-                            parts.append(part_dict)
-                            continue
-                        except Exception as e3:
-                            print(f"[Gemini Vision] Cách 3 (dict) thất bại: {e3}")
-                            
-                    except Exception as e:
-                        print(f"[Gemini Vision] Lỗi khi tạo part cho hình ảnh: {e}")
-                        continue
+                        })
                 
                 if len(parts) <= 1:  # Chỉ có prompt, không có hình ảnh
                     print(f"[Gemini Vision] Không tạo được part nào cho hình ảnh")
@@ -193,8 +296,7 @@ class AIService:
                 print(f"[Gemini Vision] Gửi {len(parts)-1} hình ảnh với prompt text đến API...")
                 
                 # Truyền parts trực tiếp
-                response = self.client.models.generate_content(
-                    model=MODEL_NAME,
+                response = self._generate(
                     contents=parts,
                     config={
                         "system_instruction": (
@@ -238,17 +340,70 @@ class AIService:
             traceback.print_exc()
             return None, None
             
+    @staticmethod
+    def _render_page_for_vision(doc, page_index: int):
+        """
+        Render 1 trang thành ảnh nén (JPEG/WebP) cho Gemini Vision.
+        Tính scale để cạnh dài ~VISION_IMAGE_MAX_SIDE thay vì render 2x rồi mới thu nhỏ;
+        bitmap được giải phóng ngay sau khi encode nên chỉ giữ 1 trang trong RAM.
+        """
+        import fitz  # PyMuPDF
+        from io import BytesIO
+        from PIL import Image
+        
+        try:
+            page = doc.load_page(page_index)
+            longest = max(page.rect.width, page.rect.height) or 1
+            scale = min(2.0, VISION_IMAGE_MAX_SIDE / longest)
+            pix = page.get_pixmap(alpha=False, matrix=fitz.Matrix(scale, scale))
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            del pix
+            
+            buf = BytesIO()
+            if VISION_IMAGE_FORMAT == "webp":
+                img.save(buf, format="WEBP", quality=VISION_IMAGE_QUALITY, method=4)
+                mime_type = "image/webp"
+            else:
+                img.save(buf, format="JPEG", quality=VISION_IMAGE_QUALITY, optimize=True)
+                mime_type = "image/jpeg"
+            img.close()
+            return {"mime_type": mime_type, "data_bytes": buf.getvalue()}
+        except Exception as e:
+            print(f"[Gemini Vision] Lỗi khi render trang {page_index}: {e}")
+            return None
+            
     # ----------------------------------------------------
     # HÀM ĐÃ SỬA: Trả về Tuple (summary, keywords)
     # ----------------------------------------------------
     def summarize_content(self, document_text: str, page_count: int = None):
-        """Sử dụng Gemini để tóm tắt văn bản và trích xuất keywords."""
+        """Sử dụng Gemini để tóm tắt văn bản và trích xuất keywords (cache theo hash nội dung)."""
         
         if not document_text or len(document_text.strip()) == 0:
             return None, None
-        
-        # Xử lý tài liệu dài: chia nhỏ và tóm tắt từng phần
-        max_chunk_size = 50000  # Tăng lên 50k ký tự để xử lý tài liệu dài hơn
+
+        is_long = page_count > 100 if page_count is not None else len(document_text) > 60000
+        # Bỏ ngắt trang khỏi khoá cache -> trùng khoá với text ghép trang bằng "\n" trước đây
+        cache_key = ai_response_cache.make_key(
+            "summary", MODEL_NAME, PROMPT_VERSION, document_text.replace(PAGE_BREAK, "\n"), is_long_doc=is_long,
+        )
+        cached = ai_response_cache.get(cache_key)
+        if cached:
+            print("[AI] Dùng tóm tắt từ cache")
+            return cached.get("summary"), cached.get("keywords") or []
+
+        summary, keywords, complete = self._summarize_content(document_text, page_count)
+        # Chỉ cache kết quả đầy đủ: chunk lỗi / tổng hợp lỗi thì lần sau gọi lại AI
+        if summary and complete:
+            ai_response_cache.set(cache_key, "summary", MODEL_NAME, PROMPT_VERSION,
+                                  {"summary": summary, "keywords": keywords or []})
+        return summary, keywords
+
+    def _summarize_content(self, document_text: str, page_count: int = None):
+        """
+        Tóm tắt thực sự (gọi Gemini), không qua cache.
+        Trả (summary, keywords, complete): complete=False khi kết quả bị thiếu (chunk lỗi bị bỏ qua
+        hoặc bước tổng hợp lỗi, dùng bản ghép tạm) -> không được cache.
+        """
         text_length = len(document_text)
         
         # Phát hiện tài liệu dài: sử dụng page_count nếu có, nếu không thì dùng text_length
@@ -258,18 +413,22 @@ class AIService:
             # Ước tính: > 100 trang nếu text > 60k ký tự (khoảng 500-600 ký tự/trang)
             is_long_document = text_length > 60000
         
-        if text_length <= max_chunk_size:
-            # Tài liệu ngắn: tóm tắt trực tiếp
-            return self._summarize_single_chunk(document_text, is_long_doc=is_long_document)
+        # Bỏ header/footer lặp lại giữa các trang trước khi ước lượng token
+        document_text = strip_repeated_lines(document_text)
+        if estimate_tokens(document_text) <= AI_CHUNK_TOKEN_BUDGET:
+            # Vừa ngân sách token: tóm tắt trực tiếp trong 1 lần gọi
+            summary, keywords = self._summarize_single_chunk(document_text, is_long_doc=is_long_document)
+            return summary, keywords, summary is not None
         else:
-            # Tài liệu dài: chia nhỏ và tóm tắt từng phần, sau đó tổng hợp
-            return self._summarize_long_document(document_text, max_chunk_size, is_long_doc=is_long_document)
+            # Tài liệu dài: chia theo ngân sách token, tóm tắt từng phần, sau đó tổng hợp
+            return self._summarize_long_document(document_text, AI_CHUNK_TOKEN_BUDGET, is_long_doc=is_long_document)
     
     def _summarize_single_chunk(self, text: str, is_long_doc: bool = False):
         """Tóm tắt một đoạn text ngắn."""
-        # Giới hạn nội dung gửi đi (tránh lỗi token dài)
-        max_single_chunk = 50000 if is_long_doc else 30000  # Tăng cho tài liệu dài
-        content_to_send = text[:max_single_chunk] if len(text) > max_single_chunk else text
+        # Giới hạn nội dung gửi đi theo ngân sách token (chunker đã chia vừa, đây chỉ là chốt an toàn)
+        content_to_send = truncate_to_token_budget(text, AI_CHUNK_TOKEN_BUDGET)
+        if len(content_to_send) < len(text):
+            print(f"[AI] Cắt nội dung từ {len(text)} xuống {len(content_to_send)} ký tự theo ngân sách token")
         
         # Prompt chi tiết hơn cho tài liệu dài
         if is_long_doc:
@@ -321,8 +480,7 @@ class AIService:
         
         try:
             print(f"[AI] Gửi request tới Gemini API, text length: {len(content_to_send)}, is_long_doc: {is_long_doc}")
-            response = self.client.models.generate_content(
-                model=MODEL_NAME,
+            response = self._generate(
                 contents=prompt,
                 config={
                     "system_instruction": (
@@ -368,52 +526,54 @@ class AIService:
             traceback.print_exc()
             return None, None
     
-    def _summarize_long_document(self, text: str, chunk_size: int, is_long_doc: bool = False):
-        """Tóm tắt tài liệu dài bằng cách chia nhỏ và tổng hợp."""
-        # Chia text thành các chunk
-        chunks = []
-        i = 0
-        while i < len(text):
-            chunk = text[i:i + chunk_size]
-            # Cố gắng cắt ở ranh giới câu để không cắt giữa câu
-            if i + chunk_size < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                cut_point = max(last_period, last_newline)
-                if cut_point > chunk_size * 0.7:  # Nếu tìm thấy điểm cắt hợp lý
-                    chunk = chunk[:cut_point + 1]
-                    i += cut_point + 1
-                else:
-                    i += chunk_size
-            else:
-                i += chunk_size
-            
-            if chunk.strip():  # Chỉ thêm chunk không rỗng
-                chunks.append(chunk.strip())
-        
+    def _summarize_long_document(self, text: str, token_budget: int, is_long_doc: bool = False):
+        """
+        Tóm tắt tài liệu dài theo kiểu map-reduce:
+          - map: tóm tắt các chunk SONG SONG (tối đa AI_MAP_CONCURRENCY luồng)
+          - reduce: ghép tóm tắt theo đúng thứ tự chunk rồi gọi tổng hợp 1 lần
+        Chunk lỗi được bỏ qua, miễn còn ít nhất 1 chunk thành công.
+        Trả (summary, keywords, complete): complete=True chỉ khi mọi chunk và bước tổng hợp đều thành công.
+        """
+        chunks = chunk_text(text, token_budget)
         if not chunks:
-            return None, None
+            return None, None, False
         
-        # Tóm tắt từng chunk với error handling
+        # Map: tóm tắt từng chunk song song, giữ kết quả theo index
+        results = [None] * len(chunks)
+        workers = max(1, min(AI_MAP_CONCURRENCY, len(chunks)))
+        print(f"[AI] Tóm tắt {len(chunks)} chunk với {workers} luồng song song...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-map") as ex:
+            futures = {
+                ex.submit(self._summarize_single_chunk, chunk, is_long_doc): i
+                for i, chunk in enumerate(chunks)
+            }
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    # Tiếp tục với các chunk khác thay vì dừng lại
+                    print(f"Lỗi khi tóm tắt chunk {i+1}: {e}")
+        print(f"[AI] Map stage xong sau {time.perf_counter() - started:.1f}s")
+
         chunk_summaries = []
         all_keywords = []
-        
-        for i, chunk in enumerate(chunks):
-            try:
-                print(f"Đang tóm tắt chunk {i+1}/{len(chunks)} (kích thước: {len(chunk)} ký tự)...")
-                summary, keywords = self._summarize_single_chunk(chunk, is_long_doc=is_long_doc)
-                if summary:
-                    chunk_summaries.append(f"Phần {i+1}: {summary}")
-                if keywords:
-                    all_keywords.extend(keywords)
-            except Exception as e:
-                print(f"Lỗi khi tóm tắt chunk {i+1}: {e}")
-                # Tiếp tục với chunk tiếp theo thay vì dừng lại
+        for i, res in enumerate(results):
+            if not res:
                 continue
+            summary, keywords = res
+            if summary:
+                chunk_summaries.append(f"Phần {i+1}: {summary}")
+            if keywords:
+                all_keywords.extend(keywords)
         
         if not chunk_summaries:
             print("Không có chunk nào được tóm tắt thành công")
-            return None, None
+            return None, None, False
+        complete = len(chunk_summaries) == len(chunks)
+        if not complete:
+            print(f"[AI] {len(chunks) - len(chunk_summaries)}/{len(chunks)} chunk lỗi, tóm tắt thiếu (không cache)")
         
         # Tổng hợp các tóm tắt lại với prompt chi tiết hơn cho tài liệu dài
         combined_summaries = "\n\n".join(chunk_summaries)
@@ -468,8 +628,7 @@ class AIService:
             )
         
         try:
-            response = self.client.models.generate_content(
-                model=MODEL_NAME,
+            response = self._generate(
                 contents=final_prompt,
                 config={
                     "system_instruction": (
@@ -495,8 +654,9 @@ class AIService:
                 # Lấy keywords từ tất cả các chunk, loại bỏ trùng lặp
                 keyword_counter = Counter(all_keywords)
                 keywords = [k for k, _ in keyword_counter.most_common(15)]
+                complete = False
             
-            return summary_part, keywords
+            return summary_part, keywords, complete
             
         except APIError as e:
             print(f"Lỗi Gemini API khi tổng hợp: {e}")
@@ -504,10 +664,10 @@ class AIService:
             fallback_summary = " ".join([s.split(": ", 1)[1] if ": " in s else s for s in chunk_summaries[:3]])
             keyword_counter = Counter(all_keywords)
             fallback_keywords = [k for k, _ in keyword_counter.most_common(12)]
-            return fallback_summary[:500], fallback_keywords
+            return fallback_summary[:500], fallback_keywords, False
         except Exception as e:
             print(f"Lỗi phân tích kết quả AI khi tổng hợp: {e}")
-            return None, None
+            return None, None, False
             
        # ============================================================
 # HÀM: Đọc file Word định dạng + / - (dòng in đậm là đúng)
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import os
+import threading
+import time
 from io import BufferedReader, BytesIO
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 
 import boto3
 from boto3.s3.transfer import TransferConfig
@@ -11,6 +13,47 @@ from botocore.config import Config  # dùng cho retry/backoff
 
 BinaryLike = Union[BytesIO, BufferedReader]
 
+# Ngưỡng (ms) của histogram độ trễ theo operation
+_LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class S3Metrics:
+    """Đếm số lần gọi / lỗi / độ trễ theo từng operation S3 (GetObject, HeadObject...)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ops: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, op: str, elapsed_ms: float, error: bool = False) -> None:
+        with self._lock:
+            m = self._ops.get(op)
+            if m is None:
+                m = self._ops[op] = {
+                    "count": 0, "errors": 0, "totalMs": 0.0, "maxMs": 0.0,
+                    "buckets": [0] * (len(_LATENCY_BUCKETS_MS) + 1),
+                }
+            m["count"] += 1
+            if error:
+                m["errors"] += 1
+            m["totalMs"] += elapsed_ms
+            m["maxMs"] = max(m["maxMs"], elapsed_ms)
+            idx = next((i for i, b in enumerate(_LATENCY_BUCKETS_MS) if elapsed_ms <= b), len(_LATENCY_BUCKETS_MS))
+            m["buckets"][idx] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for op, m in self._ops.items():
+                labels = [f"<={b}ms" for b in _LATENCY_BUCKETS_MS] + [f">{_LATENCY_BUCKETS_MS[-1]}ms"]
+                out[op] = {
+                    "count": m["count"],
+                    "errors": m["errors"],
+                    "avgMs": round(m["totalMs"] / m["count"], 2) if m["count"] else 0.0,
+                    "maxMs": round(m["maxMs"], 2),
+                    "histogram": dict(zip(labels, m["buckets"])),
+                }
+            return out
+
 
 class AwsService:
     def __init__(self) -> None:
@@ -21,7 +64,8 @@ class AwsService:
         self.region: str = os.getenv("AWS_REGION", "ap-southeast-1")
         self.accelerate: bool = os.getenv("S3_ACCELERATE", "false").lower() == "true"
 
-        # Cấu hình retry (tăng độ bền mạng)
+        # Cấu hình retry (tăng độ bền mạng) + connection pool dùng chung cho mọi controller.
+        # boto3 client thread-safe: 1 client duy nhất, giữ keep-alive giữa các request.
         retry_cfg = Config(
             region_name=self.region,
             retries={
@@ -29,12 +73,23 @@ class AwsService:
                 "mode": "standard",         # standard/backoff
             },
             s3={"use_accelerate_endpoint": self.accelerate},
+            max_pool_connections=int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50")),
+            tcp_keepalive=True,
+            connect_timeout=int(os.getenv("S3_CONNECT_TIMEOUT", "5")),
+            read_timeout=int(os.getenv("S3_READ_TIMEOUT", "60")),
         )
 
         # Khởi tạo session + client
         self.session = boto3.session.Session(region_name=self.region)
         self.s3_client = self.session.client("s3", config=retry_cfg)
 
+        # Đo độ trễ từng operation qua event hook của botocore
+        self.metrics = S3Metrics()
+        events = self.s3_client.meta.events
+        events.register("before-call.s3.*", self._on_before_call)
+        events.register("after-call.s3.*", self._on_after_call)
+        events.register("after-call-error.s3.*", self._on_after_call_error)
+
         # Cấu hình multipart upload
         # - ngưỡng multipart 5MB (chuẩn S3)
         # - chunk size & concurrency có thể chỉnh qua ENV
@@ -46,6 +101,32 @@ class AwsService:
             use_threads=True,
         )
 
+    # -------------------------------------------------------------
+    # Metrics hooks
+    # -------------------------------------------------------------
+    def _on_before_call(self, model=None, context=None, **kwargs) -> None:
+        if context is not None and model is not None:
+            context["edura_op"] = model.name
+            context["edura_started_at"] = time.perf_counter()
+
+    def _on_after_call(self, http_response=None, context=None, **kwargs) -> None:
+        status = getattr(http_response, "status_code", 200) or 200
+        self._record_call(context, error=status >= 400)
+
+    def _on_after_call_error(self, context=None, **kwargs) -> None:
+        # Lỗi mạng/timeout (không có HTTP response)
+        self._record_call(context, error=True)
+
+    def _record_call(self, context, error: bool) -> None:
+        context = context or {}
+        started = context.pop("edura_started_at", None)
+        if started is None:
+            return
+        self.metrics.record(context.get("edura_op", "unknown"), (time.perf_counter() - started) * 1000.0, error=error)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self.metrics.snapshot()
+
     # -------------------------------------------------------------
     # URL builder (public URL — nếu bucket public hoặc có policy phù hợp)
     # -------------------------------------------------------------
@@ -114,6 +195,108 @@ class AwsService:
             print(f"[ERROR] presign_put_url: {e}")
             return None
 
+    # -------------------------------------------------------------
+    # Multipart upload trực tiếp từ FE (file lớn, upload lại được từng part)
+    # -------------------------------------------------------------
+    def create_multipart_upload(self, key: str, content_type: Optional[str] = None) -> Optional[str]:
+        """Khởi tạo multipart upload, trả UploadId (None nếu lỗi)."""
+        try:
+            params = {"Bucket": self.bucket, "Key": key}
+            if content_type:
+                params["ContentType"] = content_type
+            return self.s3_client.create_multipart_upload(**params)["UploadId"]
+        except Exception as e:
+            print(f"[ERROR] create_multipart_upload: {e}")
+            return None
+
+    def presign_upload_part(
+        self,
+        key: str,
+        upload_id: str,
+        part_number: int,
+        expires_in: int = 3600,
+    ) -> Optional[str]:
+        """Presigned URL cho PUT 1 part (part_number từ 1 tới 10000)."""
+        try:
+            return self.s3_client.generate_presigned_url(
+                ClientMethod="upload_part",
+                Params={"Bucket": self.bucket, "Key": key,
+                        "UploadId": upload_id, "PartNumber": part_number},
+                ExpiresIn=expires_in,
+            )
+        except Exception as e:
+            print(f"[ERROR] presign_upload_part: {e}")
+            return None
+
+    def list_parts(self, key: str, upload_id: str) -> list:
+        """Các part S3 đã nhận: [{"PartNumber", "ETag", "Size"}] (dùng để resume/complete)."""
+        parts = []
+        paginator = self.s3_client.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+            for p in page.get("Parts", []):
+                parts.append({"PartNumber": p["PartNumber"], "ETag": p["ETag"], "Size": p.get("Size", 0)})
+        return parts
+
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: Optional[list] = None) -> bool:
+        """
+        Ghép các part thành object. parts = [{"PartNumber", "ETag"}];
+        nếu không truyền thì lấy từ S3 (list_parts) để FE không cần gửi ETag.
+        """
+        try:
+            if not parts:
+                parts = [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in self.list_parts(key, upload_id)]
+            if not parts:
+                return False
+            parts = sorted(parts, key=lambda p: p["PartNumber"])
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            return True
+        except Exception as e:
+            print(f"[ERROR] complete_multipart_upload: {e}")
+            return False
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> bool:
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            return True
+        except Exception as e:
+            print(f"[ERROR] abort_multipart_upload: {e}")
+            return False
+
+    # -------------------------------------------------------------
+    # Presign URL cho GET (FE tải/xem trực tiếp từ S3, không qua Flask)
+    # -------------------------------------------------------------
+    def presign_get_url(
+        self,
+        key: str,
+        expires_in: int = 300,
+        bucket: Optional[str] = None,
+        content_disposition: Optional[str] = None,
+        content_type: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Tạo presigned URL cho GET object.
+        - content_disposition: ghi đè Content-Disposition (vd: attachment khi ?download=1)
+        - content_type: ghi đè Content-Type trả về
+        - expires_in: TTL (giây), mặc định 300s (5 phút)
+        """
+        try:
+            params = {"Bucket": bucket or self.bucket, "Key": key}
+            if content_disposition:
+                params["ResponseContentDisposition"] = content_disposition
+            if content_type:
+                params["ResponseContentType"] = content_type
+            return self.s3_client.generate_presigned_url(
+                ClientMethod="get_object",
+                Params=params,
+                ExpiresIn=expires_in,
+            )
+        except Exception as e:
+            print(f"[ERROR] presign_get_url: {e}")
+            return None
+
     # -------------------------------------------------------------
     # Xóa object (tiện cho admin/GC)
     # -------------------------------------------------------------
@@ -125,6 +308,40 @@ class AwsService:
             print(f"[ERROR] delete_object: {e}")
             return False
 
+    # -------------------------------------------------------------
+    # Đọc object: stream / range / tải về file
+    # -------------------------------------------------------------
+    def get_object(
+        self,
+        key: str,
+        bucket: Optional[str] = None,
+        range_header: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        GetObject (có thể kèm Range: "bytes=0-1023"). Trả response của boto3;
+        đọc dữ liệu bằng response["Body"].iter_chunks(). Ném exception nếu lỗi.
+        """
+        params = {"Bucket": bucket or self.bucket, "Key": key}
+        if range_header:
+            params["Range"] = range_header
+        return self.s3_client.get_object(**params)
+
+    def get_range(self, key: str, start: int, end: int, bucket: Optional[str] = None) -> bytes:
+        """Đọc khoảng byte [start, end] (bao gồm end)."""
+        obj = self.get_object(key, bucket=bucket, range_header=f"bytes={start}-{end}")
+        return obj["Body"].read()
+
+    def read_object(self, key: str, bucket: Optional[str] = None) -> bytes:
+        """Đọc toàn bộ object vào bộ nhớ (chỉ dùng cho file nhỏ/cần thiết)."""
+        return self.get_object(key, bucket=bucket)["Body"].read()
+
+    def download_to_path(self, key: str, path: str, bucket: Optional[str] = None) -> None:
+        """Tải object về file cục bộ (multipart/song song theo transfer_cfg)."""
+        self.s3_client.download_file(bucket or self.bucket, key, path, Config=self.transfer_cfg)
+
+    def head_object(self, key: str, bucket: Optional[str] = None) -> Dict[str, Any]:
+        return self.s3_client.head_object(Bucket=bucket or self.bucket, Key=key)
+
     # -------------------------------------------------------------
     # Kiểm tra tồn tại object (head)
     # -------------------------------------------------------------
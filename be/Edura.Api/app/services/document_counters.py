@@ -0,0 +1,216 @@
+# app/services/document_counters.py
+# -*- coding: utf-8 -*-
+"""
+Bộ đếm like/dislike/bình luận lưu thẳng trên document (likes, dislikes, commentCount).
+- Mỗi lần tạo/đổi/xoá reaction hoặc bình luận: $inc nguyên tử trên document,
+  nên trang danh sách đọc luôn từ document, không cần $group trên
+  document_reactions/document_comments.
+- Document cũ chưa có bộ đếm được backfill tự động khi đọc lần đầu (get/fill_missing).
+- reconcile(): đếm lại từ collection gốc và sửa các document bị lệch
+  (chạy định kỳ bằng scripts/reconcile_document_counters.py).
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from app.services.mongo_service import mongo_collections
+
+COUNTER_FIELDS = ("likes", "dislikes", "commentCount")
+_REACTION_FIELDS = {"like": "likes", "dislike": "dislikes"}
+
+
+def counter_fields(doc: Optional[dict]) -> Dict[str, int]:
+    """likes/dislikes/commentCount đọc từ document (thiếu hoặc âm -> 0)."""
+    doc = doc or {}
+    out = {}
+    for field in COUNTER_FIELDS:
+        try:
+            out[field] = max(0, int(doc.get(field) or 0))
+        except (TypeError, ValueError):
+            out[field] = 0
+    return out
+
+
+class DocumentCounterService:
+    """Cập nhật bộ đếm trên document song song với document_reactions/document_comments."""
+
+    # ------------------------------------------------------------------
+    # Reactions
+    # ------------------------------------------------------------------
+    def set_reaction(self, doc_oid, user_id, action: str) -> Dict[str, int]:
+        """
+        Ghi reaction của user (like/dislike/none) và cập nhật bộ đếm.
+        Lấy reaction cũ trong cùng thao tác ghi để delta luôn đúng khi request đồng thời.
+        """
+        if action == "none":
+            previous = mongo_collections.document_reactions.find_one_and_delete(
+                {"documentId": doc_oid, "userId": user_id}, projection={"reaction": 1}
+            )
+        else:
+            previous = mongo_collections.document_reactions.find_one_and_update(
+                {"documentId": doc_oid, "userId": user_id},
+                {"$set": {"reaction": action, "updatedAt": datetime.utcnow()}},
+                projection={"reaction": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        old = (previous or {}).get("reaction")
+        new = None if action == "none" else action
+
+        inc = {}
+        if old in _REACTION_FIELDS and old != new:
+            inc[_REACTION_FIELDS[old]] = -1
+        if new in _REACTION_FIELDS and old != new:
+            inc[_REACTION_FIELDS[new]] = 1
+        return self._apply(doc_oid, inc)
+
+    # ------------------------------------------------------------------
+    # Comments
+    # ------------------------------------------------------------------
+    def comment_added(self, doc_oid) -> Dict[str, int]:
+        return self._apply(doc_oid, {"commentCount": 1})
+
+    def comment_removed(self, doc_oid, n: int = 1) -> Dict[str, int]:
+        return self._apply(doc_oid, {"commentCount": -n}) if n else self.get(doc_oid)
+
+    # ------------------------------------------------------------------
+    def get(self, doc_oid) -> Dict[str, int]:
+        """Đọc bộ đếm; document cũ chưa có bộ đếm thì đếm lại 1 lần và lưu."""
+        doc = mongo_collections.documents.find_one({"_id": doc_oid}, {f: 1 for f in COUNTER_FIELDS})
+        if doc is None:
+            return counter_fields(None)
+        if any(f not in doc for f in COUNTER_FIELDS):
+            self.reconcile([doc_oid])
+            doc = mongo_collections.documents.find_one({"_id": doc_oid}, {f: 1 for f in COUNTER_FIELDS})
+        return counter_fields(doc)
+
+    def fresh(self, docs: list) -> list:
+        """
+        Trang lấy từ cache / secondary: đọc lại bộ đếm của đúng các _id trong trang từ primary
+        (1 find có projection) để like/bình luận vừa xảy ra hiển thị ngay.
+        Trả bản sao của từng dict (không sửa payload đang nằm trong cache), rồi fill_missing.
+        """
+        ids = [d["_id"] for d in docs if d.get("_id") is not None]
+        if not ids:
+            return docs
+        try:
+            current = {
+                d["_id"]: d
+                for d in mongo_collections.documents.find({"_id": {"$in": ids}}, {f: 1 for f in COUNTER_FIELDS})
+            }
+        except Exception as e:
+            print(f"[DocumentCounters] Không đọc lại được bộ đếm: {e}")
+            return self.fill_missing(docs)
+        out = []
+        for d in docs:
+            d = dict(d)
+            row = current.get(d.get("_id"))
+            if row is not None:
+                for f in COUNTER_FIELDS:
+                    if f in row:
+                        d[f] = row[f]
+                    else:
+                        d.pop(f, None)
+            out.append(d)
+        return self.fill_missing(out)
+
+    def fill_missing(self, docs: list) -> list:
+        """
+        Trang danh sách: document cũ chưa có bộ đếm thì đếm lại từ nguồn cho cả trang
+        (1 lượt aggregate), lưu lên document để lần sau đọc thẳng, và điền vào dict
+        để trang hiện tại không hiển thị 0. Document đã có đủ bộ đếm: không query gì.
+        """
+        missing = [d for d in docs if d.get("_id") is not None and any(f not in d for f in COUNTER_FIELDS)]
+        if not missing:
+            return docs
+        try:
+            truth = self.count_from_source(d["_id"] for d in missing)
+        except Exception as e:
+            print(f"[DocumentCounters] Không đếm được bộ đếm còn thiếu: {e}")
+            return docs
+        # Điều kiện trên giá trị đã đọc: không ghi đè $inc đồng thời
+        ops = [
+            UpdateOne({"_id": d["_id"], **{f: d.get(f) for f in COUNTER_FIELDS}}, {"$set": truth[d["_id"]]})
+            for d in missing
+        ]
+        try:
+            mongo_collections.documents.bulk_write(ops, ordered=False)
+        except Exception as e:
+            print(f"[DocumentCounters] Không lưu được bộ đếm backfill: {e}")
+        for d in missing:
+            d.update(truth[d["_id"]])
+        return docs
+
+    def _apply(self, doc_oid, inc: Dict[str, int]) -> Dict[str, int]:
+        if not inc:
+            return self.get(doc_oid)
+        before = mongo_collections.documents.find_one_and_update(
+            {"_id": doc_oid},
+            {"$inc": inc},
+            projection={f: 1 for f in COUNTER_FIELDS},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is None:
+            return counter_fields(None)
+        if any(f not in before for f in COUNTER_FIELDS):
+            # Document tạo trước khi có bộ đếm: $inc từ 0 sẽ sai -> đếm lại từ nguồn
+            self.reconcile([doc_oid])
+            return self.get(doc_oid)
+        after = dict(before)
+        for field, delta in inc.items():
+            after[field] = (before.get(field) or 0) + delta
+        return counter_fields(after)
+
+    # ------------------------------------------------------------------
+    # Reconcile
+    # ------------------------------------------------------------------
+    def count_from_source(self, doc_ids: Iterable) -> Dict[object, Dict[str, int]]:
+        """Đếm thật từ document_reactions/document_comments cho danh sách _id."""
+        doc_ids = list(doc_ids)
+        counts = {oid: {f: 0 for f in COUNTER_FIELDS} for oid in doc_ids}
+        if not doc_ids:
+            return counts
+        for row in mongo_collections.document_reactions.aggregate([
+            {"$match": {"documentId": {"$in": doc_ids}}},
+            {"$group": {"_id": {"id": "$documentId", "reaction": "$reaction"}, "cnt": {"$sum": 1}}},
+        ]):
+            field = _REACTION_FIELDS.get(row["_id"].get("reaction"))
+            if field and row["_id"]["id"] in counts:
+                counts[row["_id"]["id"]][field] = row["cnt"]
+        for row in mongo_collections.document_comments.aggregate([
+            {"$match": {"documentId": {"$in": doc_ids}}},
+            {"$group": {"_id": "$documentId", "cnt": {"$sum": 1}}},
+        ]):
+            if row["_id"] in counts:
+                counts[row["_id"]]["commentCount"] = row["cnt"]
+        return counts
+
+    def reconcile(self, doc_ids: Iterable, dry_run: bool = False) -> Dict[str, int]:
+        """
+        So bộ đếm trên document với số đếm thật, ghi lại các document lệch bằng bulk_write.
+        Trả {"checked": n, "fixed": m}.
+        """
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {"checked": 0, "fixed": 0}
+        # Đọc bộ đếm hiện tại trước, đếm nguồn sau; chỉ ghi khi bộ đếm chưa bị
+        # $inc đồng thời thay đổi (điều kiện trên giá trị cũ), lệch còn lại để lần sau
+        current = list(mongo_collections.documents.find(
+            {"_id": {"$in": doc_ids}}, {f: 1 for f in COUNTER_FIELDS}
+        ))
+        truth = self.count_from_source(d["_id"] for d in current)
+        ops = []
+        for doc in current:
+            expected = truth[doc["_id"]]
+            if any(doc.get(f) != expected[f] for f in COUNTER_FIELDS):
+                guard = {"_id": doc["_id"], **{f: doc.get(f) for f in COUNTER_FIELDS}}
+                ops.append(UpdateOne(guard, {"$set": expected}))
+        if ops and not dry_run:
+            mongo_collections.documents.bulk_write(ops, ordered=False)
+        return {"checked": len(doc_ids), "fixed": len(ops)}
+
+
+# Global service instance
+document_counters = DocumentCounterService()
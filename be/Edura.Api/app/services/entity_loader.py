@@ -0,0 +1,179 @@
+# app/services/entity_loader.py
+# -*- coding: utf-8 -*-
+"""
+Batch loader (kiểu DataLoader) cho các join schools / categories / users ở controller.
+- entity_loader() trả loader gắn với request hiện tại (flask.g): id được gom, bỏ trùng,
+  chuẩn hoá ObjectId/string; mỗi loại entity chỉ 1 query {_id: {$in}} cho các id chưa biết.
+- Kết quả đã tải trong request được nhớ lại -> gọi name()/get() theo từng dòng không tốn query.
+- schools/categories tra trước trong lookup_cache (snapshot toàn bộ, 0 round trip); id chưa có
+  trong snapshot (vừa tạo) mới rơi xuống query.
+- Hot cache dùng chung giữa các request (LRU + TTL theo loại): schools/categories gần như
+  không đổi nên TTL dài, users TTL ngắn (đổi tên hiển thị được ENTITY_CACHE_TTL_USERS giây).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from bson import ObjectId
+from flask import g, has_app_context
+
+from app.services.lookup_cache import LOOKUP_KINDS, lookup_cache
+from app.services.mongo_service import mongo_collections
+
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "20000"))
+ENTITY_CACHE_TTL_LOOKUP = float(os.getenv("ENTITY_CACHE_TTL_LOOKUP", "600"))  # giây, schools/categories
+ENTITY_CACHE_TTL_USERS = float(os.getenv("ENTITY_CACHE_TTL_USERS", "60"))  # giây
+
+# Loại entity -> collection, projection, TTL hot cache
+ENTITY_KINDS = {
+    "schools": {"projection": {"name": 1, "shortName": 1}, "ttl": ENTITY_CACHE_TTL_LOOKUP},
+    "categories": {"projection": {"name": 1}, "ttl": ENTITY_CACHE_TTL_LOOKUP},
+    "users": {
+        "projection": {"username": 1, "fullName": 1, "name": 1, "email": 1, "avatarUrl": 1},
+        "ttl": ENTITY_CACHE_TTL_USERS,
+    },
+}
+
+
+def _as_oid(value) -> Optional[ObjectId]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except Exception:
+        return None
+
+
+def display_name(kind: str, doc: Optional[dict]) -> Optional[str]:
+    """Tên hiển thị của entity (user: họ tên -> name -> username)."""
+    if not doc:
+        return None
+    if kind == "users":
+        return doc.get("fullName") or doc.get("name") or doc.get("username")
+    if kind == "schools":
+        return doc.get("name") or doc.get("shortName")
+    return doc.get("name")
+
+
+class EntityHotCache:
+    """Cache entity dùng chung giữa các request (LRU + TTL theo loại)."""
+
+    def __init__(self, max_size: int = ENTITY_CACHE_SIZE):
+        self.max_size = max_size
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "queries": 0, "loaded": 0}
+
+    def get_many(self, kind: str, oids: Iterable[ObjectId]) -> Dict[ObjectId, dict]:
+        ttl = ENTITY_KINDS[kind]["ttl"]
+        now = time.time()
+        found = {}
+        with self._lock:
+            for oid in oids:
+                entry = self._data.get((kind, oid))
+                if entry and now - entry[1] < ttl:
+                    self._data.move_to_end((kind, oid))
+                    found[oid] = entry[0]
+            self.stats["hits"] += len(found)
+        return found
+
+    def put_many(self, kind: str, docs: Dict[ObjectId, dict]):
+        now = time.time()
+        with self._lock:
+            for oid, doc in docs.items():
+                self._data[(kind, oid)] = (doc, now)
+                self._data.move_to_end((kind, oid))
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, kind: str = None, entity_id=None):
+        """Bỏ cache 1 entity, 1 loại, hoặc toàn bộ (vd sau khi user đổi tên, admin seed trường)."""
+        with self._lock:
+            if kind is None:
+                self._data.clear()
+            elif entity_id is None:
+                for key in [k for k in self._data if k[0] == kind]:
+                    del self._data[key]
+            else:
+                oid = _as_oid(entity_id)
+                self._data.pop((kind, oid), None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": size,
+            "maxSize": self.max_size,
+            "hitRate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+class BatchLoader:
+    """Loader của 1 request: nhớ mọi entity đã tải (kể cả id không tồn tại)."""
+
+    def __init__(self, hot_cache: EntityHotCache):
+        self._hot = hot_cache
+        self._loaded: Dict[str, Dict[ObjectId, Optional[dict]]] = {kind: {} for kind in ENTITY_KINDS}
+
+    def load_many(self, kind: str, ids: Iterable) -> Dict[str, dict]:
+        """Tải các entity theo id (ObjectId hoặc string) -> {str(_id): doc}, bỏ qua id không tồn tại."""
+        loaded = self._loaded[kind]
+        oids = {oid for oid in (_as_oid(v) for v in ids) if oid}
+        missing = [oid for oid in oids if oid not in loaded]
+        if missing and kind in LOOKUP_KINDS:
+            snap = lookup_cache.get_many(kind, missing)
+            loaded.update({oid: snap[str(oid)] for oid in missing if str(oid) in snap})
+            missing = [oid for oid in missing if oid not in loaded]
+        if missing:
+            cached = self._hot.get_many(kind, missing)
+            loaded.update(cached)
+            missing = [oid for oid in missing if oid not in cached]
+        if missing:
+            self._hot.stats["misses"] += len(missing)
+            self._hot.stats["queries"] += 1
+            fetched = {
+                doc["_id"]: doc
+                for doc in mongo_collections.db[kind].find(
+                    {"_id": {"$in": missing}}, ENTITY_KINDS[kind]["projection"]
+                )
+            }
+            self._hot.stats["loaded"] += len(fetched)
+            self._hot.put_many(kind, fetched)
+            loaded.update(fetched)
+            for oid in missing:
+                loaded.setdefault(oid, None)
+        return {str(oid): loaded[oid] for oid in oids if loaded.get(oid) is not None}
+
+    def get(self, kind: str, entity_id) -> Optional[dict]:
+        oid = _as_oid(entity_id)
+        if not oid:
+            return None
+        return self.load_many(kind, [oid]).get(str(oid))
+
+    def names(self, kind: str, ids: Iterable) -> Dict[str, str]:
+        """{str(_id): tên hiển thị} cho danh sách id."""
+        return {k: display_name(kind, doc) for k, doc in self.load_many(kind, ids).items()}
+
+    def name(self, kind: str, entity_id) -> Optional[str]:
+        return display_name(kind, self.get(kind, entity_id))
+
+
+def entity_loader() -> BatchLoader:
+    """Loader của request hiện tại (ngoài app context -> loader mới, vẫn dùng hot cache)."""
+    if not has_app_context():
+        return BatchLoader(entity_cache)
+    loader = g.get("_entity_loader")
+    if loader is None:
+        loader = g._entity_loader = BatchLoader(entity_cache)
+    return loader
+
+
+# Global hot cache instance
+entity_cache = EntityHotCache()
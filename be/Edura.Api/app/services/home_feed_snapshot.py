@@ -0,0 +1,133 @@
+# app/services/home_feed_snapshot.py
+# -*- coding: utf-8 -*-
+"""
+Snapshot (materialized) cho các feed trang chủ mobile: /home/trending, /home/trending-15.
+- Phần ẩn danh (section theo danh mục, top tài liệu + bộ đếm + tên người đăng) được build
+  1 lần rồi giữ trong RAM; thread nền build lại mỗi HOME_SNAPSHOT_TTL giây.
+- Request chỉ lấy snapshot + tính phần riêng của user (myReaction, isFavorite) ở controller.
+- Snapshot build với HOME_SNAPSHOT_LIMIT item / section; request xin nhiều hơn -> build trực tiếp.
+- Snapshot nằm trong RAM của từng process; dữ liệu trễ tối đa ~TTL giây.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+HOME_SNAPSHOT_ENABLED = os.getenv("HOME_SNAPSHOT_ENABLED", "true").lower() == "true"
+HOME_SNAPSHOT_TTL = float(os.getenv("HOME_SNAPSHOT_TTL", "60"))  # giây
+# Số item tối đa / section được materialize (request limit <= số này dùng snapshot)
+HOME_SNAPSHOT_LIMIT = int(os.getenv("HOME_SNAPSHOT_LIMIT", "24"))
+# Feed không ai gọi quá lâu thì thread nền thôi build lại (build lại khi có request)
+HOME_SNAPSHOT_IDLE = float(os.getenv("HOME_SNAPSHOT_IDLE", "900"))  # giây
+
+
+class HomeFeedSnapshot:
+    """Giữ snapshot của các feed đã đăng ký và làm mới định kỳ ở thread nền."""
+
+    def __init__(self, ttl: float = HOME_SNAPSHOT_TTL, max_limit: int = HOME_SNAPSHOT_LIMIT):
+        self.ttl = ttl
+        self.max_limit = max_limit
+        self._builders: Dict[str, Callable[[int], list]] = {}
+        # name -> {"sections": [...], "builtAt": epoch, "lastUsed": epoch}
+        self._snapshots: Dict[str, dict] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"hits": 0, "misses": 0, "bypass": 0, "builds": 0,
+                      "buildErrors": 0, "lastBuildMs": 0.0}
+
+    def register(self, name: str, builder: Callable[[int], list]):
+        """builder(limit) -> list section (dict) chỉ gồm dữ liệu ẩn danh."""
+        self._builders[name] = builder
+        self._build_locks[name] = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="home-feed-snapshot", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.ttl)
+            now = time.time()
+            for name in list(self._snapshots):
+                snap = self._snapshots.get(name)
+                if not snap or now - snap["lastUsed"] > HOME_SNAPSHOT_IDLE:
+                    continue
+                try:
+                    self._build(name)
+                except Exception as e:
+                    print(f"[HomeSnapshot] Lỗi làm mới '{name}': {e}")
+
+    def _build(self, name: str) -> dict:
+        with self._build_locks[name]:
+            started = time.time()
+            try:
+                sections = self._builders[name](self.max_limit)
+            except Exception:
+                self.stats["buildErrors"] += 1
+                raise
+            previous = self._snapshots.get(name)
+            snap = {
+                "sections": sections,
+                "builtAt": time.time(),
+                "lastUsed": previous["lastUsed"] if previous else time.time(),
+            }
+            self._snapshots[name] = snap
+            self.stats["builds"] += 1
+            self.stats["lastBuildMs"] = round((time.time() - started) * 1000, 1)
+            return snap
+
+    # ------------------------------------------------------------------
+    def get(self, name: str, limit: int) -> list:
+        """
+        Section của feed, mỗi section cắt còn `limit` item.
+        Item là dict dùng chung giữa các request -> caller phải copy trước khi thêm trường.
+        """
+        if not HOME_SNAPSHOT_ENABLED or limit > self.max_limit:
+            self.stats["bypass"] += 1
+            return self._builders[name](limit)
+
+        snap = self._snapshots.get(name)
+        # Thread nền chết/treo -> snapshot quá cũ thì build lại ngay trong request
+        if snap is None or time.time() - snap["builtAt"] > self.ttl * 3:
+            self.stats["misses"] += 1
+            snap = self._build(name)
+        else:
+            self.stats["hits"] += 1
+        snap["lastUsed"] = time.time()
+        self._ensure_thread()
+        return [{**section, "items": section["items"][:limit]} for section in snap["sections"]]
+
+    def invalidate(self, name: str = None):
+        """Bỏ snapshot (vd sau khi admin xoá tài liệu) -> request sau build lại."""
+        if name is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(name, None)
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        return {
+            **self.stats,
+            "enabled": HOME_SNAPSHOT_ENABLED,
+            "ttlSec": self.ttl,
+            "maxLimit": self.max_limit,
+            "feeds": {
+                name: {
+                    "ageSec": round(now - snap["builtAt"], 1),
+                    "sections": len(snap["sections"]),
+                    "items": sum(len(s["items"]) for s in snap["sections"]),
+                }
+                for name, snap in list(self._snapshots.items())
+            },
+        }
+
+
+# Global snapshot instance
+home_feed_snapshot = HomeFeedSnapshot()
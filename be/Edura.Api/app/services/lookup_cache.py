@@ -0,0 +1,260 @@
+# app/services/lookup_cache.py
+# -*- coding: utf-8 -*-
+"""
+Snapshot trong RAM của schools / categories (chỉ đổi khi admin seed / upload tạo mặc định).
+- Mỗi loại: danh sách sắp theo tên, index theo _id và theo tên đã bỏ dấu (strip_vn), ETag theo nội dung.
+- NameIndex: danh sách khoá đã sắp (tên, từng hậu tố theo từ, tên viết tắt, acronym) -> tìm
+  prefix bằng bisect, không phân biệt dấu; infix chỉ quét khi prefix chưa đủ kết quả.
+- Làm mới theo version counter (collection lookup_versions, _id = tên collection): bump() khi ghi,
+  mọi process đọc lại version tối đa 1 lần / LOOKUP_VERSION_TTL giây -> request thường 0 round trip.
+- LOOKUP_CHANGE_STREAM=true (replica set): thread nền watch 2 collection, có thay đổi là reload ngay,
+  kể cả khi ghi trực tiếp vào DB không qua bump().
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional
+
+from flask import jsonify, make_response, request
+
+from app.services.mongo_service import mongo_collections
+from app.utils.search_utils import strip_vn
+
+LOOKUP_VERSION_TTL = float(os.getenv("LOOKUP_VERSION_TTL", "30"))  # giây
+LOOKUP_CHANGE_STREAM = os.getenv("LOOKUP_CHANGE_STREAM", "false").lower() == "true"
+
+LOOKUP_KINDS = {
+    "schools": {"name": 1, "shortName": 1},
+    "categories": {"name": 1},
+}
+
+
+def fold(text: Optional[str]) -> str:
+    """Khoá so khớp tên: bỏ dấu, lower-case, gộp khoảng trắng."""
+    return " ".join(strip_vn(text or "").split())
+
+
+def acronym(text: Optional[str]) -> str:
+    """
+    Chữ viết tắt của tên: chữ cái đầu mỗi từ, từ viết hoa toàn bộ giữ nguyên.
+    "ĐH Bách Khoa TP.HCM" -> "dhbktphcm", "Đại học Cần Thơ" -> "dhct".
+    """
+    out = []
+    for word in re.findall(r"\w+", text or ""):
+        folded = fold(word)
+        out.append(folded if len(word) > 1 and word.isupper() else folded[:1])
+    return "".join(out)
+
+
+# Hạng khớp (nhỏ hơn = tốt hơn)
+MATCH_PREFIX, MATCH_WORD, MATCH_ACRONYM, MATCH_INFIX = 0, 1, 2, 3
+
+
+class NameIndex:
+    """Index tìm theo tên không dấu: prefix (tên / từ / viết tắt / acronym) + infix."""
+
+    def __init__(self, docs: List[dict]):
+        self.docs = docs
+        keys = []
+        self._compact = []
+        for i, d in enumerate(docs):
+            name = fold(d.get("name"))
+            words = re.findall(r"\w+", name)
+            keys.append((name, MATCH_PREFIX, i))
+            short = fold(d.get("shortName"))
+            if short:
+                keys.append((short, MATCH_PREFIX, i))
+                keys.append((short.replace(" ", ""), MATCH_PREFIX, i))
+            for w in range(1, len(words)):
+                keys.append((" ".join(words[w:]), MATCH_WORD, i))
+            abbr = acronym(d.get("name"))
+            if len(abbr) > 1:
+                keys.append((abbr, MATCH_ACRONYM, i))
+            self._compact.append(name.replace(" ", "") + " " + short.replace(" ", ""))
+        keys.sort()
+        self._keys = keys
+        self._words = [k[0] for k in keys]
+
+    def _prefix(self, q: str, best: Dict[int, int]):
+        pos = bisect_left(self._words, q)
+        while pos < len(self._words) and self._words[pos].startswith(q):
+            _, tier, i = self._keys[pos]
+            if tier < best.get(i, MATCH_INFIX + 1):
+                best[i] = tier
+            pos += 1
+
+    def search(self, query: str, limit: int, rank: Callable[[dict], int] = None) -> List[dict]:
+        """Tìm theo query, xếp theo (hạng khớp, rank(doc) giảm dần, tên)."""
+        q = fold(query)
+        if not q:
+            return self.docs[:limit]
+        compact = q.replace(" ", "")
+        best: Dict[int, int] = {}
+        self._prefix(q, best)
+        if compact != q:
+            self._prefix(compact, best)
+        if len(best) < limit:
+            for i, text in enumerate(self._compact):
+                if i not in best and compact in text:
+                    best[i] = MATCH_INFIX
+        rank = rank or (lambda d: 0)
+        ordered = sorted(best.items(), key=lambda item: (item[1], -rank(self.docs[item[0]]), item[0]))
+        return [self.docs[i] for i, _ in ordered[:limit]]
+
+
+class LookupCache:
+    """Snapshot schools/categories theo version counter."""
+
+    def __init__(self, version_ttl: float = LOOKUP_VERSION_TTL):
+        self.version_ttl = version_ttl
+        self._snapshots: Dict[str, dict] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self.stats = {"reads": 0, "reloads": 0, "versionChecks": 0, "notModified": 0, "searches": 0}
+
+    # ------------------------------------------------------------------
+    def _load(self, kind: str, version) -> dict:
+        docs = list(mongo_collections.db[kind].find({}, LOOKUP_KINDS[kind]))
+        docs.sort(key=lambda d: fold(d.get("name")))
+        by_id = {str(d["_id"]): d for d in docs}
+        by_name: Dict[str, dict] = {}
+        for d in docs:
+            for key in (fold(d.get("name")), fold(d.get("shortName"))):
+                if key:
+                    by_name.setdefault(key, d)
+        digest = hashlib.sha1(
+            "\n".join(f"{k}|{d.get('name')}|{d.get('shortName')}" for k, d in by_id.items()).encode("utf-8")
+        ).hexdigest()[:16]
+        self.stats["reloads"] += 1
+        return {
+            "version": version,
+            "docs": docs,
+            "by_id": by_id,
+            "by_name": by_name,
+            "index": NameIndex(docs),
+            "etag": f"{kind}-{digest}",
+            "loadedAt": time.time(),
+        }
+
+    def _current_version(self, kind: str):
+        self.stats["versionChecks"] += 1
+        row = mongo_collections.lookup_versions.find_one({"_id": kind}, {"version": 1})
+        return int(row.get("version") or 0) if row else 0
+
+    def _snapshot(self, kind: str) -> dict:
+        self.stats["reads"] += 1
+        snap = self._snapshots.get(kind)
+        now = time.time()
+        if snap is not None and now - self._checked_at.get(kind, 0) < self.version_ttl:
+            return snap
+        with self._lock:
+            snap = self._snapshots.get(kind)
+            if snap is not None and now - self._checked_at.get(kind, 0) < self.version_ttl:
+                return snap
+            try:
+                version = self._current_version(kind)
+                if snap is None or snap["version"] != version:
+                    snap = self._snapshots[kind] = self._load(kind, version)
+            except Exception as e:
+                if snap is None:
+                    raise
+                # Mongo lỗi tạm thời: dùng tiếp snapshot cũ
+                print(f"[LookupCache] Không kiểm tra được version '{kind}': {e}")
+            self._checked_at[kind] = now
+        self._ensure_watcher()
+        return snap
+
+    # ------------------------------------------------------------------
+    def all(self, kind: str) -> List[dict]:
+        """Toàn bộ bản ghi, sắp theo tên đã bỏ dấu. Không được sửa dict trả về."""
+        return self._snapshot(kind)["docs"]
+
+    def get(self, kind: str, entity_id) -> Optional[dict]:
+        return self._snapshot(kind)["by_id"].get(str(entity_id)) if entity_id else None
+
+    def get_many(self, kind: str, ids: Iterable) -> Dict[str, dict]:
+        by_id = self._snapshot(kind)["by_id"]
+        return {str(i): by_id[str(i)] for i in ids if i and str(i) in by_id}
+
+    def find_by_name(self, kind: str, name: str) -> Optional[dict]:
+        """Tìm theo tên / tên viết tắt, không phân biệt hoa thường và dấu."""
+        return self._snapshot(kind)["by_name"].get(fold(name))
+
+    def search(self, kind: str, query: str, limit: int, rank: Callable[[dict], int] = None) -> List[dict]:
+        """Tìm không dấu: prefix tên/từ/viết tắt, acronym, rồi infix; hoà hạng thì rank(doc) cao trước."""
+        self.stats["searches"] += 1
+        return self._snapshot(kind)["index"].search(query, limit, rank)
+
+    def etag(self, kind: str) -> str:
+        return self._snapshot(kind)["etag"]
+
+    def bump(self, kind: str):
+        """Gọi sau khi ghi vào schools/categories: tăng version để mọi process reload."""
+        mongo_collections.lookup_versions.update_one({"_id": kind}, {"$inc": {"version": 1}}, upsert=True)
+        self.invalidate(kind)
+
+    def invalidate(self, kind: str = None):
+        """Buộc đọc lại version (và reload nếu đổi) ở lần truy cập tiếp theo."""
+        for k in ([kind] if kind else list(LOOKUP_KINDS)):
+            self._checked_at[k] = 0.0
+            snap = self._snapshots.get(k)
+            if snap is not None:
+                snap["version"] = None
+
+    # ------------------------------------------------------------------
+    def _ensure_watcher(self):
+        if not LOOKUP_CHANGE_STREAM or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="lookup-cache-watch", daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(LOOKUP_KINDS)}}}]
+        while True:
+            try:
+                with mongo_collections.db.watch(pipeline) as stream:
+                    for change in stream:
+                        self.invalidate(change["ns"]["coll"])
+            except Exception as e:
+                # Standalone không hỗ trợ change stream -> vẫn còn version counter
+                print(f"[LookupCache] Change stream dừng: {e}")
+                time.sleep(60)
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        return {
+            **self.stats,
+            "versionTtlSec": self.version_ttl,
+            "changeStream": LOOKUP_CHANGE_STREAM,
+            "kinds": {
+                kind: {"count": len(snap["docs"]), "etag": snap["etag"], "ageSec": round(now - snap["loadedAt"], 1)}
+                for kind, snap in list(self._snapshots.items())
+            },
+        }
+
+
+def conditional_json(kind: str, build):
+    """
+    Trả JSON kèm ETag của snapshot; If-None-Match khớp -> 304 không build body.
+    build() chỉ được đọc từ lookup_cache để ETag phản ánh đúng nội dung.
+    """
+    tag = lookup_cache.etag(kind)
+    if request.if_none_match.contains(tag):
+        lookup_cache.stats["notModified"] += 1
+        resp = make_response("", 304)
+    else:
+        resp = jsonify(build())
+    resp.set_etag(tag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+# Global cache instance
+lookup_cache = LookupCache()
@@ -0,0 +1,171 @@
+# app/services/lookup_counts.py
+# -*- coding: utf-8 -*-
+"""
+Số tài liệu của mỗi trường / danh mục lưu thẳng trên schools.documentCount, categories.documentCount.
+- Tạo / xoá tài liệu: $inc nguyên tử trên school + category của tài liệu đó.
+- Tìm trường, trường phổ biến chỉ còn đọc theo _id hoặc sort theo index documentCount,
+  không aggregate trên documents.
+- all_counts(): toàn bộ số đếm của 1 loại giữ trong RAM LOOKUP_COUNTS_TTL giây (xếp hạng tìm trường).
+- Dữ liệu cũ chưa có documentCount: lần đọc đầu tiên trong process tự reconcile 1 lần (backfill).
+- reconcile(): đếm lại từ documents và sửa bản ghi bị lệch
+  (chạy định kỳ bằng scripts/reconcile_lookup_counts.py).
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.services.mongo_service import mongo_collections
+from app.utils.document_schema import ref_expr
+
+COUNT_FIELD = "documentCount"
+LOOKUP_COUNTS_TTL = float(os.getenv("LOOKUP_COUNTS_TTL", "60"))  # giây
+# Collection -> trường tham chiếu trên documents
+LOOKUP_REFS = {"schools": "schoolId", "categories": "categoryId"}
+
+
+def _as_oid(value) -> Optional[ObjectId]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except Exception:
+        return None
+
+
+def _ref(doc: dict, field: str) -> Optional[ObjectId]:
+    legacy = {"schoolId": "school_id", "categoryId": "category_id"}[field]
+    return _as_oid(doc.get(field) or doc.get(legacy))
+
+
+class LookupCountService:
+    """Duy trì documentCount trên schools/categories."""
+
+    def __init__(self):
+        self._all: Dict[str, tuple] = {}
+        self._backfilled: set = set()
+        self._backfill_lock = threading.Lock()
+
+    def _apply(self, doc: Optional[dict], delta: int):
+        if not doc:
+            return
+        for kind, field in LOOKUP_REFS.items():
+            oid = _ref(doc, field)
+            if oid:
+                try:
+                    mongo_collections.db[kind].update_one({"_id": oid}, {"$inc": {COUNT_FIELD: delta}})
+                except Exception as e:
+                    # Lệch sẽ được reconcile sửa lại
+                    print(f"[LookupCounts] Không cập nhật được {kind}.{COUNT_FIELD}: {e}")
+
+    def document_added(self, doc: dict):
+        self._apply(doc, 1)
+
+    def document_removed(self, doc: dict):
+        self._apply(doc, -1)
+
+    # ------------------------------------------------------------------
+    def ensure_backfilled(self, kind: str):
+        """
+        Lần đọc đầu tiên của process: còn bản ghi chưa có documentCount (tạo trước khi có
+        bộ đếm) thì reconcile 1 lần, để trang tìm trường / trường phổ biến không đọc ra 0.
+        Bản ghi mới luôn được tạo kèm documentCount = 0 nên lần sau chỉ tốn 1 find_one.
+        """
+        if kind in self._backfilled:
+            return
+        with self._backfill_lock:
+            if kind in self._backfilled:
+                return
+            try:
+                if mongo_collections.db[kind].find_one({COUNT_FIELD: {"$exists": False}}, {"_id": 1}):
+                    result = self.reconcile(kind)
+                    print(f"[LookupCounts] Backfill {kind}.{COUNT_FIELD}: {result}")
+                    self._all.pop(kind, None)
+                self._backfilled.add(kind)
+            except Exception as e:
+                # Thử lại ở lần đọc sau
+                print(f"[LookupCounts] Không backfill được {kind}.{COUNT_FIELD}: {e}")
+
+    def counts(self, kind: str, ids: Iterable) -> Dict[str, int]:
+        """{str(_id): số tài liệu} cho danh sách id (1 query theo _id)."""
+        oids = [oid for oid in (_as_oid(i) for i in ids) if oid]
+        if not oids:
+            return {}
+        self.ensure_backfilled(kind)
+        return {
+            str(d["_id"]): max(0, int(d.get(COUNT_FIELD) or 0))
+            for d in mongo_collections.db[kind].find({"_id": {"$in": oids}}, {COUNT_FIELD: 1})
+        }
+
+    def count(self, kind: str, entity_id) -> int:
+        oid = _as_oid(entity_id)
+        return self.counts(kind, [oid]).get(str(oid), 0) if oid else 0
+
+    def all_counts(self, kind: str) -> Dict[str, int]:
+        """{str(_id): số tài liệu} của mọi bản ghi, cache LOOKUP_COUNTS_TTL giây (chỉ dùng để xếp hạng)."""
+        cached = self._all.get(kind)
+        if cached and time.time() - cached[1] < LOOKUP_COUNTS_TTL:
+            return cached[0]
+        self.ensure_backfilled(kind)
+        counts = {
+            str(d["_id"]): max(0, int(d.get(COUNT_FIELD) or 0))
+            for d in mongo_collections.db[kind].find({COUNT_FIELD: {"$gt": 0}}, {COUNT_FIELD: 1})
+        }
+        self._all[kind] = (counts, time.time())
+        return counts
+
+    def top(self, kind: str, limit: int, projection: dict = None) -> List[dict]:
+        """Bản ghi có nhiều tài liệu nhất (sort theo index documentCount)."""
+        self.ensure_backfilled(kind)
+        return list(
+            mongo_collections.db[kind]
+            .find({COUNT_FIELD: {"$gt": 0}}, projection)
+            .sort(COUNT_FIELD, -1)
+            .limit(limit)
+        )
+
+    # ------------------------------------------------------------------
+    def count_from_source(self, kind: str) -> Dict[ObjectId, int]:
+        """Đếm lại từ documents (gộp id dạng string và ObjectId)."""
+        totals: Dict[ObjectId, int] = {}
+        for row in mongo_collections.documents.aggregate([
+            {"$project": {"ref": ref_expr(LOOKUP_REFS[kind])}},
+            {"$match": {"ref": {"$ne": None}}},
+            {"$group": {"_id": "$ref", "n": {"$sum": 1}}},
+        ]):
+            oid = _as_oid(row["_id"])
+            if oid:
+                totals[oid] = totals.get(oid, 0) + int(row["n"])
+        return totals
+
+    def reconcile(self, kind: str, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Sửa documentCount bị lệch. Đọc giá trị hiện tại TRƯỚC khi đếm và chỉ ghi nếu giá trị
+        chưa đổi -> tài liệu tạo/xoá trong lúc chạy không bị ghi đè (để lần sau sửa).
+        """
+        current = {
+            d["_id"]: d.get(COUNT_FIELD)
+            for d in mongo_collections.db[kind].find({}, {COUNT_FIELD: 1})
+        }
+        totals = self.count_from_source(kind)
+        ops = [
+            UpdateOne({"_id": oid, COUNT_FIELD: old}, {"$set": {COUNT_FIELD: totals.get(oid, 0)}})
+            for oid, old in current.items()
+            if old != totals.get(oid, 0)
+        ]
+        fixed = 0
+        if ops and not dry_run:
+            for i in range(0, len(ops), 1000):
+                fixed += mongo_collections.db[kind].bulk_write(ops[i:i + 1000], ordered=False).modified_count
+        orphans = sum(n for oid, n in totals.items() if oid not in current)
+        return {"checked": len(current), "mismatched": len(ops), "fixed": fixed, "orphanDocuments": orphans}
+
+
+# Global counter instance
+lookup_counts = LookupCountService()
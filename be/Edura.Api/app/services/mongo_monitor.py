@@ -0,0 +1,183 @@
+# app/services/mongo_monitor.py
+# -*- coding: utf-8 -*-
+"""
+Đo độ trễ lệnh MongoDB phía client (pymongo.monitoring.CommandListener).
+- Histogram độ trễ theo (collection, lệnh) với bucket cố định, ước lượng p50/p95/p99 từ bucket.
+- Lệnh chậm hơn MONGO_SLOW_MS: in log "[MongoSlow]" + giữ MONGO_SLOW_KEEP lệnh gần nhất
+  (chỉ giữ tên trường/toán tử của filter/pipeline, giá trị thay bằng "?";
+  không kèm document được ghi).
+- Xem qua GET /api/admin/cache-stats -> "mongo".
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+
+from pymongo import monitoring
+
+MONGO_SLOW_MS = float(os.getenv("MONGO_SLOW_MS", "200"))
+MONGO_SLOW_KEEP = int(os.getenv("MONGO_SLOW_KEEP", "50"))
+# Cận trên (ms) của các bucket histogram; bucket cuối = +inf
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+# Lệnh nội bộ của driver (handshake, heartbeat, session) không tính vào thống kê
+_IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart",
+                     "saslContinue", "authenticate", "buildInfo", "getnonce"}
+# Trường của lệnh được giữ lại khi log lệnh chậm (giá trị bị che bằng _redact)
+_SLOW_FIELDS = ("filter", "pipeline", "query")
+# Trường không chứa dữ liệu người dùng: giữ nguyên giá trị
+_PLAIN_FIELDS = ("sort", "limit", "skip")
+# Lệnh ghi: chỉ giữ điều kiện q, không giữ nội dung ghi
+_WRITE_FIELDS = ("updates", "deletes")
+
+
+def _redact(value):
+    """Giữ hình dạng filter/pipeline (tên trường, toán tử), thay mọi giá trị bằng "?"."""
+    if isinstance(value, dict):
+        return {k: _redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) and any(isinstance(v, (dict, list, tuple)) for v in value):
+        return [_redact(v) for v in value]
+    return "?"
+
+
+def _shorten(value, limit: int = 300) -> str:
+    text = str(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "sum_ms", "max_ms", "failures", "slow")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.failures = 0
+        self.slow = 0
+
+    def add(self, ms: float):
+        i = 0
+        while i < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float):
+        """Cận trên của bucket chứa percentile p (bucket +inf -> dùng max)."""
+        if not self.total:
+            return 0.0
+        target = self.total * p
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def to_dict(self) -> dict:
+        labels = [f"le{b}ms" for b in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.total,
+            "failures": self.failures,
+            "slow": self.slow,
+            "avgMs": round(self.sum_ms / self.total, 2) if self.total else 0.0,
+            "maxMs": round(self.max_ms, 1),
+            "p50Ms": self.percentile(0.50),
+            "p95Ms": self.percentile(0.95),
+            "p99Ms": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MongoCommandMonitor(monitoring.CommandListener):
+    """CommandListener gom độ trễ theo collection và đánh dấu lệnh chậm."""
+
+    def __init__(self, slow_ms: float = MONGO_SLOW_MS):
+        self.slow_ms = slow_ms
+        self._inflight: Dict[Tuple, Tuple[str, str, dict]] = {}
+        self._hist: Dict[Tuple[str, str], _Histogram] = {}
+        self._slow = deque(maxlen=MONGO_SLOW_KEEP)
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return (event.request_id, event.connection_id)
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        # getMore: giá trị lệnh là cursor id, tên collection nằm ở trường "collection"
+        collection = target if isinstance(target, str) else event.command.get("collection", "-")
+        # Che giá trị ngay từ đầu: log/recentSlow không giữ email, mã reset, ...
+        summary = {k: _redact(event.command[k]) for k in _SLOW_FIELDS if k in event.command}
+        summary.update({k: event.command[k] for k in _PLAIN_FIELDS if k in event.command})
+        for k in _WRITE_FIELDS:
+            if k in event.command:
+                summary[k] = [{"q": _redact(op.get("q"))} for op in event.command[k][:3]]
+        with self._lock:
+            self._inflight[self._key(event)] = (f"{event.database_name}.{collection}", event.command_name, summary)
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            info = self._inflight.pop(self._key(event), None)
+        if info is None:
+            return
+        namespace, command, summary = info
+        ms = event.duration_micros / 1000.0
+        is_slow = ms >= self.slow_ms
+        with self._lock:
+            hist = self._hist.get((namespace, command))
+            if hist is None:
+                hist = self._hist[(namespace, command)] = _Histogram()
+            hist.add(ms)
+            if failed:
+                hist.failures += 1
+            if is_slow:
+                hist.slow += 1
+                self._slow.append({
+                    "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "ns": namespace,
+                    "command": command,
+                    "ms": round(ms, 1),
+                    "failed": failed,
+                    "detail": _shorten(summary),
+                })
+        if is_slow:
+            print(f"[MongoSlow] {command} {namespace} {ms:.0f}ms {_shorten(summary, 200)}")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            by_collection: Dict[str, dict] = {}
+            for (namespace, command), hist in sorted(self._hist.items()):
+                by_collection.setdefault(namespace, {})[command] = hist.to_dict()
+            slow = list(self._slow)
+            inflight = len(self._inflight)
+        return {
+            "slowThresholdMs": self.slow_ms,
+            "sinceSec": round(time.time() - self._started_at, 0),
+            "inflight": inflight,
+            "collections": by_collection,
+            "recentSlow": slow[::-1],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._hist.clear()
+            self._slow.clear()
+            self._started_at = time.time()
+
+
+# Global monitor instance
+mongo_monitor = MongoCommandMonitor()
@@ -1,6 +1,7 @@
 # app/services/mongo_service.py
-from pymongo import MongoClient, TEXT
+from pymongo import MongoClient, TEXT, ReadPreference
 from dotenv import load_dotenv
+import importlib.util
 import os
 
 load_dotenv()
@@ -11,11 +12,82 @@ DATABASE_NAME = os.getenv("DATABASE_NAME", "DACN")
 if not MONGO_URI:
     raise ValueError("MONGO_CONNECTION_STRING chưa được cấu hình trong .env")
 
+# Pool: SocketIO chạy async_mode="threading" -> mỗi request/kết nối socket là 1 thread
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+# Thread chờ connection quá lâu -> lỗi ngay thay vì treo request
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+# 0 = không giới hạn (mặc định của driver); đặt > 0 để chặn query treo
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+MONGO_RETRY_WRITES = os.getenv("MONGO_RETRY_WRITES", "true").lower() == "true"
+# Nén wire protocol theo thứ tự ưu tiên; bỏ qua thuật toán thiếu thư viện (zstandard / python-snappy)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+# Read preference cho đọc danh sách / thống kê (chấp nhận trễ replication)
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+MONGO_ANALYTICS_MAX_STALENESS_S = int(os.getenv("MONGO_ANALYTICS_MAX_STALENESS_S", "-1"))
+MONGO_MONITORING = os.getenv("MONGO_MONITORING", "true").lower() == "true"
+
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+
+def _available_compressors() -> list:
+    out = []
+    for name in (c.strip() for c in MONGO_COMPRESSORS.split(",")):
+        if name not in _COMPRESSOR_MODULES:
+            continue
+        module = _COMPRESSOR_MODULES[name]
+        if module is None or importlib.util.find_spec(module) is not None:
+            out.append(name)
+    return out
+
+
+def _client_options() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "retryWrites": MONGO_RETRY_WRITES,
+        "retryReads": True,
+    }
+    if MONGO_SOCKET_TIMEOUT_MS > 0:
+        options["socketTimeoutMS"] = MONGO_SOCKET_TIMEOUT_MS
+    compressors = _available_compressors()
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    if MONGO_MONITORING:
+        from app.services.mongo_monitor import mongo_monitor
+        options["event_listeners"] = [mongo_monitor]
+    return options
+
+
+def _analytics_read_preference():
+    mode = {
+        "primary": ReadPreference.PRIMARY,
+        "primarypreferred": ReadPreference.PRIMARY_PREFERRED,
+        "secondary": ReadPreference.SECONDARY,
+        "secondarypreferred": ReadPreference.SECONDARY_PREFERRED,
+        "nearest": ReadPreference.NEAREST,
+    }.get(MONGO_ANALYTICS_READ_PREFERENCE.lower(), ReadPreference.SECONDARY_PREFERRED)
+    if MONGO_ANALYTICS_MAX_STALENESS_S > 0 and mode is not ReadPreference.PRIMARY:
+        # maxStalenessSeconds: tối thiểu 90s theo đặc tả driver
+        mode = type(mode)(max_staleness=max(90, MONGO_ANALYTICS_MAX_STALENESS_S))
+    return mode
+
+
 class Collections:
     def __init__(self):
             print("Đang kết nối MongoDB...")
-            self.client = MongoClient(MONGO_URI)
+            self.client_options = _client_options()
+            self.client = MongoClient(MONGO_URI, **self.client_options)
             self.db = self.client[DATABASE_NAME]
+            # Đọc danh sách / thống kê: ưu tiên secondary (primary nếu là standalone)
+            self.analytics_read_preference = _analytics_read_preference()
 
             # Collections
             self.users = self.db["users"]
@@ -33,10 +105,31 @@ class Collections:
             self.document_comments = self.db["document_comments"]
             self.password_reset_codes = self.db["password_reset_codes"]
             self.payment_transactions = self.db["payment_transactions"]
+            self.ai_response_cache = self.db["ai_response_cache"]
+            self.multipart_uploads = self.db["multipart_uploads"]
+            # Checkpoint theo khoảng _id của các job chạy lô (scripts/reenrich.py)
+            self.job_checkpoints = self.db["job_checkpoints"]
+            # Lượt xem theo (tài liệu, ngày) cho featured/trending theo tuần
+            self.document_view_buckets = self.db["document_view_buckets"]
+            # Version counter của schools/categories (_id = tên collection) cho lookup_cache
+            self.lookup_versions = self.db["lookup_versions"]
 
             self._ensure_indexes()
             print("Kết nối MongoDB thành công và Index đã được kiểm tra.")
 
+    def for_analytics(self, collection):
+        """
+        Collection đọc với read preference dành cho danh sách / thống kê (mặc định secondaryPreferred).
+        Không dùng cho đọc-sau-ghi của chính user (có thể trễ replication).
+        """
+        return collection.with_options(read_preference=self.analytics_read_preference)
+
+    def get_pool_config(self) -> dict:
+        options = {k: v for k, v in self.client_options.items() if k != "event_listeners"}
+        options["analyticsReadPreference"] = self.analytics_read_preference.name
+        options["monitoring"] = MONGO_MONITORING
+        return options
+
     def _has_index_by_fields(self, collection, fields):
         """Kiểm tra xem collection đã có index với fields này chưa (không quan tâm tên)"""
         try:
@@ -172,6 +265,55 @@ class Collections:
                 self.payment_transactions.create_index([("userId", 1), ("createdAt", -1)], name="ix_payment_transactions_user")
             if "ix_payment_transactions_status" not in self.payment_transactions.index_information():
                 self.payment_transactions.create_index([("status", 1), ("createdAt", -1)], name="ix_payment_transactions_status")
+
+            # TTL index cho cache response AI (tự xoá sau AI_CACHE_TTL_DAYS ngày)
+            if "ix_ai_response_cache_ttl" not in self.ai_response_cache.index_information():
+                from app.utils.ai_response_cache import AI_CACHE_TTL_DAYS
+                self.ai_response_cache.create_index(
+                    [("createdAt", 1)],
+                    expireAfterSeconds=AI_CACHE_TTL_DAYS * 86400,
+                    name="ix_ai_response_cache_ttl"
+                )
+
+            # Multipart upload đang dở: tự xoá bản ghi sau 2 ngày (S3 lifecycle dọn part rác)
+            if "ix_multipart_uploads_ttl" not in self.multipart_uploads.index_information():
+                self.multipart_uploads.create_index([("createdAt", 1)], expireAfterSeconds=2 * 86400, name="ix_multipart_uploads_ttl")
+            # /register tra chủ sở hữu + trạng thái upload theo key
+            if "ix_multipart_uploads_key" not in self.multipart_uploads.index_information():
+                self.multipart_uploads.create_index([("key", 1)], name="ix_multipart_uploads_key")
+            # /register từ chối key đã thuộc về 1 tài liệu
+            if not self._has_index_by_fields(self.documents, ["s3_url"]):
+                self.documents.create_index([("s3_url", 1)], name="ix_documents_s3_url")
+
+            # Index cho query schema chuẩn (app/utils/document_schema.py): 1 field, không $or
+            if not self._has_index_by_fields(self.documents, ["categoryId", "views"]):
+                self.documents.create_index([("categoryId", 1), ("views", -1), ("createdAt", -1)], name="ix_documents_category_views")
+            if not self._has_index_by_fields(self.documents, ["userId", "createdAt"]):
+                self.documents.create_index([("userId", 1), ("createdAt", -1)], name="ix_documents_user_created")
+
+            # document_view_buckets: upsert theo (documentId, day), roll theo day, tự xoá sau 35 ngày
+            if "ix_view_buckets_doc_day" not in self.document_view_buckets.index_information():
+                self.document_view_buckets.create_index([("documentId", 1), ("day", 1)], unique=True, name="ix_view_buckets_doc_day")
+            if "ix_view_buckets_day_ttl" not in self.document_view_buckets.index_information():
+                self.document_view_buckets.create_index([("day", 1)], expireAfterSeconds=35 * 86400, name="ix_view_buckets_day_ttl")
+            if "ix_view_buckets_rolled" not in self.document_view_buckets.index_information():
+                self.document_view_buckets.create_index([("rolled", 1)], sparse=True, name="ix_view_buckets_rolled")
+
+            # Bảng xếp hạng lượt xem theo tuần (toàn bộ + theo category)
+            if not self._has_index_by_fields(self.documents, ["viewsWeek", "views"]):
+                self.documents.create_index([("viewsWeek", -1), ("views", -1)], name="ix_documents_views_week")
+            if not self._has_index_by_fields(self.documents, ["categoryId", "viewsWeek"]):
+                self.documents.create_index([("categoryId", 1), ("viewsWeek", -1), ("views", -1)], name="ix_documents_category_views_week")
+
+            # Trường / danh mục có nhiều tài liệu nhất (documentCount duy trì bởi lookup_counts)
+            if "ix_schools_doc_count" not in self.schools.index_information():
+                self.schools.create_index([("documentCount", -1)], name="ix_schools_doc_count")
+            if "ix_categories_doc_count" not in self.categories.index_information():
+                self.categories.create_index([("documentCount", -1)], name="ix_categories_doc_count")
+
+            # job_checkpoints: đọc toàn bộ range của 1 job khi resume
+            if "ix_job_checkpoints_job_range" not in self.job_checkpoints.index_information():
+                self.job_checkpoints.create_index([("job", 1), ("range", 1)], unique=True, name="ix_job_checkpoints_job_range")
         except Exception as e:
             print(f"Lỗi khi kiểm tra/tạo index MongoDB: {e}")
 
@@ -0,0 +1,310 @@
+# app/services/office_converter.py
+# -*- coding: utf-8 -*-
+"""
+Pool LibreOffice "ấm" để convert .doc/.docx -> PDF.
+- Mỗi worker là 1 tiến trình LibreOffice headless chạy lâu dài (qua unoserver),
+  có profile riêng -> không tranh khoá profile, không tốn thời gian khởi động mỗi file.
+- Request chờ worker rảnh trong hàng đợi (có timeout), mỗi lần convert có timeout cứng;
+  quá thời gian thì kill + khởi động lại worker đó.
+- Không có unoserver: mỗi worker chạy `soffice --convert-to` với profile riêng + timeout
+  (vẫn có cold start nhưng chạy song song và không treo vô hạn).
+- Profile gắn pid và port do hệ điều hành cấp: web app và scripts/reenrich.py chạy cùng máy
+  không dùng chung profile hay nhận nhầm listener của nhau.
+- unoserver (pip install unoserver, cần python có module `uno` của LibreOffice, vd python3-uno):
+  có unoserver thì mặc định khởi động sẵn pool khi app start (OFFICE_POOL_WARM=false để tắt).
+"""
+
+import atexit
+import os
+import platform
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+OFFICE_POOL_SIZE = int(os.getenv("OFFICE_POOL_SIZE", "2"))
+OFFICE_CONVERT_TIMEOUT = int(os.getenv("OFFICE_CONVERT_TIMEOUT", "90"))  # giây / file
+OFFICE_QUEUE_TIMEOUT = int(os.getenv("OFFICE_QUEUE_TIMEOUT", "120"))  # giây chờ worker rảnh
+OFFICE_START_TIMEOUT = int(os.getenv("OFFICE_START_TIMEOUT", "45"))  # giây chờ listener sẵn sàng
+# Khởi động sẵn các worker khi app start (thay vì ở lần convert đầu tiên);
+# không đặt -> bật khi có unoserver
+OFFICE_POOL_WARM = os.getenv("OFFICE_POOL_WARM", "").lower()
+OFFICE_PROFILE_ROOT = os.getenv("OFFICE_PROFILE_ROOT") or os.path.join(tempfile.gettempdir(), "edura_lo_profiles")
+
+
+def _find_soffice() -> Optional[str]:
+    soffice = os.getenv("SOFFICE_BIN") or shutil.which("soffice")
+    if not soffice and platform.system() == "Windows":
+        for c in [r"C:\Program Files\LibreOffice\program\soffice.exe",
+                  r"C:\Program Files (x86)\LibreOffice\program\soffice.exe"]:
+            if os.path.isfile(c):
+                soffice = c
+                break
+    return soffice
+
+
+def _find_unoserver():
+    unoserver = os.getenv("UNOSERVER_BIN") or shutil.which("unoserver")
+    unoconvert = os.getenv("UNOCONVERT_BIN") or shutil.which("unoconvert")
+    return unoserver, unoconvert
+
+
+def should_warm() -> bool:
+    """OFFICE_POOL_WARM=true/false nếu có đặt; mặc định khởi động sẵn khi có unoserver + soffice."""
+    if OFFICE_POOL_WARM:
+        return OFFICE_POOL_WARM == "true"
+    unoserver, unoconvert = _find_unoserver()
+    return bool(unoserver and unoconvert and _find_soffice())
+
+
+def _free_port(exclude=()) -> int:
+    """Port TCP còn trống do hệ điều hành cấp (không trùng với port của process khác)."""
+    for _ in range(20):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        if port not in exclude:
+            return port
+    raise RuntimeError("Không tìm được port trống")
+
+
+def _port_open(port: int) -> bool:
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def _kill_group(proc: subprocess.Popen):
+    """Kill tiến trình và mọi tiến trình con cùng nhóm (vd soffice.bin do launcher soffice sinh ra)."""
+    try:
+        if os.name == "posix":
+            os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+        else:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+    except Exception:
+        proc.kill()
+
+
+def _run_with_timeout(cmd: list, timeout: int):
+    """
+    Như subprocess.run(check=True, timeout=...) nhưng chạy trong nhóm tiến trình riêng:
+    quá timeout thì kill cả nhóm, không để soffice.bin mồ côi giữ khoá profile của worker.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            start_new_session=(os.name == "posix"))
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_group(proc)
+        proc.communicate()
+        raise
+    except BaseException:
+        _kill_group(proc)
+        proc.wait()
+        raise
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+
+
+class OfficeWorker:
+    """1 listener LibreOffice (unoserver) với profile + port riêng."""
+
+    def __init__(self, index: int, soffice: str, unoserver: Optional[str], unoconvert: Optional[str]):
+        self.index = index
+        self.soffice = soffice
+        self.unoserver = unoserver
+        self.unoconvert = unoconvert
+        self.port: Optional[int] = None      # port XML-RPC của unoserver
+        self.uno_port: Optional[int] = None  # port UNO của LibreOffice
+        # Profile theo pid: các process khác nhau (web app, reenrich) không dùng chung khoá profile
+        self.profile_dir = os.path.join(OFFICE_PROFILE_ROOT, f"worker_{os.getpid()}_{index}")
+        self.profile_url = "file:///" + self.profile_dir.replace("\\", "/").lstrip("/")
+        self.proc: Optional[subprocess.Popen] = None
+        self.conversions = 0
+        self.restarts = 0
+
+    @property
+    def warm(self) -> bool:
+        return bool(self.unoserver and self.unoconvert)
+
+    def ensure_started(self):
+        if not self.warm:
+            return
+        if self.proc is not None and self.proc.poll() is None:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        # Chọn port mới mỗi lần khởi động và chắc chắn chưa có ai nghe trên đó,
+        # để kiểm tra sẵn sàng bên dưới không nhận nhầm listener của process khác
+        self.port = _free_port()
+        self.uno_port = _free_port(exclude=(self.port,))
+        if _port_open(self.port) or _port_open(self.uno_port):
+            raise RuntimeError(f"port {self.port}/{self.uno_port} của worker {self.index} đang bị dùng")
+        self.proc = subprocess.Popen(
+            [self.unoserver, "--interface", "127.0.0.1",
+             "--port", str(self.port), "--uno-port", str(self.uno_port),
+             "--executable", self.soffice, "--user-installation", self.profile_url],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            # Nhóm tiến trình riêng để kill được cả soffice con khi restart
+            start_new_session=(os.name == "posix"),
+        )
+        deadline = time.time() + OFFICE_START_TIMEOUT
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"unoserver worker {self.index} thoát với mã {self.proc.returncode}")
+            if _port_open(self.port):
+                print(f"[OfficePool] Worker {self.index} sẵn sàng (port {self.port})")
+                return
+            time.sleep(0.3)
+        self.stop()
+        raise RuntimeError(f"unoserver worker {self.index} không sẵn sàng sau {OFFICE_START_TIMEOUT}s")
+
+    def stop(self):
+        if self.proc is None:
+            return
+        try:
+            _kill_group(self.proc)
+            self.proc.wait(timeout=10)
+        except Exception:
+            pass
+        self.proc = None
+
+    def restart(self):
+        self.restarts += 1
+        self.stop()
+
+    def convert(self, src_path: str, out_path: str, timeout: int):
+        """Convert src -> out (PDF). Ném subprocess.TimeoutExpired/CalledProcessError khi lỗi."""
+        started = False
+        if self.warm:
+            try:
+                self.ensure_started()
+                started = True
+            except RuntimeError as e:
+                # unoserver không chạy được (vd thiếu module uno): dùng soffice 1 lần cho file này
+                print(f"[OfficePool] {e}, chuyển sang soffice")
+        if started:
+            cmd = [self.unoconvert, "--host", "127.0.0.1", "--port", str(self.port),
+                   "--convert-to", "pdf", src_path, out_path]
+        else:
+            # Không có unoserver: chạy soffice 1 lần nhưng với profile riêng của worker
+            os.makedirs(self.profile_dir, exist_ok=True)
+            cmd = [self.soffice, f"-env:UserInstallation={self.profile_url}",
+                   "--headless", "--norestore", "--convert-to", "pdf",
+                   "--outdir", os.path.dirname(out_path), src_path]
+        _run_with_timeout(cmd, timeout)
+        self.conversions += 1
+
+
+class OfficeConverterPool:
+    """Hàng đợi worker LibreOffice dùng chung cho cả process."""
+
+    def __init__(self, size: int = OFFICE_POOL_SIZE):
+        self.size = max(1, size)
+        self._idle: "queue.Queue[OfficeWorker]" = queue.Queue()
+        self._workers = []
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._waiting = 0
+        self.stats = {"conversions": 0, "failures": 0, "timeouts": 0, "queue_timeouts": 0,
+                      "total_ms": 0.0, "max_wait_ms": 0.0}
+
+    def _init(self) -> bool:
+        if self._initialized:
+            return bool(self._workers)
+        with self._init_lock:
+            if self._initialized:
+                return bool(self._workers)
+            soffice = _find_soffice()
+            if soffice:
+                unoserver, unoconvert = _find_unoserver()
+                for i in range(self.size):
+                    worker = OfficeWorker(i, soffice, unoserver, unoconvert)
+                    self._workers.append(worker)
+                    self._idle.put(worker)
+                mode = "unoserver" if unoserver and unoconvert else "soffice (không có unoserver)"
+                print(f"[OfficePool] {self.size} worker, chế độ {mode}")
+            else:
+                print("[OfficePool] Không tìm thấy LibreOffice (soffice)")
+            self._initialized = True
+            return bool(self._workers)
+
+    @property
+    def available(self) -> bool:
+        return self._init()
+
+    def warm_up(self):
+        """Khởi động trước tất cả listener (chạy nền khi app start)."""
+        if not self._init():
+            return
+        for worker in self._workers:
+            try:
+                worker.ensure_started()
+            except Exception as e:
+                print(f"[OfficePool] Không khởi động được worker {worker.index}: {e}")
+
+    def convert_to_pdf(self, src_path: str, out_path: str, timeout: int = None) -> bool:
+        """Convert file Word sang PDF tại out_path; trả False nếu lỗi/quá thời gian."""
+        if not self._init():
+            return False
+        timeout = timeout or OFFICE_CONVERT_TIMEOUT
+        started = time.time()
+        self._waiting += 1
+        try:
+            worker = self._idle.get(timeout=OFFICE_QUEUE_TIMEOUT)
+        except queue.Empty:
+            self.stats["queue_timeouts"] += 1
+            print(f"[OfficePool] Hết thời gian chờ worker rảnh ({OFFICE_QUEUE_TIMEOUT}s)")
+            return False
+        finally:
+            self._waiting -= 1
+        wait_ms = (time.time() - started) * 1000
+        self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], round(wait_ms, 1))
+        try:
+            worker.convert(src_path, out_path, timeout)
+            self.stats["conversions"] += 1
+            self.stats["total_ms"] += (time.time() - started) * 1000
+            return os.path.exists(out_path)
+        except subprocess.TimeoutExpired:
+            self.stats["timeouts"] += 1
+            print(f"[OfficePool] Worker {worker.index} quá {timeout}s, khởi động lại")
+            worker.restart()
+            return False
+        except Exception as e:
+            self.stats["failures"] += 1
+            print(f"[OfficePool] Lỗi convert trên worker {worker.index}: {e}")
+            # Listener có thể đã chết giữa chừng -> lần sau khởi động lại
+            if worker.proc is not None and worker.proc.poll() is not None:
+                worker.restart()
+            return False
+        finally:
+            self._idle.put(worker)
+
+    def get_stats(self) -> Dict:
+        done = self.stats["conversions"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "total_ms"},
+            "avgMs": round(self.stats["total_ms"] / done, 1) if done else 0.0,
+            "workers": len(self._workers),
+            "idle": self._idle.qsize(),
+            "waiting": self._waiting,
+            "warm": any(w.warm for w in self._workers),
+            "restarts": sum(w.restarts for w in self._workers),
+        }
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.stop()
+            shutil.rmtree(worker.profile_dir, ignore_errors=True)
+
+
+# Global pool instance
+office_converter = OfficeConverterPool()
+atexit.register(office_converter.shutdown)
@@ -12,8 +12,10 @@ from bson import ObjectId
 from datetime import datetime, timedelta, date
 
 from app.services.mongo_service import mongo_collections
+from app.services.lookup_cache import lookup_cache
 from app.utils.search_utils import calculate_relevance_score
 from app.utils.search_cache import search_cache
+from app.utils.document_schema import by_category, by_school, created_filter, created_sort
 
 logger = logging.getLogger(__name__)
 
@@ -91,35 +93,18 @@ class SearchService:
     def build_mongo_query(params: Dict) -> Dict:
         """
         Build MongoDB query từ search parameters.
-        Hỗ trợ cả ObjectId và string (tương thích dữ liệu cũ).
+        Predicate theo app/utils/document_schema.py (1 field khi đã migrate schema chuẩn).
         
         Returns:
             MongoDB query dict
         """
         ands = []
         
-        # Helper function để hỗ trợ cả ObjectId và string
-        def _or_id(field1: str, field2: str, val: str):
-            """Tạo query hỗ trợ cả ObjectId và string cho field1 và field2."""
-            ors = []
-            try:
-                obj_id = ObjectId(val)
-                ors.append({field1: obj_id})
-                ors.append({field2: obj_id})
-            except Exception:
-                pass
-            # Thêm cả string match
-            ors.append({field1: val})
-            ors.append({field2: val})
-            return {"$or": ors}
-        
-        # School filter - hỗ trợ cả schoolId và school_id
+        # School / category filter (ObjectId hoặc string; $or field cũ chỉ khi chưa migrate schema)
         if params["schoolId"]:
-            ands.append(_or_id("schoolId", "school_id", params["schoolId"]))
-        
-        # Category filter - hỗ trợ cả categoryId và category_id
+            ands.append(by_school(params["schoolId"]))
         if params["categoryId"]:
-            ands.append(_or_id("categoryId", "category_id", params["categoryId"]))
+            ands.append(by_category(params["categoryId"]))
         
         # File type filter
         if params["fileType"]:
@@ -148,10 +133,7 @@ class SearchService:
         if params["uploadDate"]:
             date_filter = SearchService._parse_upload_date(params["uploadDate"])
             if date_filter:
-                ands.append({"$or": [
-                    {"createdAt": date_filter},
-                    {"created_at": date_filter}
-                ]})
+                ands.append(created_filter(date_filter))
         
         # Build final query
         # Lưu ý: Nếu không có filters, trả về {} để query tất cả documents
@@ -227,21 +209,16 @@ class SearchService:
             List of documents
         """
         try:
-            cursor = mongo_collections.documents.find(mongo_query).sort("createdAt", -1)
+            cursor = mongo_collections.for_analytics(mongo_collections.documents).find(mongo_query).sort(created_sort())
             if limit:
                 cursor = cursor.limit(limit)
             return list(cursor)
         except Exception:
-            try:
-                cursor = mongo_collections.documents.find(mongo_query).sort("created_at", -1)
-                if limit:
-                    cursor = cursor.limit(limit)
-                return list(cursor)
-            except Exception:
-                cursor = mongo_collections.documents.find(mongo_query)
-                if limit:
-                    cursor = cursor.limit(limit)
-                return list(cursor)
+            # Sort trong RAM vượt giới hạn (dữ liệu cũ chưa migrate) -> bỏ sort
+            cursor = mongo_collections.for_analytics(mongo_collections.documents).find(mongo_query)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
     
     @staticmethod
     def load_categories(category_ids: List[ObjectId]) -> Dict[str, str]:
@@ -259,11 +236,8 @@ class SearchService:
         
         category_map = {}
         try:
-            for c in mongo_collections.categories.find(
-                {"_id": {"$in": category_ids}},
-                {"name": 1}
-            ):
-                category_map[str(c["_id"])] = c.get("name", "")
+            for key, c in lookup_cache.get_many("categories", category_ids).items():
+                category_map[key] = c.get("name", "")
         except Exception:
             pass
         
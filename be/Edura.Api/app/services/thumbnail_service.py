@@ -0,0 +1,243 @@
+# app/services/thumbnail_service.py
+# -*- coding: utf-8 -*-
+"""
+Sinh thumbnail nhiều kích thước (small/medium/large) cho tài liệu.
+- Render trang 1 (và tuỳ chọn N trang đầu) 1 lần ở độ phân giải lớn nhất,
+  sau đó thu nhỏ dần cho các size còn lại.
+- Encode WebP (mặc định) hoặc JPEG, lưu S3 theo key cố định:
+  thumbs/<docId>/p<page>_<size>.<ext>  -> sinh lại sẽ ghi đè, không rác.
+- Danh sách trả về URL theo size để mobile chỉ tải ảnh vừa với card.
+- Placeholder sinh vì lỗi tạm (S3/render) được đánh dấu retryAt -> route lazy thử sinh lại sau.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Dict, Optional
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw, ImageFont
+
+from app.services.aws_service import aws_service
+
+# Chiều rộng (px) của từng size
+THUMB_SIZES = {
+    "small": int(os.getenv("THUMB_SMALL_WIDTH", "160")),
+    "medium": int(os.getenv("THUMB_MEDIUM_WIDTH", "480")),
+    "large": int(os.getenv("THUMB_LARGE_WIDTH", "960")),
+}
+THUMB_FORMAT = os.getenv("THUMB_FORMAT", "webp").lower()  # webp | jpeg
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "78"))
+# Số trang đầu sinh preview (1 = chỉ trang bìa)
+THUMB_PAGES = int(os.getenv("THUMB_PAGES", "1"))
+THUMB_PREFIX = os.getenv("THUMB_PREFIX", "thumbs")
+# Placeholder do lỗi tạm: sau bao lâu (giây) thì route lazy thử sinh thumbnail thật lại
+THUMB_RETRY_AFTER = int(os.getenv("THUMB_RETRY_AFTER", "3600"))
+
+_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+
+class ThumbnailService:
+    """Sinh + upload các biến thể thumbnail theo key S3 cố định."""
+
+    def __init__(self, fmt: str = THUMB_FORMAT):
+        self.pil_format, self.ext, self.content_type = _FORMATS.get(fmt, _FORMATS["webp"])
+        self.format = "webp" if self.pil_format == "WEBP" else "jpeg"
+        # Tránh 2 request sinh lazy cùng 1 tài liệu: docId -> [lock, số luồng đang dùng]
+        self._inflight: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def thumb_key(self, doc_id, size: str, page: int = 1) -> str:
+        return f"{THUMB_PREFIX}/{doc_id}/p{page}_{size}.{self.ext}"
+
+    @contextmanager
+    def doc_lock(self, doc_id):
+        """Khoá sinh thumbnail của 1 tài liệu; bỏ khỏi _inflight khi không còn luồng nào dùng."""
+        key = str(doc_id)
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is None:
+                entry = self._inflight[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._inflight.pop(key, None)
+
+    def _encode(self, img: Image.Image) -> bytes:
+        buf = BytesIO()
+        if self.pil_format == "WEBP":
+            img.save(buf, format="WEBP", quality=THUMB_QUALITY, method=4)
+        else:
+            img.save(buf, format="JPEG", quality=THUMB_QUALITY, optimize=True, progressive=True)
+        return buf.getvalue()
+
+    def _variants(self, img: Image.Image) -> Dict[str, bytes]:
+        """Thu nhỏ từ lớn xuống nhỏ, mỗi size encode đúng 1 lần."""
+        out = {}
+        current = img.convert("RGB") if img.mode != "RGB" else img
+        for size, width in sorted(THUMB_SIZES.items(), key=lambda kv: -kv[1]):
+            if current.width > width:
+                height = max(1, round(current.height * width / current.width))
+                current = current.resize((width, height), Image.LANCZOS)
+            out[size] = self._encode(current)
+        return out
+
+    def _render_pdf_page(self, doc, page_index: int) -> Image.Image:
+        page = doc.load_page(page_index)
+        # Render vừa đủ cho size lớn nhất (không render 2x rồi thu nhỏ)
+        scale = min(3.0, max(THUMB_SIZES.values()) / (page.rect.width or 1))
+        pix = page.get_pixmap(alpha=False, matrix=fitz.Matrix(scale, scale))
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        del pix
+        return img
+
+    def _upload_variants(self, doc_id, page: int, variants: Dict[str, bytes]) -> Dict[str, str]:
+        urls = {}
+        for size, data in variants.items():
+            url = aws_service.upload_file(BytesIO(data), self.thumb_key(doc_id, size, page), self.content_type)
+            if url:
+                urls[size] = url
+        return urls
+
+    # ------------------------------------------------------------------
+    def from_pdf(self, doc_id, pdf_bytes: bytes, pages: int = None) -> Optional[dict]:
+        """
+        Sinh thumbnail từ PDF. Trả dict lưu vào document["thumbnails"]:
+        {"small": url, "medium": url, "large": url, "format": "webp", "pages": [...]}
+        """
+        pages = THUMB_PAGES if pages is None else pages
+        try:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        except Exception as e:
+            print(f"[Thumbs] Không mở được PDF {doc_id}: {e}")
+            return None
+        try:
+            if doc.page_count == 0:
+                return None
+            result = None
+            extra_pages = []
+            for i in range(min(max(1, pages), doc.page_count)):
+                try:
+                    img = self._render_pdf_page(doc, i)
+                    urls = self._upload_variants(doc_id, i + 1, self._variants(img))
+                    img.close()
+                except Exception as e:
+                    print(f"[Thumbs] Lỗi render trang {i + 1} của {doc_id}: {e}")
+                    continue
+                if i == 0:
+                    result = urls
+                elif urls:
+                    extra_pages.append({"page": i + 1, **urls})
+            if not result:
+                return None
+            result = {**result, "format": self.format}
+            if extra_pages:
+                result["pages"] = extra_pages
+            return result
+        finally:
+            doc.close()
+
+    def from_image(self, doc_id, image_bytes: bytes) -> Optional[dict]:
+        """Sinh thumbnail từ ảnh bìa người dùng upload (hoặc ảnh cũ trên S3)."""
+        try:
+            with Image.open(BytesIO(image_bytes)) as img:
+                img.load()
+                urls = self._upload_variants(doc_id, 1, self._variants(img))
+        except Exception as e:
+            print(f"[Thumbs] Lỗi xử lý ảnh {doc_id}: {e}")
+            return None
+        return {**urls, "format": self.format} if urls else None
+
+    def from_pil(self, doc_id, img: Image.Image) -> Optional[dict]:
+        """Sinh thumbnail từ ảnh trang 1 đã render sẵn (vd: đọc lười qua pdfium)."""
+        try:
+            urls = self._upload_variants(doc_id, 1, self._variants(img))
+        except Exception as e:
+            print(f"[Thumbs] Lỗi xử lý ảnh {doc_id}: {e}")
+            return None
+        return {**urls, "format": self.format} if urls else None
+
+    def placeholder(self, doc_id, title: str, retry: bool = False) -> Optional[dict]:
+        """
+        Ảnh placeholder (tiêu đề tài liệu) khi không có PDF/ảnh để render.
+        retry=True: placeholder thay cho thumbnail thật tạm thời lỗi -> kèm "placeholder" + "retryAt".
+        """
+        import textwrap
+        width, height = THUMB_SIZES["large"], round(THUMB_SIZES["large"] * 1.4)
+        bg, fg, accent = (245, 248, 255), (33, 37, 41), (0, 123, 255)
+        img = Image.new("RGB", (width, height), bg)
+        draw = ImageDraw.Draw(img)
+        draw.rounded_rectangle([20, 20, width - 20, height - 20], radius=24, outline=accent, width=3)
+        try:
+            font_big = ImageFont.truetype("arial.ttf", 44)
+            font_small = ImageFont.truetype("arial.ttf", 26)
+        except Exception:
+            font_big = ImageFont.load_default()
+            font_small = ImageFont.load_default()
+        draw.text((48, 48), "Document Preview", fill=accent, font=font_small)
+        draw.multiline_text((48, 110), textwrap.fill(title or "Tài liệu", width=24), fill=fg, font=font_big, spacing=10)
+        urls = self._upload_variants(doc_id, 1, self._variants(img))
+        if not urls:
+            return None
+        result = {**urls, "format": self.format}
+        if retry:
+            result.update(placeholder=True, retryAt=self.retry_at())
+        return result
+
+    @staticmethod
+    def retry_at() -> datetime:
+        return datetime.utcnow() + timedelta(seconds=THUMB_RETRY_AFTER)
+
+    @staticmethod
+    def needs_retry(thumbnails: Optional[dict]) -> bool:
+        """Placeholder tạm thời đã tới hạn thử sinh lại thumbnail thật."""
+        if not thumbnails or not thumbnails.get("placeholder"):
+            return False
+        retry_at = thumbnails.get("retryAt")
+        return not isinstance(retry_at, datetime) or retry_at <= datetime.utcnow()
+
+    def delete(self, doc_id, thumbnails: Optional[dict]):
+        """Xoá các object thumbnail của tài liệu (theo key cố định)."""
+        if not thumbnails:
+            return
+        fmt = thumbnails.get("format") or self.format
+        ext = _FORMATS.get(fmt, _FORMATS["webp"])[1]
+        page_numbers = [1] + [p.get("page") for p in thumbnails.get("pages") or [] if p.get("page")]
+        for page in page_numbers:
+            for size in THUMB_SIZES:
+                try:
+                    aws_service.delete_object(f"{THUMB_PREFIX}/{doc_id}/p{page}_{size}.{ext}")
+                except Exception:
+                    pass
+
+
+def thumbnail_fields(doc: dict) -> dict:
+    """
+    Trường thumbnail cho response danh sách.
+    Tài liệu cũ chưa có thumbnails -> trỏ tới route sinh lazy.
+    """
+    doc_id = str(doc.get("_id") or "")
+    thumbs = doc.get("thumbnails") or {}
+    # Placeholder tạm thời -> vẫn đi qua route lazy để được sinh lại khi tới hạn
+    if thumbs.get("small") and not (thumbs.get("placeholder") and doc_id):
+        return {"thumbnails": {size: thumbs.get(size) for size in THUMB_SIZES}}
+    if not doc_id:
+        return {}
+    return {"thumbnails": {
+        size: f"/api/documents/{doc_id}/thumbnail?size={size}" for size in THUMB_SIZES
+    }}
+
+
+# Global service instance
+thumbnail_service = ThumbnailService()
@@ -0,0 +1,213 @@
+# app/services/view_counter.py
+# -*- coding: utf-8 -*-
+"""
+Bộ đếm lượt xem write-behind cho POST /api/documents/<id>/view.
+- Mỗi lượt xem chỉ cập nhật dict trong RAM: +1 cho document, ghi đè viewedAt cho (user, document).
+- Thread nền gom lại và flush định kỳ bằng bulk_write ($inc views/viewsWeek, bucket theo giờ
+  trong document_view_buckets, upsert view_history), N lượt xem cùng tài liệu trong 1 chu kỳ -> 1 lệnh $inc.
+- Số lượt xem trả về = số đã biết trong DB (cache) + phần đang chờ flush (xấp xỉ, không đọc lại DB).
+- Flush lỗi: gộp lại vào buffer để lần sau ghi tiếp; tắt app: flush lần cuối (atexit).
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.services.mongo_service import mongo_collections
+from app.services.view_stats import WINDOW_FIELD, hour_bucket, view_stats
+
+VIEW_BUFFER_ENABLED = os.getenv("VIEW_BUFFER_ENABLED", "true").lower() == "true"
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))  # giây
+# Buffer vượt ngưỡng này (số document + cặp user/document) thì flush sớm
+VIEW_FLUSH_MAX_PENDING = int(os.getenv("VIEW_FLUSH_MAX_PENDING", "5000"))
+# Cache số lượt xem đã có trong DB (để trả số xấp xỉ + kiểm tra tài liệu tồn tại)
+VIEW_BASE_CACHE_SIZE = int(os.getenv("VIEW_BASE_CACHE_SIZE", "20000"))
+VIEW_BASE_TTL = float(os.getenv("VIEW_BASE_TTL", "60"))  # giây, đọc lại để gộp lượt xem từ process khác
+
+
+class ViewCounter:
+    """Gom lượt xem trong RAM và flush theo lô."""
+
+    def __init__(self, interval: float = VIEW_FLUSH_INTERVAL, max_pending: int = VIEW_FLUSH_MAX_PENDING):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[object, int] = {}
+        self._hits: Dict[Tuple[object, datetime], int] = {}
+        self._history: Dict[Tuple[object, object], datetime] = {}
+        self._base: "OrderedDict[object, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"views": 0, "flushes": 0, "docWrites": 0, "historyWrites": 0,
+                      "bucketWrites": 0, "baseReads": 0, "flushErrors": 0, "lastFlushMs": 0.0}
+
+    # ------------------------------------------------------------------
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                view_stats.maybe_roll()
+            except Exception as e:
+                print(f"[ViewCounter] Lỗi flush: {e}")
+
+    def _base_views(self, doc_id) -> Optional[int]:
+        """Số lượt xem đã ghi trong DB (cache theo TTL); None nếu tài liệu không tồn tại."""
+        now = time.time()
+        with self._lock:
+            cached = self._base.get(doc_id)
+            if cached and now - cached[1] < VIEW_BASE_TTL:
+                self._base.move_to_end(doc_id)
+                return cached[0]
+        doc = mongo_collections.documents.find_one({"_id": doc_id}, {"views": 1})
+        self.stats["baseReads"] += 1
+        if doc is None:
+            return None
+        views = int(doc.get("views") or 0)
+        with self._lock:
+            self._base[doc_id] = (views, now)
+            self._base.move_to_end(doc_id)
+            while len(self._base) > VIEW_BASE_CACHE_SIZE:
+                self._base.popitem(last=False)
+        return views
+
+    # ------------------------------------------------------------------
+    def record(self, doc_id, user_id=None) -> Optional[int]:
+        """
+        Ghi nhận 1 lượt xem. Trả số lượt xem xấp xỉ sau khi tăng,
+        hoặc None nếu tài liệu không tồn tại.
+        """
+        if not VIEW_BUFFER_ENABLED:
+            return self._record_direct(doc_id, user_id)
+        base = self._base_views(doc_id)
+        if base is None:
+            return None
+        now = datetime.utcnow()
+        hit_key = (doc_id, hour_bucket(now))
+        with self._lock:
+            pending = self._pending.get(doc_id, 0) + 1
+            self._pending[doc_id] = pending
+            self._hits[hit_key] = self._hits.get(hit_key, 0) + 1
+            if user_id:
+                self._history[(user_id, doc_id)] = now
+            self.stats["views"] += 1
+            size = len(self._pending) + len(self._history)
+        self._ensure_thread()
+        if size >= self.max_pending:
+            self._wake.set()
+        return base + pending
+
+    def _record_direct(self, doc_id, user_id=None) -> Optional[int]:
+        """Ghi thẳng như cũ (VIEW_BUFFER_ENABLED=false)."""
+        from pymongo import ReturnDocument
+        doc = mongo_collections.documents.find_one_and_update(
+            {"_id": doc_id}, {"$inc": {"views": 1, WINDOW_FIELD: 1}},
+            projection={"views": 1}, return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return None
+        view_stats.write_buckets({(doc_id, hour_bucket()): 1})
+        if user_id:
+            mongo_collections.view_history.update_one(
+                {"userId": user_id, "documentId": doc_id},
+                {"$set": {"viewedAt": datetime.utcnow()}},
+                upsert=True,
+            )
+        return int(doc.get("views") or 0)
+
+    def discard(self, doc_id):
+        """Bỏ lượt xem đang chờ của tài liệu vừa bị xoá (tránh upsert lại view_history)."""
+        with self._lock:
+            self._pending.pop(doc_id, None)
+            self._base.pop(doc_id, None)
+            for key in [k for k in self._hits if k[0] == doc_id]:
+                del self._hits[key]
+            for key in [k for k in self._history if k[1] == doc_id]:
+                del self._history[key]
+
+    # ------------------------------------------------------------------
+    def flush(self):
+        """Ghi buffer hiện tại xuống Mongo bằng bulk_write."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                hits, self._hits = self._hits, {}
+                history, self._history = self._history, {}
+            if not pending and not hits and not history:
+                return
+            started = time.time()
+            try:
+                if pending:
+                    mongo_collections.documents.bulk_write(
+                        [UpdateOne({"_id": d}, {"$inc": {"views": n, WINDOW_FIELD: n}}) for d, n in pending.items()],
+                        ordered=False,
+                    )
+                    self.stats["docWrites"] += len(pending)
+                    with self._lock:
+                        # Phần vừa flush giờ đã nằm trong DB -> cộng vào base
+                        for d, n in pending.items():
+                            if d in self._base:
+                                views, fetched = self._base[d]
+                                self._base[d] = (views + n, fetched)
+                    pending = {}
+                if hits:
+                    view_stats.write_buckets(hits)
+                    self.stats["bucketWrites"] += len(hits)
+                    hits = {}
+                if history:
+                    mongo_collections.view_history.bulk_write(
+                        [UpdateOne({"userId": u, "documentId": d}, {"$max": {"viewedAt": at}}, upsert=True)
+                         for (u, d), at in history.items()],
+                        ordered=False,
+                    )
+                    self.stats["historyWrites"] += len(history)
+                self.stats["flushes"] += 1
+            except Exception as e:
+                self.stats["flushErrors"] += 1
+                print(f"[ViewCounter] Flush lỗi, giữ lại để ghi lần sau: {e}")
+                with self._lock:
+                    for d, n in pending.items():
+                        self._pending[d] = self._pending.get(d, 0) + n
+                    for key, n in hits.items():
+                        self._hits[key] = self._hits.get(key, 0) + n
+                    for key, at in history.items():
+                        if key not in self._history or self._history[key] < at:
+                            self._history[key] = at
+            finally:
+                self.stats["lastFlushMs"] = round((time.time() - started) * 1000, 1)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            pending_docs, pending_views = len(self._pending), sum(self._pending.values())
+            pending_history = len(self._history)
+        writes = self.stats["docWrites"] + self.stats["historyWrites"]
+        return {
+            **self.stats,
+            "enabled": VIEW_BUFFER_ENABLED,
+            "intervalSec": self.interval,
+            "pendingDocs": pending_docs,
+            "pendingViews": pending_views,
+            "pendingHistory": pending_history,
+            "viewsPerWrite": round(self.stats["views"] / writes, 2) if writes else 0.0,
+        }
+
+
+# Global counter instance
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
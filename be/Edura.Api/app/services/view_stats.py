@@ -0,0 +1,149 @@
+# app/services/view_stats.py
+# -*- coding: utf-8 -*-
+"""
+Thống kê lượt xem theo thời gian + bảng xếp hạng cửa sổ trượt (N ngày gần nhất).
+- document_view_buckets: 1 bản ghi / (tài liệu, ngày UTC), gồm tổng `views` và `hours.<0-23>`.
+  Được ghi cùng lúc với $inc views khi view_counter flush.
+- documents.viewsWeek: lượt xem trong VIEW_WINDOW_DAYS ngày gần nhất, cập nhật tăng dần:
+  +n khi flush, -bucket.views khi bucket của 1 ngày rời khỏi cửa sổ (roll_window).
+  Featured/trending chỉ cần 1 query có index: sort(viewsWeek, views).
+- rebuild_window(): tính lại viewsWeek từ buckets (sửa lệch nếu roll bị gián đoạn).
+"""
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import UpdateOne
+
+from app.services.mongo_service import mongo_collections
+
+VIEW_WINDOW_DAYS = int(os.getenv("VIEW_WINDOW_DAYS", "7"))
+# Chu kỳ kiểm tra bucket rời khỏi cửa sổ (giây)
+VIEW_ROLL_INTERVAL = float(os.getenv("VIEW_ROLL_INTERVAL", "600"))
+WINDOW_FIELD = "viewsWeek"
+# Sort bảng xếp hạng: lượt xem trong cửa sổ, hoà thì theo tổng lượt xem
+LEADERBOARD_SORT = [(WINDOW_FIELD, -1), ("views", -1)]
+
+
+def hour_bucket(at: datetime = None) -> datetime:
+    """Mốc giờ (UTC) của 1 lượt xem."""
+    return (at or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+
+class ViewStats:
+    """Ghi bucket lượt xem và duy trì viewsWeek trên documents."""
+
+    def __init__(self):
+        self._last_roll = 0.0
+        self._roll_lock = threading.Lock()
+
+    def window_start(self, now: datetime = None) -> datetime:
+        """Ngày đầu tiên còn nằm trong cửa sổ."""
+        today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - timedelta(days=VIEW_WINDOW_DAYS - 1)
+
+    # ------------------------------------------------------------------
+    def write_buckets(self, hits: Dict[Tuple[object, datetime], int]):
+        """Ghi lượt xem theo (tài liệu, giờ) vào document_view_buckets (upsert theo ngày)."""
+        if not hits:
+            return
+        merged: Dict[Tuple[object, datetime], Dict[str, int]] = {}
+        for (doc_id, hour), n in hits.items():
+            day = hour.replace(hour=0)
+            inc = merged.setdefault((doc_id, day), {"views": 0})
+            inc["views"] += n
+            inc[f"hours.{hour.hour}"] = inc.get(f"hours.{hour.hour}", 0) + n
+        mongo_collections.document_view_buckets.bulk_write(
+            [UpdateOne({"documentId": d, "day": day}, {"$inc": inc}, upsert=True)
+             for (d, day), inc in merged.items()],
+            ordered=False,
+        )
+
+    def maybe_roll(self):
+        """Gọi từ thread flush: roll_window tối đa 1 lần / VIEW_ROLL_INTERVAL."""
+        if time.time() - self._last_roll < VIEW_ROLL_INTERVAL:
+            return
+        if not self._roll_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_roll = time.time()
+            self.roll_window()
+        except Exception as e:
+            print(f"[ViewStats] Lỗi roll cửa sổ: {e}")
+        finally:
+            self._roll_lock.release()
+
+    def roll_window(self) -> int:
+        """
+        Trừ lượt xem của các bucket vừa rời khỏi cửa sổ khỏi documents.viewsWeek.
+        Bucket được "nhận" bằng token trước khi trừ -> nhiều process chạy song song không trừ 2 lần.
+        """
+        token = uuid.uuid4().hex
+        claimed = mongo_collections.document_view_buckets.update_many(
+            {"day": {"$lt": self.window_start()}, "rolled": {"$exists": False}},
+            {"$set": {"rolled": token}},
+        ).modified_count
+        if not claimed:
+            return 0
+        ops = []
+        for b in mongo_collections.document_view_buckets.find({"rolled": token}, {"documentId": 1, "views": 1}):
+            if b.get("views"):
+                ops.append(UpdateOne({"_id": b["documentId"]}, {"$inc": {WINDOW_FIELD: -int(b["views"])}}))
+            if len(ops) >= 1000:
+                mongo_collections.documents.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            mongo_collections.documents.bulk_write(ops, ordered=False)
+        print(f"[ViewStats] Đã roll {claimed} bucket ra khỏi cửa sổ {VIEW_WINDOW_DAYS} ngày")
+        return claimed
+
+    def rebuild_window(self) -> Dict[str, int]:
+        """Tính lại viewsWeek của mọi tài liệu từ các bucket trong cửa sổ."""
+        start = self.window_start()
+        # Đánh dấu bucket cũ là đã roll để roll_window không trừ thêm lần nữa
+        mongo_collections.document_view_buckets.update_many(
+            {"day": {"$lt": start}, "rolled": {"$exists": False}}, {"$set": {"rolled": "rebuild"}}
+        )
+        totals = {
+            row["_id"]: int(row["views"])
+            for row in mongo_collections.document_view_buckets.aggregate([
+                {"$match": {"day": {"$gte": start}}},
+                {"$group": {"_id": "$documentId", "views": {"$sum": "$views"}}},
+            ])
+        }
+        ops = [UpdateOne({"_id": d}, {"$set": {WINDOW_FIELD: v}}) for d, v in totals.items()]
+        stale = mongo_collections.documents.find(
+            {WINDOW_FIELD: {"$ne": 0, "$exists": True}}, {"_id": 1}
+        )
+        ops += [UpdateOne({"_id": d["_id"]}, {"$set": {WINDOW_FIELD: 0}}) for d in stale if d["_id"] not in totals]
+        for i in range(0, len(ops), 1000):
+            mongo_collections.documents.bulk_write(ops[i:i + 1000], ordered=False)
+        return {"documents": len(totals), "updated": len(ops)}
+
+    # ------------------------------------------------------------------
+    def daily_series(self, doc_id, days: int = VIEW_WINDOW_DAYS) -> List[dict]:
+        """Lượt xem theo ngày của 1 tài liệu (ngày không có lượt xem -> 0)."""
+        end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = end - timedelta(days=days - 1)
+        found = {
+            b["day"]: int(b.get("views") or 0)
+            for b in mongo_collections.document_view_buckets.find(
+                {"documentId": doc_id, "day": {"$gte": start}}, {"day": 1, "views": 1}
+            )
+        }
+        return [
+            {"day": (start + timedelta(days=i)).date().isoformat(), "views": found.get(start + timedelta(days=i), 0)}
+            for i in range(days)
+        ]
+
+    def top_documents(self, query: dict = None, limit: int = 10, projection: dict = None) -> Iterable[dict]:
+        """Bảng xếp hạng cửa sổ trượt (1 query có index trên viewsWeek)."""
+        return mongo_collections.for_analytics(mongo_collections.documents).find(query or {}, projection).sort(LEADERBOARD_SORT).limit(limit)
+
+
+# Global stats instance
+view_stats = ViewStats()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache kết quả Gemini (tóm tắt, tóm tắt từ ảnh, sinh quiz) theo hash nội dung.
+Key = sha256(loại + model + version prompt + tham số + dữ liệu đầu vào),
+lưu trong Mongo collection "ai_response_cache" có TTL index và ghi lại kích thước.
+Request trùng nội dung (upload lại, sinh quiz lại) trả về ngay, không tốn quota API.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Optional, Union
+
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+AI_CACHE_TTL_DAYS = int(os.getenv("AI_CACHE_TTL_DAYS", "90"))
+# Không lưu kết quả quá lớn (KB)
+AI_CACHE_MAX_ENTRY_KB = int(os.getenv("AI_CACHE_MAX_ENTRY_KB", "256"))
+
+
+class AIResponseCache:
+    """Cache bền vững (Mongo) cho response của model AI."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def collection(self):
+        from app.services.mongo_service import mongo_collections
+        return mongo_collections.ai_response_cache
+
+    @staticmethod
+    def make_key(kind: str, model: str, prompt_version: str,
+                 data: Union[str, bytes], **params) -> str:
+        """Hash nội dung đầu vào (text hoặc bytes) cùng model/prompt/tham số."""
+        h = hashlib.sha256()
+        header = json.dumps(
+            {"kind": kind, "model": model, "promptVersion": prompt_version, "params": params},
+            sort_keys=True, ensure_ascii=False,
+        )
+        h.update(header.encode("utf-8"))
+        h.update(b"\0")
+        h.update(data.encode("utf-8") if isinstance(data, str) else (data or b""))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        if not AI_CACHE_ENABLED:
+            return None
+        try:
+            doc = self.collection.find_one_and_update(
+                {"_id": key},
+                {"$inc": {"hits": 1}, "$set": {"lastHitAt": datetime.utcnow()}},
+                projection={"result": 1},
+            )
+        except Exception as e:
+            print(f"[AICache] Lỗi đọc cache: {e}")
+            return None
+        if not doc:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return doc.get("result")
+
+    def set(self, key: str, kind: str, model: str, prompt_version: str, result: Any):
+        if not AI_CACHE_ENABLED or result is None:
+            return
+        size = len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+        if size > AI_CACHE_MAX_ENTRY_KB * 1024:
+            return
+        try:
+            self.collection.update_one(
+                {"_id": key},
+                {"$setOnInsert": {
+                    "kind": kind,
+                    "model": model,
+                    "promptVersion": prompt_version,
+                    "result": result,
+                    "sizeBytes": size,
+                    "hits": 0,
+                    "createdAt": datetime.utcnow(),
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"[AICache] Lỗi ghi cache: {e}")
+
+    def get_stats(self) -> dict:
+        """Số entry và tổng dung lượng theo từng loại."""
+        by_kind = {}
+        try:
+            for row in self.collection.aggregate([
+                {"$group": {"_id": "$kind", "entries": {"$sum": 1},
+                            "bytes": {"$sum": "$sizeBytes"}, "hits": {"$sum": "$hits"}}}
+            ]):
+                by_kind[row["_id"] or "unknown"] = {
+                    "entries": row.get("entries", 0),
+                    "bytes": row.get("bytes", 0),
+                    "hits": row.get("hits", 0),
+                }
+        except Exception as e:
+            print(f"[AICache] Lỗi thống kê: {e}")
+        return {"processHits": self.hits, "processMisses": self.misses, "byKind": by_kind}
+
+
+# Global cache instance
+ai_response_cache = AIResponseCache()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Schema chuẩn cho collection documents + lớp tương thích trong thời gian migrate.
+
+Schema chuẩn (schemaVersion = 2):
+  schoolId / categoryId / userId : ObjectId   (thay cho school_id / category_id / user_id, id dạng string)
+  createdAt                      : datetime   (thay cho created_at)
+  s3_url                         : str        (thay cho s3Url)
+  pages                          : int        (thay cho pageCount)
+
+- canonicalize(doc): $set/$unset đưa 1 document về schema chuẩn (scripts/migrate_document_schema.py).
+- compat_read(doc): điền trường chuẩn từ trường cũ khi đọc dữ liệu chưa migrate.
+- Query builder (by_school, by_category, by_user, created_filter, created_sort, ref_expr):
+  khi migration đã xong -> predicate 1 field đúng kiểu, dùng được compound index;
+  trước đó -> $or tương thích như cũ.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+
+DOCUMENT_SCHEMA_VERSION = 2
+# auto: tự chuyển sang query chuẩn khi migration đánh dấu hoàn tất | true | false
+DOCUMENT_SCHEMA_CANONICAL = os.getenv("DOCUMENT_SCHEMA_CANONICAL", "auto").lower()
+# Tên job migration trong job_checkpoints
+SCHEMA_MIGRATION_JOB = f"documents_schema_v{DOCUMENT_SCHEMA_VERSION}"
+# Chu kỳ đọc lại trạng thái migration (giây)
+_STATE_TTL = 60
+
+# Trường chuẩn -> trường cũ
+LEGACY_FIELDS = {
+    "schoolId": "school_id",
+    "categoryId": "category_id",
+    "userId": "user_id",
+    "createdAt": "created_at",
+    "s3_url": "s3Url",
+    "pages": "pageCount",
+}
+ID_FIELDS = ("schoolId", "categoryId", "userId")
+
+_state = {"canonical": False, "checked_at": 0.0}
+_state_lock = threading.Lock()
+
+
+def _as_oid(value) -> Optional[ObjectId]:
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except Exception:
+        return None
+
+
+def canonical_queries_enabled() -> bool:
+    """True nếu mọi document đã theo schema chuẩn (migration xong hoặc ép qua env)."""
+    if DOCUMENT_SCHEMA_CANONICAL in ("true", "1"):
+        return True
+    if DOCUMENT_SCHEMA_CANONICAL in ("false", "0"):
+        return False
+    now = time.time()
+    if now - _state["checked_at"] < _STATE_TTL:
+        return _state["canonical"]
+    with _state_lock:
+        if now - _state["checked_at"] < _STATE_TTL:
+            return _state["canonical"]
+        try:
+            from app.services.mongo_service import mongo_collections
+            done = mongo_collections.job_checkpoints.find_one(
+                {"job": SCHEMA_MIGRATION_JOB, "range": 0, "done": True}, {"_id": 1}
+            )
+            _state["canonical"] = done is not None
+        except Exception as e:
+            print(f"[DocSchema] Không đọc được trạng thái migration: {e}")
+        _state["checked_at"] = now
+        return _state["canonical"]
+
+
+def reset_schema_state():
+    """Buộc đọc lại trạng thái migration ở lần query tiếp theo."""
+    _state["checked_at"] = 0.0
+
+
+# ----------------------------------------------------------------------
+# Query builders
+# ----------------------------------------------------------------------
+def _id_values(values: Iterable) -> List[Any]:
+    out = []
+    for v in values:
+        oid = _as_oid(v)
+        out.extend([oid, str(oid)] if oid else [v])
+    return out
+
+
+def id_filter(field: str, value) -> Dict:
+    """Lọc theo 1 id tham chiếu (schoolId/categoryId/userId), nhận ObjectId hoặc string."""
+    return ids_filter(field, [value])
+
+
+def ids_filter(field: str, values: Iterable) -> Dict:
+    """Lọc theo danh sách id tham chiếu."""
+    values = list(values)
+    if canonical_queries_enabled():
+        # Migration giữ nguyên id không phải ObjectId (_canonical_values) -> vẫn phải khớp được
+        vals = [_as_oid(v) or v for v in values]
+        if len(vals) == 1:
+            return {field: vals[0]}
+        return {field: {"$in": vals}}
+    vals = _id_values(values)
+    return {"$or": [{field: {"$in": vals}}, {LEGACY_FIELDS[field]: {"$in": vals}}]}
+
+
+def by_school(value) -> Dict:
+    return id_filter("schoolId", value)
+
+
+def by_category(value) -> Dict:
+    return id_filter("categoryId", value)
+
+
+def by_user(value) -> Dict:
+    return id_filter("userId", value)
+
+
+def created_filter(condition: Dict) -> Dict:
+    """Lọc theo thời gian tạo (condition dạng {"$gte": ..., "$lt": ...})."""
+    if canonical_queries_enabled():
+        return {"createdAt": condition}
+    return {"$or": [{"createdAt": condition}, {"created_at": condition}]}
+
+
+def created_sort(*leading: Tuple[str, int]) -> List[Tuple[str, int]]:
+    """Sort mới -> cũ (có thể thêm khoá đứng trước, vd ("views", -1))."""
+    keys = list(leading) + [("createdAt", -1)]
+    if not canonical_queries_enabled():
+        keys.append(("created_at", -1))
+    return keys
+
+
+def ref_expr(field: str):
+    """Biểu thức aggregation lấy giá trị tham chiếu (vd group theo trường học)."""
+    if canonical_queries_enabled():
+        return f"${field}"
+    return {"$ifNull": [f"${field}", f"${LEGACY_FIELDS[field]}"]}
+
+
+def and_filters(*clauses: Optional[Dict]) -> Dict:
+    """Gộp các điều kiện (bỏ qua điều kiện rỗng)."""
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def projection_fields(*fields: str) -> Dict[str, int]:
+    """Projection gồm trường chuẩn (+ trường cũ nếu chưa migrate xong)."""
+    proj = {f: 1 for f in fields}
+    if not canonical_queries_enabled():
+        for f in fields:
+            if f in LEGACY_FIELDS:
+                proj[LEGACY_FIELDS[f]] = 1
+    return proj
+
+
+# ----------------------------------------------------------------------
+# Read layer + migration
+# ----------------------------------------------------------------------
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_datetime(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None) if value.tzinfo else value
+    if isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return dt.replace(tzinfo=None) if dt.tzinfo else dt
+        except ValueError:
+            return None
+    return None
+
+
+def _canonical_values(doc: Dict) -> Dict[str, Any]:
+    """Giá trị chuẩn của các trường (ưu tiên trường chuẩn, fallback trường cũ)."""
+    def pick(field):
+        value = doc.get(field)
+        return value if value not in (None, "") else doc.get(LEGACY_FIELDS[field])
+
+    values = {}
+    for field in ID_FIELDS:
+        raw = pick(field)
+        if raw not in (None, ""):
+            values[field] = _as_oid(raw) or raw
+    created = _to_datetime(pick("createdAt"))
+    if created is None and isinstance(doc.get("_id"), ObjectId):
+        created = doc["_id"].generation_time.replace(tzinfo=None)
+    if created is not None:
+        values["createdAt"] = created
+    s3_url = pick("s3_url")
+    if s3_url:
+        values["s3_url"] = s3_url
+    pages = _to_int(pick("pages"))
+    if pages is not None:
+        values["pages"] = pages
+    return values
+
+
+def compat_read(doc: Optional[Dict]) -> Optional[Dict]:
+    """Điền trường chuẩn (đúng kiểu) cho document đọc từ Mongo, không ghi lại DB."""
+    if doc:
+        doc.update(_canonical_values(doc))
+    return doc
+
+
+def canonicalize(doc: Dict, drop_legacy: bool = False) -> Tuple[Dict, Dict]:
+    """($set, $unset) để đưa document về schema chuẩn; ($set rỗng, $unset rỗng) nếu đã chuẩn."""
+    to_set = {
+        field: value for field, value in _canonical_values(doc).items()
+        if doc.get(field) != value or type(doc.get(field)) is not type(value)
+    }
+    if doc.get("schemaVersion") != DOCUMENT_SCHEMA_VERSION:
+        to_set["schemaVersion"] = DOCUMENT_SCHEMA_VERSION
+    to_unset = {}
+    if drop_legacy:
+        to_unset = {legacy: "" for legacy in LEGACY_FIELDS.values() if legacy in doc}
+    return to_set, to_unset
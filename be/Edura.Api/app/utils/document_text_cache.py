@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache bền vững cho văn bản đã trích xuất + chuẩn hoá của tài liệu.
+Lưu dạng gzip trong Mongo GridFS (bucket "document_texts") để route
+/api/documents/<id>/text không phải tải lại file từ S3 và parse PDF mỗi lần.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+from typing import Optional, Tuple
+
+import gridfs
+from gridfs.errors import FileExists, NoFile
+
+# Tăng version khi đổi logic trích xuất/chuẩn hoá để bỏ qua bản cache cũ
+TEXT_CACHE_VERSION = int(os.getenv("DOCUMENT_TEXT_CACHE_VERSION", "1"))
+TEXT_CACHE_ENABLED = os.getenv("DOCUMENT_TEXT_CACHE", "true").lower() == "true"
+
+
+class DocumentTextCache:
+    """Cache văn bản tài liệu trong GridFS, kèm ETag để trả 304."""
+
+    def __init__(self, bucket_name: str = "document_texts"):
+        self.bucket_name = bucket_name
+        self._fs: Optional[gridfs.GridFS] = None
+
+    @property
+    def fs(self) -> gridfs.GridFS:
+        # Khởi tạo lười để không mở kết nối khi import module
+        if self._fs is None:
+            from app.services.mongo_service import mongo_collections
+            self._fs = gridfs.GridFS(mongo_collections.db, collection=self.bucket_name)
+        return self._fs
+
+    @staticmethod
+    def _file_id(doc_id) -> str:
+        return f"{doc_id}:v{TEXT_CACHE_VERSION}"
+
+    @staticmethod
+    def make_etag(text: str) -> str:
+        """ETag = sha256 của văn bản đã chuẩn hoá (rút gọn 32 ký tự)."""
+        return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:32]
+
+    def get_etag(self, doc_id) -> Optional[str]:
+        """Chỉ đọc metadata (không đọc chunks) để kiểm tra If-None-Match."""
+        if not TEXT_CACHE_ENABLED:
+            return None
+        try:
+            grid_out = self.fs.find_one({"_id": self._file_id(doc_id)})
+            if not grid_out:
+                return None
+            return (grid_out.metadata or {}).get("etag")
+        except Exception as e:
+            print(f"[TextCache] Lỗi đọc metadata {doc_id}: {e}")
+            return None
+
+    def get(self, doc_id) -> Optional[Tuple[str, str]]:
+        """Trả (text, etag) nếu đã cache, ngược lại None."""
+        if not TEXT_CACHE_ENABLED:
+            return None
+        try:
+            grid_out = self.fs.get(self._file_id(doc_id))
+            text = gzip.decompress(grid_out.read()).decode("utf-8")
+            etag = (grid_out.metadata or {}).get("etag") or self.make_etag(text)
+            return text, etag
+        except NoFile:
+            return None
+        except Exception as e:
+            print(f"[TextCache] Lỗi đọc cache {doc_id}: {e}")
+            return None
+
+    def set(self, doc_id, text: str) -> str:
+        """Lưu văn bản (gzip) vào GridFS, trả về ETag."""
+        etag = self.make_etag(text)
+        if not TEXT_CACHE_ENABLED:
+            return etag
+        raw = (text or "").encode("utf-8")
+        try:
+            self.fs.put(
+                gzip.compress(raw, compresslevel=6),
+                _id=self._file_id(doc_id),
+                filename=f"{doc_id}.txt.gz",
+                contentType="text/plain; charset=utf-8",
+                metadata={
+                    "documentId": str(doc_id),
+                    "etag": etag,
+                    "version": TEXT_CACHE_VERSION,
+                    "rawLength": len(raw),
+                },
+            )
+        except FileExists:
+            # Request khác đã ghi trước (cùng nội dung) -> bỏ qua
+            pass
+        except Exception as e:
+            print(f"[TextCache] Lỗi ghi cache {doc_id}: {e}")
+        return etag
+
+    def delete(self, doc_id):
+        """Xoá cache khi tài liệu bị xoá (mọi version, không chỉ TEXT_CACHE_VERSION hiện tại)."""
+        try:
+            query = {"$or": [
+                {"metadata.documentId": str(doc_id)},
+                {"_id": {"$regex": f"^{re.escape(str(doc_id))}:"}},
+            ]}
+            for grid_out in self.fs.find(query):
+                self.fs.delete(grid_out._id)
+        except Exception as e:
+            print(f"[TextCache] Lỗi xoá cache {doc_id}: {e}")
+
+
+# Global cache instance
+document_text_cache = DocumentTextCache()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache LRU trên đĩa cho các object S3 (PDF/Word) dùng bởi /raw, /text và enrich.
+- Key theo (bucket, key, ETag) -> object bị ghi đè trên S3 sẽ tự miss.
+- Đọc theo Range bằng os.pread (không load cả file vào RAM).
+- Nhiều request miss cùng lúc chỉ tải 1 lần (khoá theo key).
+- Giới hạn tổng dung lượng, xoá file ít dùng nhất khi vượt ngưỡng.
+- get() trả entry đã pin: file không bị evict khi còn người đọc, caller phải release() khi xong.
+- /raw: lookup() chỉ dùng file đã có; miss thì stream thẳng từ S3 và fill_async() tải vào cache ở nền.
+- Object lớn hơn S3_DISK_CACHE_MAX_OBJECT_RATIO x dung lượng cache không được cache.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+S3_DISK_CACHE_ENABLED = os.getenv("S3_DISK_CACHE", "true").lower() == "true"
+S3_DISK_CACHE_DIR = os.getenv("S3_DISK_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "edura_s3_cache")
+S3_DISK_CACHE_MAX_MB = int(os.getenv("S3_DISK_CACHE_MAX_MB", "512"))
+# Thời gian tin tưởng ETag đã HEAD trước đó (tránh HEAD mỗi request)
+S3_DISK_CACHE_HEAD_TTL = int(os.getenv("S3_DISK_CACHE_HEAD_TTL", "60"))
+# Số kết quả HEAD giữ trong RAM (LRU)
+S3_DISK_CACHE_HEAD_MAX = int(os.getenv("S3_DISK_CACHE_HEAD_MAX", "10000"))
+# Object lớn hơn tỉ lệ này của S3_DISK_CACHE_MAX_MB: không cache (1 file không đẩy hết cache ra)
+S3_DISK_CACHE_MAX_OBJECT_RATIO = float(os.getenv("S3_DISK_CACHE_MAX_OBJECT_RATIO", "0.25"))
+# Số luồng tải nền cho fill_async()
+S3_DISK_CACHE_FILL_WORKERS = int(os.getenv("S3_DISK_CACHE_FILL_WORKERS", "2"))
+
+
+class CachedObject:
+    """Một object S3 đã nằm trên đĩa."""
+
+    __slots__ = ("path", "size", "content_type", "etag", "pins")
+
+    def __init__(self, path: str, size: int, content_type: str, etag: str):
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.etag = etag
+        # Số người đang đọc file (get() chưa release) -> không evict
+        self.pins = 0
+
+    def read_all(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def read_range(self, start: int, length: int) -> bytes:
+        fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            return _pread(fd, length, start)
+        finally:
+            os.close(fd)
+
+    def iter_range(self, start: int, length: int, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        """Sinh các chunk trong khoảng [start, start + length) để stream response."""
+        fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            offset, remaining = start, length
+            while remaining > 0:
+                chunk = _pread(fd, min(chunk_size, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            os.close(fd)
+
+
+def _pread(fd: int, length: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, length, offset)
+    # Windows không có os.pread
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, length)
+
+
+class S3ObjectCache:
+    """LRU cache object S3 trên đĩa, an toàn đa luồng."""
+
+    def __init__(self, cache_dir: str = S3_DISK_CACHE_DIR, max_bytes: int = S3_DISK_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedObject]" = OrderedDict()
+        self._total_bytes = 0
+        self._fill_locks: Dict[str, threading.Lock] = {}
+        # "bucket/key" -> (etag, size, content_type, checked_at), LRU tối đa S3_DISK_CACHE_HEAD_MAX
+        self._heads: "OrderedDict[str, tuple]" = OrderedDict()
+        # "bucket/key" đang chờ/đang tải nền (fill_async)
+        self._pending_fills = set()
+        self._fill_pool: Optional[ThreadPoolExecutor] = None
+        self.stats = {"hits": 0, "misses": 0, "fills": 0, "fill_waits": 0, "async_fills": 0,
+                      "skipped_large": 0, "evictions": 0, "errors": 0}
+        self._loaded = False
+
+    # ------------------------------------------------------------------
+    def _ensure_loaded(self):
+        """Nạp lại index từ đĩa (sau khi restart), thứ tự theo thời gian truy cập."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            found = []
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith(".part"):
+                    # file tải dở từ lần chạy trước
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_atime, name, path, st.st_size))
+            for _, name, path, size in sorted(found):
+                self._entries[name] = CachedObject(path, size, "application/octet-stream", "")
+                self._total_bytes += size
+            self._loaded = True
+
+    @staticmethod
+    def _entry_name(bucket: str, key: str, etag: str) -> str:
+        digest = hashlib.sha1(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+        return f"{digest}-{etag.strip(chr(34)).replace('/', '_')}"
+
+    def _head(self, s3, bucket: str, key: str):
+        head_key = f"{bucket}/{key}"
+        with self._lock:
+            cached = self._heads.get(head_key)
+            if cached and time.time() - cached[3] < S3_DISK_CACHE_HEAD_TTL:
+                self._heads.move_to_end(head_key)
+                return cached
+        head = s3.head_object(key, bucket=bucket)
+        result = (head.get("ETag", "").strip('"'), int(head.get("ContentLength", 0)),
+                  head.get("ContentType") or "application/octet-stream", time.time())
+        with self._lock:
+            self._heads[head_key] = result
+            self._heads.move_to_end(head_key)
+            while len(self._heads) > S3_DISK_CACHE_HEAD_MAX:
+                self._heads.popitem(last=False)
+        return result
+
+    def _touch(self, name: str) -> Optional[CachedObject]:
+        """Entry còn trên đĩa -> đánh dấu mới dùng và pin; None nếu chưa có."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            if not os.path.exists(entry.path):
+                self._entries.pop(name, None)
+                self._total_bytes -= entry.size
+                return None
+            self._entries.move_to_end(name)
+            entry.pins += 1
+            return entry
+
+    def _evict_if_needed(self):
+        # gọi khi đang giữ self._lock; bỏ qua entry đang pin (còn người đọc)
+        if self._total_bytes <= self.max_bytes:
+            return
+        for name in [n for n, e in self._entries.items() if e.pins == 0]:
+            if self._total_bytes <= self.max_bytes or len(self._entries) <= 1:
+                break
+            entry = self._entries.pop(name)
+            self._total_bytes -= entry.size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(entry.path)
+            except OSError:
+                # File đang mở (Windows) -> bỏ qua, lần nạp sau sẽ tính lại
+                pass
+
+    def release(self, entry: Optional[CachedObject]):
+        """Bỏ pin của 1 lần get() (gọi đúng 1 lần khi đã đọc xong file)."""
+        if entry is None:
+            return
+        with self._lock:
+            entry.pins = max(0, entry.pins - 1)
+            if entry.pins == 0:
+                self._evict_if_needed()
+
+    def _cacheable(self, size: int) -> bool:
+        return size <= self.max_bytes * S3_DISK_CACHE_MAX_OBJECT_RATIO
+
+    # ------------------------------------------------------------------
+    def lookup(self, s3, bucket: str, key: str) -> Optional[CachedObject]:
+        """
+        Entry đã có trên đĩa (đã pin, caller phải release); None nếu chưa có - không tải.
+        Dùng cho /raw: miss thì stream thẳng từ S3 thay vì chờ tải cả file.
+        """
+        if not S3_DISK_CACHE_ENABLED or not bucket or not key:
+            return None
+        try:
+            self._ensure_loaded()
+            etag, _, content_type, _ = self._head(s3, bucket, key)
+            entry = self._touch(self._entry_name(bucket, key, etag))
+            if entry is not None:
+                entry.content_type = content_type
+                entry.etag = etag
+                self.stats["hits"] += 1
+            return entry
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[S3Cache] Lỗi tra {bucket}/{key}: {e}")
+            return None
+
+    def fill_async(self, s3, bucket: str, key: str):
+        """Tải object vào cache ở nền (bỏ qua nếu đang tải hoặc đang chờ tải)."""
+        if not S3_DISK_CACHE_ENABLED or not bucket or not key:
+            return
+        ident = f"{bucket}/{key}"
+        with self._lock:
+            if ident in self._pending_fills:
+                return
+            self._pending_fills.add(ident)
+            if self._fill_pool is None:
+                self._fill_pool = ThreadPoolExecutor(max_workers=max(1, S3_DISK_CACHE_FILL_WORKERS),
+                                                     thread_name_prefix="s3-cache-fill")
+            self.stats["async_fills"] += 1
+
+        def run():
+            try:
+                self.release(self.get(s3, bucket, key))
+            finally:
+                with self._lock:
+                    self._pending_fills.discard(ident)
+
+        self._fill_pool.submit(run)
+
+    def get(self, s3, bucket: str, key: str) -> Optional[CachedObject]:
+        """
+        Trả CachedObject (file cục bộ) cho object S3; tải về nếu chưa có.
+        Entry trả về đã được pin (không bị evict): caller phải gọi release(entry) khi đọc xong.
+        s3: AwsService (dùng client/connection pool chung).
+        Trả None nếu cache bị tắt, object quá lớn để cache, hoặc lỗi (caller tự fallback).
+        """
+        if not S3_DISK_CACHE_ENABLED or not bucket or not key:
+            return None
+        try:
+            self._ensure_loaded()
+            etag, size, content_type, _ = self._head(s3, bucket, key)
+            name = self._entry_name(bucket, key, etag)
+            if not self._cacheable(size):
+                self.stats["skipped_large"] += 1
+                return None
+
+            entry = self._touch(name)
+            if entry is not None:
+                entry.content_type = content_type
+                entry.etag = etag
+                self.stats["hits"] += 1
+                return entry
+
+            # Một khoá cho mỗi object: chỉ 1 luồng tải, các luồng khác chờ
+            with self._lock:
+                fill_lock = self._fill_locks.setdefault(name, threading.Lock())
+            if fill_lock.locked():
+                self.stats["fill_waits"] += 1
+            with fill_lock:
+                try:
+                    entry = self._touch(name)
+                    if entry is not None:
+                        entry.content_type = content_type
+                        entry.etag = etag
+                        self.stats["hits"] += 1
+                        return entry
+
+                    self.stats["misses"] += 1
+                    path = os.path.join(self.cache_dir, name)
+                    tmp_path = f"{path}.{threading.get_ident()}.part"
+                    try:
+                        s3.download_to_path(key, tmp_path, bucket=bucket)
+                        os.replace(tmp_path, path)
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                    size = os.path.getsize(path)
+                    entry = CachedObject(path, size, content_type, etag)
+                    entry.pins = 1
+                    with self._lock:
+                        self._entries[name] = entry
+                        self._total_bytes += size
+                        self.stats["fills"] += 1
+                        self._evict_if_needed()
+                    return entry
+                finally:
+                    # Bỏ khoá chỉ sau khi entry đã vào _entries: luồng đến sau sẽ hit thay vì tải lại
+                    with self._lock:
+                        if self._fill_locks.get(name) is fill_lock:
+                            del self._fill_locks[name]
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"[S3Cache] Lỗi lấy {bucket}/{key}: {e}")
+            return None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hitRatio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "pinned": sum(1 for e in self._entries.values() if e.pins),
+                "heads": len(self._heads),
+                "pendingFills": len(self._pending_fills),
+                "bytes": self._total_bytes,
+                "maxBytes": self.max_bytes,
+            }
+
+    def clear(self):
+        """Xoá mọi entry không còn người đọc (entry đang pin giữ lại)."""
+        with self._lock:
+            for name, entry in list(self._entries.items()):
+                if entry.pins:
+                    continue
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                del self._entries[name]
+                self._total_bytes -= entry.size
+            self._heads.clear()
+
+
+# Global cache instance
+s3_object_cache = S3ObjectCache()
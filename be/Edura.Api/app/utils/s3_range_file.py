@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+File-like (read/seek/tell) đọc object S3 bằng ranged GET, có cache theo block.
+Dùng cho reader PDF đọc lười (pdfium/pdfminer): chỉ tải xref + các trang thực sự
+đọc tới thay vì tải nguyên file 100MB để lấy text 6 trang đầu và ảnh trang 1.
+"""
+
+import ctypes
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+S3_RANGE_BLOCK_KB = int(os.getenv("S3_RANGE_BLOCK_KB", "256"))
+# Số block giữ trong RAM cho mỗi file (256KB x 64 = 16MB)
+S3_RANGE_MAX_BLOCKS = int(os.getenv("S3_RANGE_MAX_BLOCKS", "64"))
+# Đọc lười chỉ đáng khi file đủ lớn; file nhỏ tải 1 lần nhanh hơn
+S3_RANGE_MIN_MB = float(os.getenv("S3_RANGE_MIN_MB", "8"))
+# Tail đọc sẵn khi mở (trailer + xref nằm ở cuối PDF)
+_TAIL_PREFETCH = 64 * 1024
+# PDFium không thread-safe: mọi lời gọi pypdfium2 (mở, load trang, trích text, render, close)
+# trong process đi qua 1 lock (request Flask, _bg_enrich, worker của scripts/reenrich.py).
+# Lock không giữ qua ranged GET: FPDFAvail cho biết khoảng byte còn thiếu, tải ngoài lock,
+# rồi mới gọi pdfium (lúc đó đọc từ cache block).
+_PDFIUM_LOCK = threading.Lock()
+# Số vòng hỏi-tải tối đa trước khi để pdfium tự đọc S3 (trong lock)
+PDFIUM_AVAIL_ROUNDS = int(os.getenv("PDFIUM_AVAIL_ROUNDS", "32"))
+
+
+class S3RangeFile(io.RawIOBase):
+    """Đọc object S3 theo khoảng byte, gom các block thiếu liền nhau thành 1 request."""
+
+    def __init__(self, s3, key: str, bucket: Optional[str] = None, size: Optional[int] = None,
+                 block_size: int = S3_RANGE_BLOCK_KB * 1024, max_blocks: int = S3_RANGE_MAX_BLOCKS):
+        super().__init__()
+        self._s3 = s3
+        self.key = key
+        self.bucket = bucket
+        self.size = size if size is not None else int(s3.head_object(key, bucket=bucket).get("ContentLength", 0))
+        self.block_size = block_size
+        self.max_blocks = max(4, max_blocks)
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pos = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    # io.RawIOBase ------------------------------------------------------
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"whence không hợp lệ: {whence}")
+        self._pos = max(0, pos)
+        return self._pos
+
+    def read(self, n: int = -1) -> bytes:
+        if self._pos >= self.size:
+            return b""
+        if n is None or n < 0:
+            n = self.size - self._pos
+        data = self.pread(self._pos, n)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    # ------------------------------------------------------------------
+    def pread(self, offset: int, n: int) -> bytes:
+        """Đọc n byte tại offset (không đổi vị trí hiện tại)."""
+        end = min(self.size, offset + n)
+        if offset >= end:
+            return b""
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        if last - first + 1 > self.max_blocks:
+            # Đọc lớn hơn cả cache -> lấy thẳng, không làm trôi các block đang dùng
+            self.requests += 1
+            data = self._s3.get_range(self.key, offset, end - 1, bucket=self.bucket)
+            self.bytes_fetched += len(data)
+            return data
+        with self._lock:
+            self._ensure_blocks(first, last)
+            parts = [self._blocks[i] for i in range(first, last + 1)]
+            for i in range(first, last + 1):
+                self._blocks.move_to_end(i)
+        buf = b"".join(parts)
+        start = offset - first * self.block_size
+        return buf[start:start + (end - offset)]
+
+    def has(self, offset: int, n: int) -> bool:
+        """Khoảng [offset, offset+n) đã nằm trong cache block chưa."""
+        end = min(self.size, offset + n)
+        if offset >= end:
+            return True
+        with self._lock:
+            return all(i in self._blocks for i in range(offset // self.block_size, (end - 1) // self.block_size + 1))
+
+    def fetch_segments(self, segments) -> bool:
+        """
+        Tải các khoảng (offset, n) vào cache, gom block thiếu liền nhau thành 1 request.
+        False nếu tổng số block cần giữ lớn hơn cache (phần còn lại để pdfium tự đọc).
+        """
+        blocks = set()
+        for offset, n in segments:
+            end = min(self.size, offset + n)
+            if offset < end:
+                blocks.update(range(offset // self.block_size, (end - 1) // self.block_size + 1))
+        if len(blocks) > self.max_blocks:
+            return False
+        with self._lock:
+            for first, last in _runs(sorted(blocks)):
+                self._ensure_blocks(first, last)
+        return True
+
+    def prefetch_tail(self, nbytes: int = _TAIL_PREFETCH):
+        """Đọc sẵn phần cuối file (trailer/xref) bằng 1 request."""
+        if self.size:
+            self.pread(max(0, self.size - nbytes), nbytes)
+
+    def _ensure_blocks(self, first: int, last: int):
+        # gọi khi đang giữ self._lock
+        i = first
+        while i <= last:
+            if i in self._blocks:
+                self._blocks.move_to_end(i)
+                i += 1
+                continue
+            run_start = i
+            while i <= last and i not in self._blocks:
+                i += 1
+            self._fetch_run(run_start, i - 1)
+
+    def _fetch_run(self, first: int, last: int):
+        start = first * self.block_size
+        end = min(self.size, (last + 1) * self.block_size) - 1
+        data = self._s3.get_range(self.key, start, end, bucket=self.bucket)
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        for i in range(first, last + 1):
+            off = (i - first) * self.block_size
+            self._blocks[i] = data[off:off + self.block_size]
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        return {
+            "size": self.size,
+            "requests": self.requests,
+            "bytesFetched": self.bytes_fetched,
+            "fraction": round(self.bytes_fetched / self.size, 4) if self.size else 0.0,
+        }
+
+
+def _runs(indices):
+    """[1, 2, 3, 7, 8] -> [(1, 3), (7, 8)]"""
+    runs = []
+    for i in indices:
+        if runs and runs[-1][1] == i - 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return [tuple(r) for r in runs]
+
+
+class _LazyPdfPage:
+    """Trang của LazyPdfDocument; mỗi thao tác chờ dữ liệu trang rồi mở trang pdfium trong lock."""
+
+    def __init__(self, doc: "LazyPdfDocument", index: int):
+        self._doc = doc
+        self.index = index
+
+    def get_text(self, kind: str = "text") -> str:
+        def run(page):
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range() or ""
+            finally:
+                textpage.close()
+        return self._doc._on_page(self.index, run)
+
+    def render(self, target_width: int):
+        """Render trang thành PIL.Image rộng ~target_width px."""
+        def run(page):
+            scale = min(3.0, target_width / (page.get_width() or 1))
+            bitmap = page.render(scale=scale)
+            try:
+                return bitmap.to_pil()
+            finally:
+                bitmap.close()
+        return self._doc._on_page(self.index, run)
+
+    def close(self):
+        pass
+
+
+class LazyPdfDocument:
+    """
+    PDF mở bằng pdfium trên S3RangeFile (pdfium tự đọc theo offset khi cần).
+    API tối thiểu giống fitz.Document: page_count, load_page(i).get_text("text"), close().
+    Trước mỗi thao tác, FPDFAvail (IsDocAvail / IsPageAvail: xref, cây trang, content,
+    font, ảnh) báo các khoảng byte còn thiếu -> tải ngoài _PDFIUM_LOCK; thao tác pdfium
+    chạy trong lock sau đó chỉ còn đọc từ cache block. Document của FPDFAvail chỉ dùng để
+    hỏi (nó từ chối đọc dữ liệu chưa có); thao tác chạy trên document thường cùng source,
+    nên nếu trang cần nhiều hơn cache thì pdfium vẫn tự đọc được phần thiếu.
+    """
+
+    def __init__(self, source: S3RangeFile):
+        import pypdfium2 as pdfium
+        import pypdfium2.raw as pdfium_c
+
+        self._c = pdfium_c
+        self.source = source
+        self._segments = []
+
+        def get_block(_param, position, p_buf, size):
+            data = source.pread(position, size)
+            ctypes.memmove(p_buf, data, len(data))
+            return int(len(data) == size)
+
+        def is_data_avail(_avail, offset, size):
+            return source.has(offset, size)
+
+        def add_segment(_hints, offset, size):
+            self._segments.append((offset, size))
+
+        self._access = pdfium_c.FPDF_FILEACCESS()
+        self._access.m_FileLen = source.size
+        self._access.m_GetBlock = type(self._access.m_GetBlock)(get_block)
+        self._access.m_Param = None
+        self._file_avail = pdfium_c.FX_FILEAVAIL(version=1)
+        self._file_avail.IsDataAvail = type(self._file_avail.IsDataAvail)(is_data_avail)
+        self._hints = pdfium_c.FX_DOWNLOADHINTS(version=1)
+        self._hints.AddSegment = type(self._hints.AddSegment)(add_segment)
+
+        self._pdf = None
+        self._avail_doc = None
+        with _PDFIUM_LOCK:
+            self._avail = pdfium_c.FPDFAvail_Create(ctypes.byref(self._file_avail), ctypes.byref(self._access))
+        try:
+            self._wait(lambda hints: pdfium_c.FPDFAvail_IsDocAvail(self._avail, hints))
+            with _PDFIUM_LOCK:
+                self._avail_doc = pdfium_c.FPDFAvail_GetDocument(self._avail, None) or None
+                self._pdf = pdfium.PdfDocument(source, autoclose=False)
+                self.page_count = len(self._pdf)
+        except Exception:
+            self.close()
+            raise
+
+    def _wait(self, check):
+        """Hỏi pdfium còn thiếu khoảng nào (trong lock), tải ngoài lock; lặp tới khi đủ."""
+        for _ in range(PDFIUM_AVAIL_ROUNDS):
+            with _PDFIUM_LOCK:
+                self._segments = []
+                status = check(ctypes.byref(self._hints))
+                segments = self._segments
+            if status != self._c.PDF_DATA_NOTAVAIL:
+                return
+            # Không có gợi ý, hoặc cần nhiều hơn cache: để pdfium tự đọc
+            if not segments or not self.source.fetch_segments(segments):
+                return
+
+    def _on_page(self, index: int, fn):
+        if self._avail_doc is not None:
+            self._wait(lambda hints: self._c.FPDFAvail_IsPageAvail(self._avail, index, hints))
+        with _PDFIUM_LOCK:
+            page = self._pdf[index]
+            try:
+                return fn(page)
+            finally:
+                page.close()
+
+    def load_page(self, index: int) -> _LazyPdfPage:
+        if not 0 <= index < self.page_count:
+            raise IndexError(f"Trang {index} ngoài phạm vi (0..{self.page_count - 1})")
+        return _LazyPdfPage(self, index)
+
+    def close(self):
+        with _PDFIUM_LOCK:
+            if self._pdf is not None:
+                try:
+                    self._pdf.close()
+                except Exception:
+                    pass
+                self._pdf = None
+            # Document lấy từ FPDFAvail phải đóng trước khi huỷ avail
+            if self._avail_doc is not None:
+                self._c.FPDF_CloseDocument(self._avail_doc)
+                self._avail_doc = None
+            if self._avail:
+                self._c.FPDFAvail_Destroy(self._avail)
+                self._avail = None
+
+
+def open_lazy_pdf(source: S3RangeFile) -> Optional[LazyPdfDocument]:
+    """Mở PDF đọc lười; None nếu thiếu pypdfium2 hoặc file lỗi (caller tải cả file)."""
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        source.prefetch_tail()
+        return LazyPdfDocument(source)
+    except Exception as e:
+        print(f"[S3Range] Không mở được PDF đọc lười {source.key}: {e}")
+        return None
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Chia văn bản thành các chunk theo ngân sách token cho tóm tắt AI.
+- Ước lượng token (không gọi API)
+- Bỏ header/footer lặp lại giữa các trang (chỉ xét vài dòng đầu/cuối mỗi trang, tách bằng \f)
+- Tách theo tiêu đề -> đoạn -> câu, chỉ cắt cứng khi một câu vượt ngân sách
+- Gom các phần nhỏ lại để mỗi chunk gần đầy ngân sách (ít lần gọi API hơn)
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from typing import List
+
+# Tiếng Việt có dấu tách token kém hơn tiếng Anh -> ~3.5 ký tự/token
+CHARS_PER_TOKEN = float(os.getenv("AI_CHARS_PER_TOKEN", "3.5"))
+# Ngân sách token cho mỗi lần gọi tóm tắt
+AI_CHUNK_TOKEN_BUDGET = int(os.getenv("AI_CHUNK_TOKEN_BUDGET", "30000"))
+
+_HEADING_RE = re.compile(
+    r"^\s*(?:"
+    r"(?:chương|chuong|chapter|phần|phan|part|mục|muc|bài|bai|section)\s+[\dIVXLC]+"  # Chương 1, Phần II
+    r"|\d+(?:\.\d+){0,3}\.?\s+\S"                                                   # 1. / 1.2 / 1.2.3 Tiêu đề
+    r"|[IVXLC]+\.\s+\S"                                                             # II. Tiêu đề
+    r")",
+    re.IGNORECASE,
+)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…;:])\s+")
+_DIGITS_RE = re.compile(r"\d+")
+# Ngắt trang giữa text các trang (để strip_repeated_lines nhận ra đầu/cuối trang)
+PAGE_BREAK = "\f"
+# Số dòng (khác rỗng) đầu/cuối mỗi trang được xem là ứng viên header/footer
+EDGE_LINES = 3
+# Ngăn cách các đơn vị trong 1 chunk
+_CHUNK_SEP = "\n\n"
+
+
+def _tokens_for_chars(n: int) -> int:
+    return int(n / CHARS_PER_TOKEN) + 1 if n else 0
+
+
+def _max_chars(budget: int) -> int:
+    """Số ký tự lớn nhất mà estimate_tokens vẫn <= budget."""
+    return max(1, math.ceil(budget * CHARS_PER_TOKEN) - 1)
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng số token theo số ký tự (đủ chính xác để chia chunk)."""
+    return _tokens_for_chars(len(text or ""))
+
+
+def _is_heading(line: str) -> bool:
+    s = line.strip()
+    if not s or len(s) > 120:
+        return False
+    if _HEADING_RE.match(s):
+        return True
+    letters = [c for c in s if c.isalpha()]
+    # Dòng ngắn viết HOA toàn bộ -> thường là tiêu đề
+    return len(letters) >= 4 and len(s) <= 80 and all(c.isupper() for c in letters)
+
+
+def join_pages(pages: List[str]) -> str:
+    """Ghép text các trang, giữ ranh giới trang bằng PAGE_BREAK."""
+    return PAGE_BREAK.join(pages)
+
+
+def _edge_positions(lines: List[str]) -> dict:
+    """{chỉ số dòng: vị trí} cho EDGE_LINES dòng khác rỗng đầu ("top", k) và cuối ("bottom", k) trang."""
+    filled = [i for i, ln in enumerate(lines) if ln.strip()]
+    positions = {i: ("bottom", k) for k, i in enumerate(reversed(filled[-EDGE_LINES:]))}
+    positions.update({i: ("top", k) for k, i in enumerate(filled[:EDGE_LINES])})
+    return positions
+
+
+def strip_repeated_lines(text: str, min_repeats: int = 3, min_page_ratio: float = 0.4) -> str:
+    """
+    Bỏ header/footer lặp lại giữa các trang (vd: tên trường, "Trang 12").
+    Chỉ xét EDGE_LINES dòng đầu/cuối mỗi trang (text tách trang bằng PAGE_BREAK): dòng (so khớp sau
+    khi thay chữ số bằng '#') cùng vị trí trên >= min_repeats trang và >= min_page_ratio số trang
+    bị bỏ, giữ lần xuất hiện đầu tiên. Dòng là tiêu đề (Chương 2, Bài 3...) không bao giờ bị bỏ.
+    Kết quả không còn PAGE_BREAK (thay bằng xuống dòng).
+    """
+    if not text:
+        return ""
+    pages = [page.split("\n") for page in text.split(PAGE_BREAK)]
+    threshold = max(min_repeats, int(len(pages) * min_page_ratio + 0.999))
+    if len(pages) < threshold:
+        return text.replace(PAGE_BREAK, "\n")
+
+    def key(line: str) -> str:
+        return _DIGITS_RE.sub("#", line.strip().lower())
+
+    # Mỗi trang: {chỉ số dòng: (vị trí, khoá)} của các dòng ứng viên
+    candidates = [
+        {i: (pos, key(lines[i])) for i, pos in _edge_positions(lines).items()
+         if len(lines[i].strip()) <= 100 and not _is_heading(lines[i])}
+        for lines in pages
+    ]
+    counts = Counter(cand for page in candidates for cand in set(page.values()))
+    repeated = {cand for cand, c in counts.items() if c >= threshold}
+    if not repeated:
+        return text.replace(PAGE_BREAK, "\n")
+
+    seen = set()
+    out = []
+    for lines, page in zip(pages, candidates):
+        for i, ln in enumerate(lines):
+            cand = page.get(i)
+            if cand in repeated:
+                if cand in seen:
+                    continue
+                seen.add(cand)
+            out.append(ln)
+    return "\n".join(out)
+
+
+def _split_units(text: str, budget: int) -> List[tuple]:
+    """Tách văn bản thành các đơn vị (is_heading, text), mỗi đơn vị <= budget token."""
+    units = []
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        lines = para.split("\n")
+        # Tiêu đề nằm ở dòng đầu đoạn -> tách riêng để chunk mới có thể bắt đầu tại đây
+        if _is_heading(lines[0]):
+            units.append((True, lines[0].strip()))
+            para = "\n".join(lines[1:]).strip()
+            if not para:
+                continue
+        if estimate_tokens(para) <= budget:
+            units.append((False, para))
+            continue
+        # Đoạn quá dài -> tách câu; câu quá dài -> cắt cứng
+        max_chars = _max_chars(budget)
+        for sent in _SENTENCE_SPLIT_RE.split(para):
+            while len(sent) > max_chars:
+                units.append((False, sent[:max_chars]))
+                sent = sent[max_chars:]
+            if sent.strip():
+                units.append((False, sent.strip()))
+    return units
+
+
+def chunk_text(text: str, token_budget: int = None) -> List[str]:
+    """
+    Chia text thành các chunk <= token_budget (ước lượng), ưu tiên ranh giới
+    tiêu đề/đoạn/câu và gom đầy ngân sách.
+    Header/footer phải được bỏ trước bằng strip_repeated_lines (xem ai_service).
+    """
+    budget = token_budget or AI_CHUNK_TOKEN_BUDGET
+    units = _split_units(text or "", budget)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_chars = 0
+    for is_heading, unit in units:
+        # Đo trên độ dài sau khi ghép (kể cả ngăn cách) để chunk không vượt ngân sách
+        merged = current_chars + len(_CHUNK_SEP) + len(unit) if current else len(unit)
+        # Sang chunk mới khi vượt ngân sách, hoặc gặp tiêu đề mà chunk hiện tại đã đầy quá nửa
+        if current and (_tokens_for_chars(merged) > budget
+                        or (is_heading and _tokens_for_chars(current_chars) >= budget * 0.5)):
+            chunks.append(_CHUNK_SEP.join(current))
+            current, merged = [], len(unit)
+        current.append(unit)
+        current_chars = merged
+    if current:
+        chunks.append(_CHUNK_SEP.join(current))
+    return chunks
+
+
+def truncate_to_token_budget(text: str, token_budget: int = None) -> str:
+    """Cắt text về ngân sách token, ưu tiên cắt ở cuối câu."""
+    budget = token_budget or AI_CHUNK_TOKEN_BUDGET
+    if estimate_tokens(text) <= budget:
+        return text
+    max_chars = _max_chars(budget)
+    cut = text[:max_chars]
+    last_stop = max(cut.rfind(". "), cut.rfind("\n"))
+    if last_stop > max_chars * 0.8:
+        cut = cut[:last_stop + 1]
+    return cut
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Spool file upload ra đĩa thay vì đọc cả file vào RAM.
+- Copy stream theo chunk vào SpooledTemporaryFile, đồng thời tính sha256 và
+  nhận diện định dạng từ magic bytes (không cần đọc lại file).
+- Upload S3 bằng chính file handle (boto3 multipart theo chunk).
+- Phân tích (PyMuPDF, docx) qua mmap -> trang nào đọc tới mới nạp vào RAM.
+"""
+
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, List, Optional
+
+# Dưới ngưỡng này giữ trong RAM, lớn hơn thì ghi ra đĩa (MB)
+UPLOAD_SPOOL_MEMORY_MB = int(os.getenv("UPLOAD_SPOOL_MEMORY_MB", "2"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_MAGIC = (
+    (b"%PDF-", "pdf"),
+    (b"PK\x03\x04", "docx"),  # OOXML là file zip
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "doc"),  # OLE2 (Word 97-2003)
+)
+
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """Nhận diện pdf/docx/doc từ vài byte đầu; None nếu không rõ."""
+    # Một số PDF có rác trước header, chuẩn cho phép trong 1KB đầu
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    for magic, kind in _MAGIC[1:]:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadSpool:
+    """File upload đã spool + hash + kiểu nhận diện, kèm các mmap cần giải phóng."""
+
+    def __init__(self, max_memory: int = UPLOAD_SPOOL_MEMORY_MB * 1024 * 1024):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory, prefix="upload_")
+        self.size = 0
+        self.head = b""
+        self._sha = hashlib.sha256()
+        self._maps: List[tuple] = []  # (file, mmap, memoryview)
+
+    @classmethod
+    def from_stream(cls, stream: BinaryIO, max_bytes: int = None) -> "UploadSpool":
+        spool = cls()
+        try:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.size += len(chunk)
+                if max_bytes and spool.size > max_bytes:
+                    raise UploadTooLarge(f"File vượt quá {max_bytes // (1024 * 1024)}MB")
+                if len(spool.head) < 1024:
+                    spool.head += chunk[:1024 - len(spool.head)]
+                spool._sha.update(chunk)
+                spool.file.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+        spool.file.flush()
+        return spool
+
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    @property
+    def kind(self) -> Optional[str]:
+        return sniff_kind(self.head)
+
+    def rewind(self) -> BinaryIO:
+        """File handle ở đầu file (dùng cho upload_fileobj)."""
+        self.file.seek(0)
+        return self.file
+
+    def copy_to_path(self, path: str) -> str:
+        """Ghi ra file có tên (cho công cụ ngoài như LibreOffice)."""
+        self.file.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(self.file, out, UPLOAD_CHUNK_SIZE)
+        return path
+
+    def _map_fileobj(self, fileobj, owner=None) -> memoryview:
+        if os.fstat(fileobj.fileno()).st_size == 0:
+            if owner is not None:
+                owner.close()
+            return memoryview(b"")
+        mm = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        self._maps.append((owner, mm, view))
+        return view
+
+    def map(self) -> memoryview:
+        """memoryview chỉ đọc trên nội dung upload (mmap, không copy)."""
+        # mmap cần file thật trên đĩa
+        self.file.rollover()
+        self.file.flush()
+        return self._map_fileobj(self.file)
+
+    def map_path(self, path: str) -> memoryview:
+        """mmap thêm 1 file (vd: PDF sau khi convert), giải phóng cùng lúc với spool."""
+        f = open(path, "rb")
+        try:
+            return self._map_fileobj(f, owner=f)
+        except Exception:
+            f.close()
+            raise
+
+    def close(self):
+        for f, mm, view in self._maps:
+            try:
+                view.release()
+                mm.close()
+            except (BufferError, ValueError):
+                # Còn đối tượng (vd: fitz.Document) giữ buffer -> để GC giải phóng
+                pass
+            if f is not None:
+                f.close()
+        self._maps.clear()
+        try:
+            self.file.close()
+        except Exception:
+            pass
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Migrate collection documents về schema chuẩn (app/utils/document_schema.py):
+schoolId/categoryId/userId kiểu ObjectId, createdAt, s3_url, pages, schemaVersion.
+
+- Duyệt theo _id từng lô, ghi bằng bulk_write; lastId lưu trong job_checkpoints
+  nên dừng giữa chừng chạy lại sẽ tiếp tục.
+- Mặc định GIỮ trường cũ (school_id, created_at, ...) để bản app cũ vẫn đọc được;
+  chạy lại với --drop-legacy sau khi đã deploy xong để xoá hẳn.
+- Khi không còn document nào chưa chuẩn: đánh dấu hoàn tất -> app tự chuyển sang
+  query 1 field (DOCUMENT_SCHEMA_CANONICAL=auto).
+
+Usage:
+    python scripts/migrate_document_schema.py
+    python scripts/migrate_document_schema.py --drop-legacy --reset
+    python scripts/migrate_document_schema.py --dry-run
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import UpdateOne
+
+from app.services.mongo_service import mongo_collections
+from app.utils.document_schema import (
+    DOCUMENT_SCHEMA_VERSION,
+    LEGACY_FIELDS,
+    SCHEMA_MIGRATION_JOB,
+    canonicalize,
+)
+
+
+def _checkpoint(reset: bool) -> dict:
+    key = {"job": SCHEMA_MIGRATION_JOB, "range": 0}
+    if reset:
+        mongo_collections.job_checkpoints.delete_one(key)
+    now = datetime.utcnow()
+    mongo_collections.job_checkpoints.update_one(
+        key,
+        {"$setOnInsert": {"lastId": None, "done": False, "processed": 0, "createdAt": now}},
+        upsert=True,
+    )
+    return mongo_collections.job_checkpoints.find_one(key)
+
+
+def _remaining_query(drop_legacy: bool) -> dict:
+    """Document còn cần migrate (chưa đúng version, hoặc còn trường cũ khi --drop-legacy)."""
+    ors = [{"schemaVersion": {"$ne": DOCUMENT_SCHEMA_VERSION}}]
+    if drop_legacy:
+        ors += [{legacy: {"$exists": True}} for legacy in LEGACY_FIELDS.values()]
+    return {"$or": ors}
+
+
+def migrate(batch_size: int = 500, drop_legacy: bool = False, dry_run: bool = False, reset: bool = False):
+    checkpoint = _checkpoint(reset and not dry_run)
+    last_id = checkpoint.get("lastId")
+    total = mongo_collections.documents.count_documents(_remaining_query(drop_legacy))
+    print(f"Còn {total} documents cần migrate (schemaVersion={DOCUMENT_SCHEMA_VERSION}"
+          f"{', xoá trường cũ' if drop_legacy else ''}{', DRY RUN' if dry_run else ''})")
+    if last_id is not None:
+        print(f"Tiếp tục từ _id > {last_id}")
+
+    started = time.time()
+    scanned = changed = 0
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(mongo_collections.documents.find(query).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            to_set, to_unset = canonicalize(doc, drop_legacy=drop_legacy)
+            update = {}
+            if to_set:
+                update["$set"] = to_set
+            if to_unset:
+                update["$unset"] = to_unset
+            if update:
+                ops.append(UpdateOne({"_id": doc["_id"]}, update))
+        last_id = batch[-1]["_id"]
+        scanned += len(batch)
+        changed += len(ops)
+
+        if not dry_run:
+            if ops:
+                mongo_collections.documents.bulk_write(ops, ordered=False)
+            mongo_collections.job_checkpoints.update_one(
+                {"_id": checkpoint["_id"]},
+                {"$set": {"lastId": last_id, "updatedAt": datetime.utcnow()}, "$inc": {"processed": len(ops)}},
+            )
+        rate = scanned / max(time.time() - started, 1e-6)
+        print(f"Đã quét {scanned}, cập nhật {changed} ({rate:.0f} docs/s)")
+
+    if dry_run:
+        print(f"DRY RUN: {changed}/{scanned} documents sẽ được cập nhật.")
+        return
+
+    remaining = mongo_collections.documents.count_documents(_remaining_query(drop_legacy))
+    if remaining:
+        # Có document mới ghi theo schema cũ trong lúc chạy -> lần sau quét lại từ đầu
+        mongo_collections.job_checkpoints.update_one(
+            {"_id": checkpoint["_id"]}, {"$set": {"lastId": None, "done": False}}
+        )
+        print(f"Còn {remaining} documents chưa chuẩn, chạy lại script để xử lý nốt.")
+        return
+    mongo_collections.job_checkpoints.update_one(
+        {"_id": checkpoint["_id"]},
+        {"$set": {"done": True, "lastId": None, "dropLegacy": drop_legacy, "finishedAt": datetime.utcnow()}},
+    )
+    print(f"Hoàn thành! Đã cập nhật {changed} documents. Query chuẩn sẽ bật trong vòng 1 phút.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate documents về schema chuẩn")
+    parser.add_argument("--batch-size", type=int, default=500, help="Số documents mỗi lô bulk_write")
+    parser.add_argument("--drop-legacy", action="store_true", help="Xoá trường cũ (school_id, created_at, ...)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm, không ghi")
+    parser.add_argument("--reset", action="store_true", help="Bỏ checkpoint, quét lại từ đầu")
+    args = parser.parse_args()
+    try:
+        migrate(args.batch_size, args.drop_legacy, args.dry_run, args.reset)
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
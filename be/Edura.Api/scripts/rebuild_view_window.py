@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tính lại documents.viewsWeek (lượt xem trong VIEW_WINDOW_DAYS ngày gần nhất)
+từ collection document_view_buckets. Dùng khi nghi ngờ lệch (vd roll cửa sổ bị gián đoạn).
+
+Usage:
+    python scripts/rebuild_view_window.py
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.view_stats import view_stats, VIEW_WINDOW_DAYS
+
+if __name__ == "__main__":
+    try:
+        print(f"Đang tính lại viewsWeek (cửa sổ {VIEW_WINDOW_DAYS} ngày)...")
+        result = view_stats.rebuild_window()
+        print(f"Hoàn thành! {result['documents']} tài liệu có lượt xem trong cửa sổ, cập nhật {result['updated']} tài liệu.")
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
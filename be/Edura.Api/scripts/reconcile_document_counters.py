@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Đếm lại likes/dislikes/commentCount trên documents từ document_reactions/document_comments
+và sửa các document bị lệch (lần đầu chạy = backfill cho tài liệu cũ chưa có bộ đếm).
+
+Usage:
+    python scripts/reconcile_document_counters.py
+    python scripts/reconcile_document_counters.py --dry-run --batch-size 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.mongo_service import mongo_collections
+from app.services.document_counters import document_counters
+
+
+def reconcile_all(batch_size: int = 500, dry_run: bool = False):
+    total = mongo_collections.documents.estimated_document_count()
+    print(f"Đang kiểm tra bộ đếm của ~{total} documents{' (DRY RUN)' if dry_run else ''}...")
+
+    started = time.time()
+    checked = fixed = 0
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        ids = [d["_id"] for d in mongo_collections.documents.find(query, {"_id": 1})
+               .sort("_id", 1).limit(batch_size)]
+        if not ids:
+            break
+        result = document_counters.reconcile(ids, dry_run=dry_run)
+        checked += result["checked"]
+        fixed += result["fixed"]
+        last_id = ids[-1]
+        print(f"Đã kiểm tra {checked}/{total}, lệch {fixed} ({checked / max(time.time() - started, 1e-6):.0f} docs/s)")
+
+    action = "cần sửa" if dry_run else "đã sửa"
+    print(f"Hoàn thành! Kiểm tra {checked} documents, {action} {fixed}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đối soát bộ đếm likes/dislikes/commentCount trên documents")
+    parser.add_argument("--batch-size", type=int, default=500, help="Số documents mỗi lô")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ báo số document lệch, không ghi")
+    args = parser.parse_args()
+    try:
+        reconcile_all(args.batch_size, args.dry_run)
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
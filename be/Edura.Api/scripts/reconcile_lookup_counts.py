@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Đếm lại documentCount của schools/categories từ documents và sửa bản ghi bị lệch
+(lần đầu chạy = backfill cho dữ liệu cũ). Nên chạy định kỳ (cron) để bắt lệch do lỗi ghi.
+
+Usage:
+    python scripts/reconcile_lookup_counts.py
+    python scripts/reconcile_lookup_counts.py --kind schools --dry-run
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.lookup_counts import LOOKUP_REFS, lookup_counts
+
+
+def reconcile_all(kinds, dry_run: bool = False):
+    for kind in kinds:
+        started = time.time()
+        result = lookup_counts.reconcile(kind, dry_run=dry_run)
+        action = "cần sửa" if dry_run else f"đã sửa {result['fixed']}"
+        print(
+            f"{kind}: kiểm tra {result['checked']}, lệch {result['mismatched']} ({action}), "
+            f"{result['orphanDocuments']} tài liệu trỏ tới {kind} không tồn tại "
+            f"({time.time() - started:.1f}s)"
+        )
+    print("Hoàn thành!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đối soát documentCount trên schools/categories")
+    parser.add_argument("--kind", choices=sorted(LOOKUP_REFS), help="Chỉ đối soát 1 collection")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ báo số bản ghi lệch, không ghi")
+    args = parser.parse_args()
+    try:
+        reconcile_all([args.kind] if args.kind else list(LOOKUP_REFS), args.dry_run)
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Chạy lại enrichment (tóm tắt, keywords, số trang, thumbnail) cho tài liệu đã có.
+- Chia collection thành N khoảng _id ($bucketAuto), worker pool xử lý song song các khoảng.
+- Checkpoint lastId của từng khoảng trong Mongo (job_checkpoints): dừng giữa chừng,
+  chạy lại cùng --job sẽ tiếp tục từ chỗ cũ.
+- Gemini bị giới hạn request/phút (token bucket dùng chung cho mọi worker).
+- Kết quả ghi theo lô bằng bulk_write, in throughput + ETA định kỳ.
+- Gemini lỗi / hết quota: giữ nguyên summary/keywords/searchText cũ (không ghi đè bằng
+  tóm tắt cơ bản), tài liệu được tính lỗi và lưu vào failedIds để chạy lại sau.
+
+Usage:
+    python scripts/reenrich.py --workers 8 --gemini-rpm 120
+    python scripts/reenrich.py --job reenrich-thumbs --no-thumbnails
+    python scripts/reenrich.py --job reenrich-thumbs --reset     # bỏ checkpoint, chạy lại từ đầu
+    python scripts/reenrich.py --query '{"pages": null}'          # chỉ tài liệu thoả filter
+    python scripts/reenrich.py --dry-run                          # chỉ liệt kê/đếm, không S3/Gemini/ghi DB
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import json_util
+from pymongo import UpdateOne
+
+from app.services.mongo_service import mongo_collections
+from app.services.ai_service import gemini_rate_limiter
+from app.services.thumbnail_service import THUMB_PREFIX
+from app.controllers.documents import _build_enrichment
+
+PROJECTION = {"title": 1, "s3_url": 1, "s3Url": 1, "image_url": 1}
+# Ảnh bìa do chính pipeline sinh ra (không phải người dùng upload) -> render lại từ file gốc
+_GENERATED_IMAGE_MARKERS = (f"/{THUMB_PREFIX}/", "/images/auto_thumb_")
+# Số _id lỗi giữ lại trong checkpoint để xem lại
+MAX_FAILED_IDS = 500
+
+
+class Progress:
+    """Đếm tiến độ dùng chung giữa các worker, in throughput/ETA mỗi `every` giây."""
+
+    def __init__(self, total: int, every: float):
+        self.total = total
+        self.every = every
+        self.ok = 0
+        self.failed = 0
+        self.started = time.time()
+        self._last_print = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, ok: int, failed: int):
+        with self._lock:
+            self.ok += ok
+            self.failed += failed
+            if time.time() - self._last_print >= self.every:
+                self._last_print = time.time()
+                self.report()
+
+    def report(self, final: bool = False):
+        done = self.ok + self.failed
+        elapsed = max(time.time() - self.started, 1e-6)
+        rate = done / elapsed
+        remaining = max(self.total - done, 0)
+        eta = f"{remaining / rate / 60:.1f} phút" if rate > 0 else "?"
+        pct = 100.0 * done / self.total if self.total else 100.0
+        prefix = "Hoàn thành" if final else "Tiến độ"
+        print(f"[Reenrich] {prefix}: {done}/{self.total} ({pct:.1f}%) | lỗi {self.failed} | "
+              f"{rate:.2f} docs/s | {rate * 3600:.0f} docs/giờ | ETA {eta} | "
+              f"chờ rate limit Gemini {gemini_rate_limiter.waited_s:.0f}s")
+
+
+def _id_filter(base_query: dict, checkpoint: dict) -> dict:
+    """Filter phần còn lại của 1 khoảng: (lastId hoặc cận dưới, cận trên)."""
+    id_cond = {}
+    if checkpoint.get("lastId") is not None:
+        id_cond["$gt"] = checkpoint["lastId"]
+    elif checkpoint.get("lower") is not None:
+        id_cond["$gte"] = checkpoint["lower"]
+    if checkpoint.get("upper") is not None:
+        id_cond["$lt"] = checkpoint["upper"]
+    if not id_cond:
+        return base_query
+    if not base_query:
+        return {"_id": id_cond}
+    return {"$and": [base_query, {"_id": id_cond}]}
+
+
+def _plan_ranges(job: str, base_query: dict, n: int, reset: bool, dry_run: bool = False) -> list:
+    """
+    Lấy các khoảng đã checkpoint của job, hoặc chia mới thành n khoảng _id.
+    dry_run: không xoá/ghi checkpoint (--reset chỉ bỏ qua checkpoint cũ).
+    """
+    if reset and not dry_run:
+        mongo_collections.job_checkpoints.delete_many({"job": job})
+    existing = [] if reset else list(mongo_collections.job_checkpoints.find({"job": job}).sort("range", 1))
+    if existing:
+        pending = sum(1 for c in existing if not c.get("done"))
+        print(f"[Reenrich] Tiếp tục job '{job}': {pending}/{len(existing)} khoảng chưa xong")
+        return existing
+
+    buckets = list(mongo_collections.documents.aggregate([
+        {"$match": base_query},
+        {"$bucketAuto": {"groupBy": "$_id", "buckets": n}},
+    ], allowDiskUse=True))
+    # Khoảng đầu không có cận dưới, khoảng cuối không có cận trên (gồm cả tài liệu mới)
+    lowers = [None] + [b["_id"]["min"] for b in buckets[1:]]
+    now = datetime.utcnow()
+    checkpoints = []
+    for i, lower in enumerate(lowers):
+        checkpoints.append({
+            "job": job,
+            "range": i,
+            "lower": lower,
+            "upper": lowers[i + 1] if i + 1 < len(lowers) else None,
+            "lastId": None,
+            "done": False,
+            "processed": 0,
+            "failed": 0,
+            "failedIds": [],
+            "query": json_util.dumps(base_query),
+            "createdAt": now,
+            "updatedAt": now,
+        })
+    if dry_run:
+        return checkpoints
+    mongo_collections.job_checkpoints.insert_many(checkpoints)
+    print(f"[Reenrich] Job mới '{job}': chia thành {len(checkpoints)} khoảng _id")
+    return checkpoints
+
+
+def _user_image_url(doc: dict) -> str | None:
+    """Ảnh bìa người dùng upload (None nếu chưa có hoặc là ảnh pipeline tự sinh)."""
+    image_url = doc.get("image_url")
+    if image_url and any(m in image_url for m in _GENERATED_IMAGE_MARKERS):
+        return None
+    return image_url
+
+
+def _enrich_one(doc: dict, with_thumbnails: bool) -> dict | None:
+    s3_url = doc.get("s3_url") or doc.get("s3Url")
+    if not s3_url:
+        return None
+    image_url = _user_image_url(doc)
+    # fallback=False: AI lỗi thì không trả summary/keywords/searchText (giữ giá trị cũ)
+    return _build_enrichment(doc["_id"], s3_url, doc.get("title") or "", image_url,
+                             with_thumbnails=with_thumbnails, fallback=False)
+
+
+def _process_range(checkpoint: dict, base_query: dict, args, progress: Progress, stop: threading.Event):
+    """Xử lý tuần tự 1 khoảng _id theo lô; checkpoint sau mỗi lần bulk_write."""
+    while not stop.is_set():
+        batch = list(mongo_collections.documents.find(_id_filter(base_query, checkpoint), PROJECTION)
+                     .sort("_id", 1).limit(args.batch_size))
+        if not batch:
+            mongo_collections.job_checkpoints.update_one(
+                {"_id": checkpoint["_id"]},
+                {"$set": {"done": True, "updatedAt": datetime.utcnow()}}
+            )
+            return
+
+        ops, ok, failed_ids, last_id = [], 0, [], None
+        for doc in batch:
+            if stop.is_set():
+                break
+            try:
+                fields = _enrich_one(doc, not args.no_thumbnails)
+            except Exception as e:
+                print(f"[Reenrich] Lỗi tài liệu {doc['_id']}: {e}")
+                fields = None
+            if fields and "summary" in fields:
+                fields["enrichedAt"] = datetime.utcnow()
+                ok += 1
+            else:
+                # Không đọc được file hoặc AI không tóm tắt được: vẫn ghi số trang/thumbnail
+                failed_ids.append(doc["_id"])
+            if fields:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+            last_id = doc["_id"]
+        if last_id is None:
+            return
+
+        checkpoint["lastId"] = last_id
+        progress.add(ok, len(failed_ids))
+        if ops:
+            mongo_collections.documents.bulk_write(ops, ordered=False)
+        mongo_collections.job_checkpoints.update_one(
+            {"_id": checkpoint["_id"]},
+            {
+                "$set": {"lastId": last_id, "updatedAt": datetime.utcnow()},
+                "$inc": {"processed": ok, "failed": len(failed_ids)},
+                "$push": {"failedIds": {"$each": failed_ids, "$slice": -MAX_FAILED_IDS}},
+            }
+        )
+
+
+def _dry_run(pending: list, base_query: dict, args, sample: int = 20):
+    """
+    Liệt kê tài liệu sẽ được xử lý, chỉ đọc Mongo: không gọi _build_enrichment
+    (không ghi thumbnail lên S3, không gọi Gemini, không ghi documents/checkpoint).
+    """
+    total = no_file = render_cover = 0
+    samples = []
+    for checkpoint in pending:
+        for doc in mongo_collections.documents.find(_id_filter(base_query, checkpoint), PROJECTION).sort("_id", 1):
+            total += 1
+            if not (doc.get("s3_url") or doc.get("s3Url")):
+                no_file += 1
+                continue
+            if not args.no_thumbnails and not _user_image_url(doc):
+                render_cover += 1
+            if len(samples) < sample:
+                samples.append(f"{doc['_id']}  {doc.get('title') or ''}")
+    print(f"[Reenrich] DRY RUN: {total} tài liệu khớp | {total - no_file} sẽ xử lý | "
+          f"{no_file} không có file (sẽ tính lỗi) | "
+          f"{render_cover if not args.no_thumbnails else 0} sẽ render lại thumbnail")
+    for line in samples:
+        print(f"  - {line}")
+    if total - no_file > len(samples):
+        print(f"  ... và {total - no_file - len(samples)} tài liệu khác")
+
+
+def reenrich(args):
+    base_query = json_util.loads(args.query) if args.query else {}
+    if args.gemini_rpm is not None:
+        gemini_rate_limiter.set_rate(args.gemini_rpm)
+    n_ranges = args.ranges or args.workers * 4
+
+    checkpoints = _plan_ranges(args.job, base_query, n_ranges, args.reset, dry_run=args.dry_run)
+    pending = [c for c in checkpoints if not c.get("done")]
+    if not pending:
+        print(f"[Reenrich] Job '{args.job}' đã hoàn thành (dùng --reset để chạy lại)")
+        return
+    if args.dry_run:
+        _dry_run(pending, base_query, args)
+        return
+
+    total = sum(mongo_collections.documents.count_documents(_id_filter(base_query, c)) for c in pending)
+    print(f"[Reenrich] {total} tài liệu cần xử lý | {args.workers} worker | "
+          f"Gemini {gemini_rate_limiter.rpm or 'không giới hạn'} req/phút | "
+          f"thumbnail: {'tắt' if args.no_thumbnails else 'bật'}")
+
+    progress = Progress(total, args.report_every)
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(_process_range, c, base_query, args, progress, stop): c for c in pending}
+        try:
+            for fut in as_completed(futures):
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"[Reenrich] Khoảng {futures[fut]['range']} dừng vì lỗi: {e}")
+        except KeyboardInterrupt:
+            print("[Reenrich] Đang dừng, chờ các lô hiện tại ghi checkpoint...")
+            stop.set()
+    progress.report(final=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy lại tóm tắt/keywords/số trang/thumbnail cho tài liệu")
+    parser.add_argument("--job", default="reenrich", help="Tên job (khoá checkpoint)")
+    parser.add_argument("--workers", type=int, default=4, help="Số worker song song")
+    parser.add_argument("--ranges", type=int, default=0, help="Số khoảng _id (mặc định workers x 4)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Số tài liệu mỗi lần bulk_write + checkpoint")
+    parser.add_argument("--gemini-rpm", type=float, default=None, help="Giới hạn request Gemini/phút (mặc định GEMINI_RPM)")
+    parser.add_argument("--query", default="", help="Filter MongoDB dạng JSON (extended JSON)")
+    parser.add_argument("--no-thumbnails", action="store_true", help="Không sinh lại thumbnail")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê/đếm tài liệu sẽ xử lý (không S3, không Gemini, không ghi DB)")
+    parser.add_argument("--reset", action="store_true", help="Xoá checkpoint của job và chạy lại từ đầu")
+    parser.add_argument("--report-every", type=float, default=30.0, help="Chu kỳ in tiến độ (giây)")
+    reenrich(parser.parse_args())
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Script test endpoint GET /api/documents/featured-week với tài liệu có createdAt
+(bảng xếp hạng và join được thay bằng dữ liệu giả, không đọc/ghi DB).
+Chạy: python scripts/test_featured_week.py   (hoặc: pytest scripts/test_featured_week.py)
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from flask import Flask
+
+from app.controllers import documents as documents_module
+from app.services import document_counters as counters_module
+
+
+class _FakeLoader:
+    """Loader giả: mọi school/category/user đều có tên cố định."""
+
+    NAMES = {"schools": {"name": "ĐH Bách Khoa"}, "categories": {"name": "Toán học"}, "users": {"fullName": "Nguyễn Văn A"}}
+
+    def load_many(self, kind, ids):
+        return {}
+
+    def get(self, kind, entity_id):
+        return self.NAMES[kind] if entity_id else None
+
+
+def _call_featured_week(docs, source_counts=None):
+    """Gọi endpoint; source_counts giả lập số đếm thật cho document chưa có bộ đếm."""
+    app = Flask(__name__)
+    app.register_blueprint(documents_module.documents_bp)
+    fake_db = mock.MagicMock()
+    with mock.patch.object(documents_module.view_stats, "top_documents", return_value=docs), \
+            mock.patch.object(documents_module, "entity_loader", return_value=_FakeLoader()), \
+            mock.patch.object(counters_module, "mongo_collections", fake_db), \
+            mock.patch.object(counters_module.document_counters, "count_from_source",
+                              side_effect=lambda ids: {i: dict(source_counts[i]) for i in ids}):
+        return app.test_client().get("/api/documents/featured-week?limit=3"), fake_db
+
+
+def test_featured_week_with_dated_documents():
+    """Tài liệu có createdAt (datetime và chuỗi ISO) phải trả 200 kèm thời gian tương đối."""
+    now = datetime.utcnow()
+    legacy_id = ObjectId()
+    docs = [
+        {
+            "_id": ObjectId(),
+            "title": "Giải tích 1 - Đề cương ôn thi",
+            "schoolId": ObjectId(),
+            "categoryId": ObjectId(),
+            "userId": ObjectId(),
+            "createdAt": now - timedelta(days=2, hours=1),
+            "views": 120,
+            "viewsWeek": 40,
+            "likes": 5,
+            "dislikes": 0,
+            "commentCount": 2,
+            "keywords": ["giải tích", "toán"],
+        },
+        {
+            # Tài liệu cũ chưa có bộ đếm: phải đếm từ nguồn, không hiển thị 0
+            "_id": legacy_id,
+            "title": "Kế toán tài chính - Giáo trình",
+            "created_at": (now - timedelta(hours=3, minutes=5)).isoformat() + "Z",
+            "views": 80,
+            "viewsWeek": 30,
+        },
+    ]
+
+    source_counts = {legacy_id: {"likes": 7, "dislikes": 1, "commentCount": 4}}
+    resp, fake_db = _call_featured_week(docs, source_counts)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+
+    items = resp.get_json()["documents"]
+    assert [item["title"] for item in items] == [d["title"] for d in docs]
+    assert items[0]["time"] == "2 ngày trước"
+    assert items[0]["meta"] == "Toán học · ĐH Bách Khoa"
+    assert items[0]["uploaderName"] == "Nguyễn Văn A"
+    assert items[1]["time"] == "3 giờ trước"
+    assert (items[1]["grade"], items[1]["gradeScore"]) == ("B", "7.1")  # tính từ 7 like, 1 dislike, 4 bình luận
+    # Chỉ document thiếu bộ đếm được backfill, trong 1 lượt bulk_write
+    ops = fake_db.documents.bulk_write.call_args[0][0]
+    assert [op._filter["_id"] for op in ops] == [legacy_id]
+    print("✓ featured-week trả 200 với tài liệu có createdAt:", [item["time"] for item in items])
+
+
+def test_featured_week_empty():
+    resp, _ = _call_featured_week([])
+    assert resp.status_code == 200
+    assert resp.get_json() == {"documents": []}
+    print("✓ featured-week rỗng trả danh sách rỗng")
+
+
+if __name__ == "__main__":
+    try:
+        test_featured_week_with_dated_documents()
+        test_featured_week_empty()
+        print("Hoàn thành!")
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Script test NameIndex (app/services/lookup_cache.py): tìm trường/danh mục theo tên không dấu,
+tên viết tắt, acronym và infix, trên dữ liệu trong bộ nhớ (không đọc DB).
+Chạy: python scripts/test_lookup_search.py   (hoặc: pytest scripts/test_lookup_search.py)
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.lookup_cache import NameIndex, acronym, fold
+
+SCHOOLS = [
+    {"_id": 1, "name": "Đại học Bách Khoa Hà Nội", "shortName": "HUST"},
+    {"_id": 2, "name": "Đại học Cần Thơ", "shortName": "CTU"},
+    {"_id": 3, "name": "ĐH Bách Khoa TP.HCM", "shortName": "HCMUT"},
+    {"_id": 4, "name": "Đại học Kinh tế Quốc dân", "shortName": "NEU"},
+    {"_id": 5, "name": "Học viện Công nghệ Bưu chính Viễn thông", "shortName": "PTIT"},
+]
+
+
+def _ids(results):
+    return [d["_id"] for d in results]
+
+
+def _index():
+    return NameIndex(sorted(SCHOOLS, key=lambda d: fold(d["name"])))
+
+
+def test_fold_and_acronym():
+    assert fold("  Đại  học Cần   Thơ ") == "dai hoc can tho"
+    assert acronym("Đại học Cần Thơ") == "dhct"
+    assert acronym("ĐH Bách Khoa TP.HCM") == "dhbktphcm"
+    print("✓ fold/acronym bỏ dấu, giữ từ viết hoa")
+
+
+def test_accent_free_prefix():
+    """Gõ không dấu (hoặc có dấu) đều khớp prefix tên / từ giữa tên."""
+    index = _index()
+    assert _ids(index.search("dai hoc can", 10)) == [2]
+    assert _ids(index.search("Đại học Cần", 10)) == [2]
+    assert _ids(index.search("can tho", 10)) == [2]
+    assert set(_ids(index.search("bach khoa", 10))) == {1, 3}
+    print("✓ tìm prefix không dấu:", _ids(index.search("bach khoa", 10)))
+
+
+def test_acronym_and_short_name():
+    index = _index()
+    assert _ids(index.search("dhct", 10)) == [2]
+    assert set(_ids(index.search("DHBK", 10))) == {1, 3}  # "ĐH" viết hoa giữ nguyên trong acronym
+    assert _ids(index.search("dhbkhn", 10)) == [1]
+    assert _ids(index.search("dhbktphcm", 10)) == [3]
+    assert _ids(index.search("hust", 10)) == [1]
+    assert _ids(index.search("ptit", 10)) == [5]
+    print("✓ tìm theo acronym / tên viết tắt")
+
+
+def test_ranking_and_infix():
+    """Khớp tên đứng trước khớp từ giữa tên; infix chỉ dùng khi prefix chưa đủ; rank phá hoà."""
+    index = _index()
+    assert _ids(index.search("hoc", 10))[0] == 5  # "Học viện..." khớp đầu tên
+    assert _ids(index.search("vienthong", 10)) == [5]  # infix trên tên đã bỏ khoảng trắng
+    views = {1: 5, 3: 50}
+    assert _ids(index.search("bach khoa", 10, rank=lambda d: views.get(d["_id"], 0))) == [3, 1]
+    assert len(index.search("", 3)) == 3
+    assert index.search("khong ton tai", 10) == []
+    print("✓ xếp hạng prefix > từ > infix, rank phá hoà")
+
+
+if __name__ == "__main__":
+    try:
+        test_fold_and_acronym()
+        test_accent_free_prefix()
+        test_acronym_and_short_name()
+        test_ranking_and_infix()
+        print("Hoàn thành!")
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Script test app/utils/text_chunker.py (bỏ header/footer lặp lại + chia chunk theo ngân sách token).
+Chạy: python scripts/test_text_chunker.py   (hoặc: pytest scripts/test_text_chunker.py)
+"""
+
+import sys
+import os
+import re
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.text_chunker import chunk_text, estimate_tokens, join_pages, strip_repeated_lines
+
+
+_TOPICS = ["hàm số", "đạo hàm", "giới hạn", "chuỗi số", "tích phân", "vi phân"]
+
+
+def _page(i: int) -> str:
+    topic = _TOPICS[(i - 1) % len(_TOPICS)]
+    return "\n".join([
+        "Đại học Bách Khoa - Khoa Công nghệ thông tin",  # header
+        "Chương 2. Tích phân",                           # tiêu đề lặp lại ở đầu mỗi trang
+        f"Nội dung a: {topic}",
+        f"Nội dung b: {topic}",
+        "Ví dụ:",                                        # dòng lặp lại nhưng nằm giữa trang
+        f"Nội dung c: {topic}",
+        f"Nội dung d: {topic}",
+        f"Nội dung e: {topic}",
+        f"Trang {i}",                                    # footer
+    ])
+
+
+def _long_text() -> str:
+    paras = []
+    for i in range(120):
+        if i % 15 == 0:
+            paras.append(f"Chương {i // 15 + 1}. Phần {i}")
+        paras.append(" ".join(f"P{i:03d} câu số {j} nói về chủ đề tích phân." for j in range(1 + i % 9)))
+    paras.append("Q" * 1500)  # 1 "câu" dài hơn ngân sách -> phải cắt cứng
+    return "\n\n".join(paras)
+
+
+def test_strip_only_page_edges():
+    """Header/footer chỉ giữ lần đầu; dòng lặp giữa trang và tiêu đề lặp lại vẫn giữ nguyên."""
+    pages = [_page(i) for i in range(1, 7)]
+    out = strip_repeated_lines(join_pages(pages)).split("\n")
+    assert "\f" not in "\n".join(out)
+    assert out.count("Đại học Bách Khoa - Khoa Công nghệ thông tin") == 1
+    assert len([ln for ln in out if ln.startswith("Trang ")]) == 1
+    assert out.count("Ví dụ:") == 6
+    assert out.count("Chương 2. Tích phân") == 6
+    assert all(f"Nội dung e: {topic}" in out for topic in _TOPICS)
+    print("✓ strip_repeated_lines chỉ bỏ header/footer ở mép trang:", len(out), "dòng")
+
+
+def test_strip_keeps_short_documents():
+    """Ít trang hơn ngưỡng lặp: không bỏ dòng nào."""
+    pages = [_page(i) for i in range(1, 3)]
+    assert strip_repeated_lines(join_pages(pages)) == "\n".join(pages)
+    print("✓ strip_repeated_lines giữ nguyên tài liệu ít trang")
+
+
+def test_chunks_within_budget():
+    text = _long_text()
+    for budget in (20, 50, 64, 100, 333):
+        chunks = chunk_text(text, budget)
+        assert chunks
+        over = [estimate_tokens(c) for c in chunks if estimate_tokens(c) > budget]
+        assert not over, f"budget {budget}: chunk {over}"
+    print("✓ chunk_text không vượt ngân sách token")
+
+
+def test_chunks_preserve_order():
+    """Nối các chunk lại phải ra đúng thứ tự đoạn/câu ban đầu, không mất đoạn nào."""
+    text = _long_text()
+    chunks = chunk_text(text, 64)
+    joined = "\n\n".join(chunks)
+    markers = re.findall(r"P\d{3} câu số \d+", joined)
+    assert markers == re.findall(r"P\d{3} câu số \d+", text)
+    assert re.findall(r"Chương \d+", joined) == re.findall(r"Chương \d+", text)
+    assert joined.count("Q") == 1500
+    print("✓ chunk_text giữ thứ tự:", len(chunks), "chunk")
+
+
+if __name__ == "__main__":
+    try:
+        test_strip_only_page_edges()
+        test_strip_keeps_short_documents()
+        test_chunks_within_budget()
+        test_chunks_preserve_order()
+        print("Hoàn thành!")
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)